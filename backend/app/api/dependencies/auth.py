@@ -1,10 +1,15 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import jwt, JWTError
+from redis.exceptions import RedisError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from app.core.config import settings
 from app.core.database import get_db
+from app.core.revocation import is_token_revoked
+from app.core.database import DEFAULT_SHARD
+from app.core.tenant_cache import get_cached_schema, get_cached_shard
+from app.core.token_store import RefreshTokenStore, get_refresh_token_store
 from app.models.user import User
 from app.schemas.auth import TokenPayload
 
@@ -17,6 +22,9 @@ async def get_current_user(
 ) -> User:
     """
     Dependency to get the current authenticated user from JWT token.
+
+    In stateless auth mode the user is rebuilt from the token claims and the
+    database is not queried; revocation is checked in Redis in both modes.
     """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -37,14 +45,40 @@ async def get_current_user(
             raise credentials_exception
             
         token_data = TokenPayload(sub=user_id, tenant_id=tenant_id)
-    except (JWTError, ValueError):
+    except (JWTError, ValueError, TypeError):
         raise credentials_exception
-    
-    # Get user from database
-    result = await db.execute(
-        select(User).where(User.id == token_data.sub)
-    )
-    user = result.scalar_one_or_none()
+
+    if settings.AUTH_MODE == "stateless":
+        try:
+            revoked = await is_token_revoked(payload)
+        except RedisError:
+            # Fail closed: a revoked token must never slip through
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Authentication temporarily unavailable",
+            )
+        if revoked:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token has been revoked",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+
+    if settings.AUTH_MODE == "stateless" and "schema" in payload:
+        # Transient instance built from the signed claims; never added to a session
+        user = User(
+            id=token_data.sub,
+            email=payload.get("email"),
+            full_name=payload.get("name"),
+            is_active=payload.get("is_active", False),
+            is_superuser=payload.get("is_superuser", False),
+        )
+    else:
+        # Get user from database
+        result = await db.execute(
+            select(User).where(User.id == token_data.sub)
+        )
+        user = result.scalar_one_or_none()
     
     if user is None:
         raise credentials_exception
@@ -55,8 +89,15 @@ async def get_current_user(
             detail="Inactive user"
         )
     
-    # Inject tenant_id from token into user object (temporary attribute)
+    # Inject token context into user object (temporary attributes)
     user.tenant_id = token_data.tenant_id
+    if "schema" in payload:
+        user.schema_name = payload["schema"]
+        user.shard = payload.get("shard", DEFAULT_SHARD)
+    else:
+        user.schema_name = get_cached_schema(token_data.tenant_id)
+        user.shard = get_cached_shard(token_data.tenant_id)
+    user.token_payload = payload
     
     return user
 
@@ -73,3 +114,12 @@ async def get_current_active_user(
             detail="Inactive user"
         )
     return current_user
+
+
+async def get_token_store(
+    db: AsyncSession = Depends(get_db),
+) -> RefreshTokenStore:
+    """
+    Dependency returning the configured refresh token store.
+    """
+    return get_refresh_token_store(db)
@@ -0,0 +1,57 @@
+"""
+Sparse fieldset support (``?fields=id,name``) for read endpoints.
+"""
+from typing import Any, Callable
+from fastapi import HTTPException, Query, status
+from fastapi.responses import Response
+from pydantic import BaseModel as SchemaModel
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import InstrumentedAttribute
+from app.core.database import Base
+from app.api.responses import wire_response
+
+
+def sparse_fields(
+    model: type[Base],
+    schema: type[SchemaModel],
+) -> Callable[..., list[InstrumentedAttribute] | None]:
+    """
+    Build a dependency that parses the ``fields`` query parameter.
+
+    Only columns that exist on both the SQLAlchemy model and the response
+    schema can be requested, so the SELECT list is narrowed to real columns
+    and nothing outside the public response shape is ever exposed.
+    Returns ``None`` when the parameter is absent (full rows are loaded).
+    """
+    columns = model.__table__.columns.keys()
+    allowed = [name for name in schema.model_fields if name in columns]
+
+    async def dependency(
+        fields: str | None = Query(
+            None,
+            description=f"Comma-separated subset of fields to return: {', '.join(allowed)}",
+        ),
+    ) -> list[InstrumentedAttribute] | None:
+        if not fields:
+            return None
+
+        requested = list(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+        unknown = [name for name in requested if name not in allowed]
+        if unknown or not requested:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown fields: {', '.join(unknown)}" if unknown else "No fields requested",
+            )
+
+        return [getattr(model, name) for name in requested]
+
+    return dependency
+
+
+def sparse_response(rows: Row | list[Row], media_type: str | None = None) -> Response:
+    """Serialize narrowed rows, bypassing the full response model."""
+    if isinstance(rows, Row):
+        content: Any = dict(rows._mapping)
+    else:
+        content = [dict(row._mapping) for row in rows]
+    return wire_response(media_type, content)
@@ -0,0 +1,92 @@
+from fastapi import BackgroundTasks, HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.database import TENANT_ID_SETTING, set_local
+from app.core.tenant_cache import cache_schema
+from app.core.tenant_schema import provision_tenant_schema
+from app.models.tenant import (
+    SHARED_TENANT_SCHEMA,
+    Organization,
+    OrganizationStatus,
+    OrganizationTenancy,
+)
+from app.models.user import User
+from app.workers.tasks import enqueue_schema_pool_refill, enqueue_tenant_provisioning
+
+
+async def set_tenant_schema(db: AsyncSession, user: User) -> None:
+    """
+    Set the search path to the current user's tenant schema.
+
+    ``user.tenant_id``, ``user.schema_name`` and ``user.shard`` are injected
+    by get_current_user; they come from the token or the tenant cache, both
+    of which only ever hold ACTIVE organizations. Otherwise they are looked
+    up, and an organization still being provisioned answers 503. Tenant
+    models then go to the shard's database (see TenantSession).
+    Shared-tenancy organizations use the shared schema, scoped to the
+    organization through ``app.tenant_id``. Both settings only last for the
+    transaction (see ``apply_tenant_context``).
+    """
+    schema_name, shard = user.schema_name, user.shard
+    if schema_name is None or shard is None:
+        result = await db.execute(
+            select(Organization.data_schema.label("schema_name"), Organization.shard, Organization.status)
+            .where(Organization.id == user.tenant_id)
+        )
+        row = result.one_or_none()
+        if row:
+            if row.status != OrganizationStatus.ACTIVE.value:
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Organization is still being provisioned",
+                    headers={"Retry-After": str(settings.TENANT_PROVISIONING_RETRY_AFTER_SECONDS)},
+                )
+            schema_name, shard = row.schema_name, row.shard
+            cache_schema(user.tenant_id, schema_name, shard)
+    if shard is not None:
+        db.info["shard"] = shard
+    if not schema_name:
+        return
+    values = {"search_path": f"{schema_name}, public"}
+    if schema_name == SHARED_TENANT_SCHEMA:
+        # Row-level security scopes the shared tables to this organization
+        values[TENANT_ID_SETTING] = str(user.tenant_id)
+    # Settings are transaction-local (safe behind PgBouncer in transaction
+    # mode): the session applies them to every transaction it begins, so
+    # they only need applying here if the tenant connection's has begun
+    db.info["tenant_settings"] = values
+    begun = db.info.get("transactions_begun", 0)
+    connection = await db.connection(bind_arguments={"tenant": True})
+    if db.info.get("transactions_begun", 0) == begun:
+        await connection.execute(set_local(values))
+
+
+async def start_tenant_provisioning(
+    db: AsyncSession,
+    organization: Organization,
+    background_tasks: BackgroundTasks,
+) -> None:
+    """
+    Provision the schema of a newly flushed organization.
+
+    In shared tenancy mode there is nothing to provision: the organization
+    is put in the shared tables and is ACTIVE at once. With
+    TENANT_PROVISIONING_ASYNC the organization is left PROVISIONING and
+    a worker is asked to provision it once the response (and therefore the
+    caller's commit) is done, so no DDL or catalog lock wait ever runs in
+    the request. Otherwise the schema is provisioned inline. Either way the
+    caller commits.
+    """
+    if settings.TENANCY_MODE == "shared":
+        # Nothing to provision: the shared tables already exist
+        organization.tenancy = OrganizationTenancy.SHARED.value
+        organization.status = OrganizationStatus.ACTIVE.value
+        return
+    if settings.TENANT_PROVISIONING_ASYNC:
+        organization.status = OrganizationStatus.PROVISIONING.value
+        background_tasks.add_task(enqueue_tenant_provisioning, organization.id)
+        return
+    await provision_tenant_schema(db, organization.schema_name)
+    organization.status = OrganizationStatus.ACTIVE.value
+    background_tasks.add_task(enqueue_schema_pool_refill)
@@ -0,0 +1,121 @@
+"""
+Content negotiation for bulk read responses.
+
+JSON (ORJSON) stays the default. Clients that send a matching ``Accept``
+header can get MessagePack or an Arrow IPC stream instead, which are much
+cheaper to parse for service-to-service consumers. Both encoders are
+optional dependencies (``poetry install -E wire``); when one is missing its
+media type is simply not offered.
+"""
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from io import BytesIO
+from typing import Any
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse, Response
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+
+def _msgpack_default(value: Any) -> Any:
+    """Encode types msgpack does not know natively."""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+class MessagePackResponse(Response):
+    """MessagePack-encoded response."""
+    media_type = MSGPACK_MEDIA_TYPE
+
+    def render(self, content: Any) -> bytes:
+        return msgpack.packb(content, default=_msgpack_default, use_bin_type=True)
+
+
+class ArrowResponse(Response):
+    """Arrow IPC stream response built from a list of row dicts."""
+    media_type = ARROW_MEDIA_TYPE
+
+    def render(self, content: list[dict[str, Any]]) -> bytes:
+        rows = [
+            {k: v.value if isinstance(v, Enum) else v for k, v in row.items()}
+            for row in content
+        ]
+        table = pa.Table.from_pylist(rows)
+        sink = BytesIO()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue()
+
+
+def available_media_types() -> list[str]:
+    """Media types this deployment can produce, in server preference order."""
+    media_types = [JSON_MEDIA_TYPE]
+    if msgpack is not None:
+        media_types.append(MSGPACK_MEDIA_TYPE)
+    if pa is not None:
+        media_types.append(ARROW_MEDIA_TYPE)
+    return media_types
+
+
+def negotiate_media_type(accept: str | None) -> str:
+    """Pick the best supported media type for an ``Accept`` header."""
+    if not accept:
+        return JSON_MEDIA_TYPE
+
+    supported = available_media_types()
+    best, best_q = JSON_MEDIA_TYPE, 0.0
+    for media_range in accept.split(","):
+        media_type, *params = [part.strip() for part in media_range.split(";")]
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        # Wildcards keep the default; only explicit types switch formats
+        if media_type in supported and q > best_q:
+            best, best_q = media_type, q
+    return best
+
+
+async def wire_format(request: Request) -> str | None:
+    """
+    Dependency returning the negotiated non-JSON media type, or ``None``.
+
+    ``None`` means the route should return its usual objects and let the
+    response model / ORJSON path serialize them.
+    """
+    media_type = negotiate_media_type(request.headers.get("Accept"))
+    return None if media_type == JSON_MEDIA_TYPE else media_type
+
+
+def wire_response(media_type: str | None, content: Any) -> Response:
+    """Encode plain data (dicts / lists of dicts) in the negotiated format."""
+    headers = {"Vary": "Accept"}
+    if media_type == MSGPACK_MEDIA_TYPE:
+        return MessagePackResponse(content=content, headers=headers)
+    if media_type == ARROW_MEDIA_TYPE:
+        rows = content if isinstance(content, list) else [content]
+        return ArrowResponse(content=rows, headers=headers)
+    return ORJSONResponse(content=jsonable_encoder(content), headers=headers)
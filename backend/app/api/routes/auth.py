@@ -1,29 +1,165 @@
+import math
 from datetime import datetime, timedelta, timezone
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, status
 from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, text
-from app.core.database import get_db
-from app.core.security import create_access_token, create_refresh_token, verify_password, get_password_hash
-from app.core.tenant_schema import init_tenant_schema
+from sqlalchemy import inspect, select, text, update
+from app.core.database import DEFAULT_SHARD, AsyncSessionLocal, DatabaseRoute, get_db
+from app.core.config import settings
+from app.core.rate_limit import Bucket, TokenBucketLimiter
+from app.core.redis import get_redis
+from app.core.revocation import revoke_access_token, revoke_user_tokens
+from app.core.tenant_cache import cache_plan, cache_schema, get_cached_plan, get_cached_schema, get_cached_shard
+from app.core.tenant_quotas import DEFAULT_PLAN
+from app.core.security import (
+    create_access_token,
+    create_refresh_token,
+    get_password_hash,
+    password_needs_rehash,
+    run_password_hash,
+    verify_password,
+)
+from app.core.token_store import RefreshTokenStore
 from app.models.user import User
-from app.models.tenant import Organization
+from app.models.tenant import Organization, OrganizationStatus
 from app.models.member import OrganizationMember
-from app.models.token import Token as RefreshTokenModel
-from app.schemas.auth import Token, UserLogin, UserRegister
+from app.schemas.auth import AccessToken, PasswordChange, Token, UserLogin, UserRegister
 from app.schemas.user import UserResponse
-from app.api.dependencies.auth import get_current_user
+from app.api.dependencies.auth import get_current_user, get_token_store
+from app.api.dependencies.tenant import start_tenant_provisioning
 
 class RefreshTokenRequest(BaseModel):
     refresh_token: str
+    # Keep working in this organization instead of the default one
+    organization_id: int | None = None
 
-router = APIRouter()
+
+class SwitchOrganizationRequest(BaseModel):
+    organization_id: int
+
+router = APIRouter(route_class=DatabaseRoute)
+
+
+async def enforce_login_rate_limit(request: Request, email: str) -> None:
+    """
+    Charge the per-email and per-IP login buckets, or raise 429.
+
+    Runs before any database access or password verification, so floods of
+    bad credentials are rejected without paying for bcrypt.
+    """
+    if not settings.LOGIN_RATE_LIMIT_ENABLED:
+        return
+
+    client_ip = request.client.host if request.client else "unknown"
+    limiter = TokenBucketLimiter(get_redis(), prefix="ratelimit:login:")
+    retry_after = await limiter.acquire([
+        Bucket(
+            key=f"email:{email.lower()}",
+            capacity=settings.LOGIN_RATE_LIMIT_EMAIL_CAPACITY,
+            refill_per_second=settings.LOGIN_RATE_LIMIT_EMAIL_PER_MINUTE / 60,
+        ),
+        Bucket(
+            key=f"ip:{client_ip}",
+            capacity=settings.LOGIN_RATE_LIMIT_IP_CAPACITY,
+            refill_per_second=settings.LOGIN_RATE_LIMIT_IP_PER_MINUTE / 60,
+        ),
+    ])
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many login attempts",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+
+
+async def rehash_password(user_id: int, password: str, old_hash: str) -> None:
+    """
+    Re-hash a password at the current bcrypt cost and store it.
+
+    Runs as a background task after the login response is sent, with its own
+    session. The update only applies if the stored hash is still ``old_hash``,
+    so a password changed in the meantime is never overwritten. While
+    password hashing is saturated it is skipped; a later login retries.
+    """
+    try:
+        new_hash = await run_password_hash(get_password_hash, password)
+    except HTTPException:
+        return
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            update(User)
+            .where(User.id == user_id)
+            .where(User.hashed_password == old_hash)
+            .values(hashed_password=new_hash)
+        )
+        await session.commit()
+
+
+async def access_token_claims(
+    db: AsyncSession,
+    user: User,
+    organization_id: int,
+    role: str,
+    schema_name: str | None = None,
+) -> dict | None:
+    """
+    Extra access token claims for stateless auth mode.
+
+    Carries everything ``get_current_user`` and the tenant middleware need
+    (the shard and plan only when they are not the default ones), so authenticated
+    requests do not touch the database. Returns None in
+    database mode, keeping tokens small. Pass ``schema_name`` only for an
+    organization known to be ACTIVE.
+    """
+    if settings.AUTH_MODE != "stateless":
+        return None
+    claims = {
+        "email": user.email,
+        "name": user.full_name,
+        "is_active": user.is_active,
+        "is_superuser": user.is_superuser,
+        "role": role,
+    }
+    schema_name = schema_name or get_cached_schema(organization_id)
+    shard = get_cached_shard(organization_id)
+    plan = get_cached_plan(organization_id)
+    if schema_name is None or shard is None or plan is None:
+        result = await db.execute(
+            select(
+                Organization.data_schema.label("schema_name"),
+                Organization.shard,
+                Organization.status,
+                Organization.plan,
+            )
+            .where(Organization.id == organization_id)
+        )
+        row = result.one()
+        if row.status != OrganizationStatus.ACTIVE.value:
+            # No schema claim yet: requests fall back to the database (and
+            # its provisioning check) until the next token
+            return claims
+        schema_name, shard, plan = row.schema_name, row.shard, row.plan
+        cache_schema(organization_id, schema_name, shard)
+        cache_plan(organization_id, plan)
+    claims["schema"] = schema_name
+    if shard != DEFAULT_SHARD:
+        claims["shard"] = shard
+    if plan != DEFAULT_PLAN:
+        claims["plan"] = plan
+    return claims
+
+
+def refresh_token_expiry() -> datetime:
+    """Expiry timestamp for a refresh token issued now."""
+    return datetime.now(timezone.utc) + timedelta(minutes=settings.REFRESH_TOKEN_EXPIRE_MINUTES)
 
 
 @router.post("/register", response_model=Token, status_code=status.HTTP_201_CREATED)
 async def register(
     user_data: UserRegister,
+    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db),
+    token_store: RefreshTokenStore = Depends(get_token_store),
 ) -> Token:
     """
     Register a new user and organization.
@@ -60,13 +196,13 @@ async def register(
     db.add(organization)
     await db.flush()
     
-    # Initialize tenant schema (creates schema and all required tables)
-    await init_tenant_schema(db, schema_name)
+    # Provision the tenant schema (in a worker unless configured inline)
+    await start_tenant_provisioning(db, organization, background_tasks)
 
     # Create user
     user = User(
         email=user_data.email,
-        hashed_password=get_password_hash(user_data.password),
+        hashed_password=await run_password_hash(get_password_hash, user_data.password),
         full_name=user_data.full_name,
         is_active=True,
         is_superuser=True 
@@ -84,23 +220,23 @@ async def register(
     db.add(member)
     await db.commit()
     await db.refresh(user)
+    ready = organization.status == OrganizationStatus.ACTIVE.value
+    if ready:
+        cache_schema(organization.id, organization.data_schema, organization.shard)
     
     # Create tokens
     access_token = create_access_token(
         subject=user.id,
-        tenant_id=organization.id
+        tenant_id=organization.id,
+        claims=await access_token_claims(
+            db, user, organization.id, member.role,
+            organization.data_schema if ready else None,
+        ),
     )
     refresh_token = create_refresh_token(subject=user.id)
     
     # Store refresh token
-    db_token = RefreshTokenModel(
-        token=refresh_token,
-        token_type="refresh",
-        user_id=user.id,
-        expires_at=datetime.now(timezone.utc) + timedelta(days=7) # Hardcoded for now, should use settings
-    )
-    db.add(db_token)
-    await db.commit()
+    await token_store.save(user.id, refresh_token, refresh_token_expiry())
     
     return Token(
         access_token=access_token,
@@ -112,19 +248,27 @@ async def register(
 @router.post("/login", response_model=Token)
 async def login(
     credentials: UserLogin,
+    request: Request,
+    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db),
+    token_store: RefreshTokenStore = Depends(get_token_store),
 ) -> Token:
     """
     Login with email and password.
     Returns JWT token with user and tenant information.
     """
+    await enforce_login_rate_limit(request, credentials.email)
+
     # Get user by email
     result = await db.execute(
         select(User).where(User.email == credentials.email)
     )
     user = result.scalar_one_or_none()
     
-    if not user or not verify_password(credentials.password, user.hashed_password):
+    # bcrypt is CPU-bound; verify in a worker thread so it never blocks the event loop
+    if not user or not await run_password_hash(
+        verify_password, credentials.password, user.hashed_password
+    ):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -136,6 +280,11 @@ async def login(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Inactive user"
         )
+
+    if password_needs_rehash(user.hashed_password):
+        background_tasks.add_task(
+            rehash_password, user.id, credentials.password, user.hashed_password
+        )
     
     # Get user's default organization (first one for now)
     # In future, we might let user choose or store last used org
@@ -156,19 +305,13 @@ async def login(
     # Create tokens
     access_token = create_access_token(
         subject=user.id,
-        tenant_id=member.organization_id
+        tenant_id=member.organization_id,
+        claims=await access_token_claims(db, user, member.organization_id, member.role),
     )
     refresh_token = create_refresh_token(subject=user.id)
     
     # Store refresh token
-    db_token = RefreshTokenModel(
-        token=refresh_token,
-        token_type="refresh",
-        user_id=user.id,
-        expires_at=datetime.now(timezone.utc) + timedelta(days=7)
-    )
-    db.add(db_token)
-    await db.commit()
+    await token_store.save(user.id, refresh_token, refresh_token_expiry())
     
     return Token(
         access_token=access_token,
@@ -180,40 +323,100 @@ async def login(
 @router.get("/me", response_model=UserResponse)
 async def get_current_user_info(
     current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
 ) -> User:
     """
     Get current user information.
     """
+    if inspect(current_user).transient:
+        # Stateless mode: the token does not carry the full profile
+        current_user = await db.get(User, current_user.id)
     return current_user
 
 
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(
+    current_user: User = Depends(get_current_user),
+) -> None:
+    """
+    Revoke the access token used for this request (stateless auth mode).
+    """
+    payload = current_user.token_payload
+    if settings.AUTH_MODE == "stateless" and payload.get("jti"):
+        await revoke_access_token(
+            payload["jti"], datetime.fromtimestamp(payload["exp"], tz=timezone.utc)
+        )
+
+
+@router.post("/password", status_code=status.HTTP_204_NO_CONTENT)
+async def change_password(
+    request_body: PasswordChange,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+    token_store: RefreshTokenStore = Depends(get_token_store),
+) -> None:
+    """
+    Change the current user's password.
+
+    Every refresh token of the user is revoked, and in stateless auth mode
+    every access token issued so far too, so a leaked token stops working
+    along with the old password.
+    """
+    user = await db.get(User, current_user.id)
+    if not await run_password_hash(
+        verify_password, request_body.current_password, user.hashed_password
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Incorrect password",
+        )
+    user.hashed_password = await run_password_hash(get_password_hash, request_body.new_password)
+    await db.commit()
+    await token_store.revoke_user(user.id)
+    if settings.AUTH_MODE == "stateless":
+        await revoke_user_tokens(user.id)
+
+
+@router.post("/deactivate", status_code=status.HTTP_204_NO_CONTENT)
+async def deactivate(
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+    token_store: RefreshTokenStore = Depends(get_token_store),
+) -> None:
+    """
+    Deactivate the current user's account.
+
+    The user's refresh tokens are revoked. Database auth mode refuses the
+    user's access tokens from the next request on. In stateless mode they
+    still claim an active user, so they are revoked too.
+    """
+    await db.execute(update(User).where(User.id == current_user.id).values(is_active=False))
+    await db.commit()
+    await token_store.revoke_user(current_user.id)
+    if settings.AUTH_MODE == "stateless":
+        await revoke_user_tokens(current_user.id)
+
+
 @router.post("/refresh", response_model=Token)
 async def refresh_token_endpoint(
     request_body: RefreshTokenRequest,
     db: AsyncSession = Depends(get_db),
+    token_store: RefreshTokenStore = Depends(get_token_store),
 ) -> Token:
     """
     Refresh access token using refresh token.
     """
     refresh_token = request_body.refresh_token
     
-    # In a real app, verify the refresh token signature and check against DB
-    # For now, we'll assume it's valid if it exists in DB and is not expired
-    
-    result = await db.execute(
-        select(RefreshTokenModel)
-        .where(RefreshTokenModel.token == refresh_token)
-        .where(RefreshTokenModel.is_revoked == False)
-    )
-    db_token = result.scalar_one_or_none()
+    stored_token = await token_store.lookup(refresh_token)
     
-    if not db_token:
+    if not stored_token:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid refresh token"
         )
         
-    if db_token.expires_at < datetime.now(timezone.utc):
+    if stored_token.expires_at < datetime.now(timezone.utc):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Refresh token expired"
@@ -221,7 +424,7 @@ async def refresh_token_endpoint(
         
     # Get user
     result = await db.execute(
-        select(User).where(User.id == db_token.user_id)
+        select(User).where(User.id == stored_token.user_id)
     )
     user = result.scalar_one_or_none()
     
@@ -230,14 +433,21 @@ async def refresh_token_endpoint(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found"
         )
+    if not user.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Inactive user"
+        )
         
-    # Get active membership
-    result = await db.execute(
+    # Get active membership (the requested one, or the default)
+    query = (
         select(OrganizationMember)
         .where(OrganizationMember.user_id == user.id)
         .where(OrganizationMember.status == "ACTIVE")
-        .limit(1)
     )
+    if request_body.organization_id is not None:
+        query = query.where(OrganizationMember.organization_id == request_body.organization_id)
+    result = await db.execute(query.limit(1))
     member = result.scalar_one_or_none()
     
     if not member:
@@ -249,25 +459,74 @@ async def refresh_token_endpoint(
     # Create new tokens
     access_token = create_access_token(
         subject=user.id,
-        tenant_id=member.organization_id
+        tenant_id=member.organization_id,
+        claims=await access_token_claims(db, user, member.organization_id, member.role),
     )
     new_refresh_token = create_refresh_token(subject=user.id)
     
-    # Revoke old token
-    db_token.is_revoked = True
-    
-    # Store new refresh token
-    new_db_token = RefreshTokenModel(
-        token=new_refresh_token,
-        token_type="refresh",
-        user_id=user.id,
-        expires_at=datetime.now(timezone.utc) + timedelta(days=7)
+    # Revoke old token and store the new one atomically
+    rotated = await token_store.rotate(
+        refresh_token, stored_token, new_refresh_token, refresh_token_expiry()
     )
-    db.add(new_db_token)
-    await db.commit()
+    if not rotated:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid refresh token"
+        )
     
     return Token(
         access_token=access_token,
         refresh_token=new_refresh_token,
         token_type="bearer"
     )
+
+
+@router.post("/switch-org", response_model=AccessToken)
+async def switch_organization(
+    request_body: SwitchOrganizationRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> AccessToken:
+    """
+    Issue an access token for another organization the user belongs to.
+
+    No password is needed: the caller is already authenticated, and a single
+    query checks the membership and fetches the target schema and shard,
+    which go in the tenant cache so the first request there needs no
+    lookup. Pass the same ``organization_id`` to ``/refresh`` to stay in
+    that organization.
+    """
+    result = await db.execute(
+        select(
+            OrganizationMember.role,
+            Organization.data_schema.label("schema_name"),
+            Organization.shard,
+            Organization.status,
+        )
+        .join(Organization, Organization.id == OrganizationMember.organization_id)
+        .where(OrganizationMember.user_id == current_user.id)
+        .where(OrganizationMember.organization_id == request_body.organization_id)
+        .where(OrganizationMember.status == "ACTIVE")
+        .where(Organization.is_active == True)
+    )
+    row = result.one_or_none()
+
+    if not row:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not an active member of this organization"
+        )
+
+    ready = row.status == OrganizationStatus.ACTIVE.value
+    if ready:
+        cache_schema(request_body.organization_id, row.schema_name, row.shard)
+
+    access_token = create_access_token(
+        subject=current_user.id,
+        tenant_id=request_body.organization_id,
+        claims=await access_token_claims(
+            db, current_user, request_body.organization_id, row.role,
+            row.schema_name if ready else None,
+        ),
+    )
+    return AccessToken(access_token=access_token, token_type="bearer")
@@ -1,21 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, text
 from sqlalchemy.orm import selectinload
-from app.core.database import get_db
-from app.core.tenant_schema import init_tenant_schema
+from app.core.config import settings
+from app.core.database import DatabaseRoute, get_db, get_read_db
 from app.models.user import User
-from app.models.tenant import Organization
+from app.models.tenant import Organization, OrganizationStatus
 from app.models.member import OrganizationMember
-from app.schemas.org import OrganizationCreate, OrganizationResponse, OrganizationMemberResponse, InviteUserRequest
+from app.schemas.org import OrganizationCreate, OrganizationResponse, OrganizationMemberResponse, OrganizationStatusResponse, InviteUserRequest
 from app.api.dependencies.auth import get_current_user
+from app.api.dependencies.tenant import start_tenant_provisioning
 
-router = APIRouter()
+router = APIRouter(route_class=DatabaseRoute)
 
 @router.get("/", response_model=list[OrganizationMemberResponse])
 async def list_organizations(
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ) -> list[OrganizationMemberResponse]:
     """
     List organizations the current user belongs to.
@@ -31,6 +32,7 @@ async def list_organizations(
 @router.post("/", response_model=OrganizationMemberResponse, status_code=status.HTTP_201_CREATED)
 async def create_organization(
     org_data: OrganizationCreate,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ) -> OrganizationMemberResponse:
@@ -58,8 +60,8 @@ async def create_organization(
     db.add(organization)
     await db.flush()
     
-    # Initialize tenant schema (creates schema and all required tables)
-    await init_tenant_schema(db, schema_name)
+    # Provision the tenant schema (in a worker unless configured inline)
+    await start_tenant_provisioning(db, organization, background_tasks)
     
     # Create membership (OWNER)
     member = OrganizationMember(
@@ -70,7 +72,8 @@ async def create_organization(
     )
     db.add(member)
     await db.commit()
-    await db.refresh(member)
+    # The session closes before the response is serialized: load what it reads
+    await db.refresh(member, ["organization"])
     
     return member
 
@@ -100,6 +103,38 @@ async def get_organization_by_slug(
     
     return organization
 
+@router.get("/{slug}/status", response_model=OrganizationStatusResponse)
+async def get_organization_status(
+    slug: str,
+    response: Response,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> OrganizationStatusResponse:
+    """
+    Report whether an organization's tenant schema is ready.
+
+    Poll this after creating an organization; while it is PROVISIONING the
+    response carries a Retry-After hint.
+    """
+    result = await db.execute(
+        select(Organization.slug, Organization.status)
+        .join(OrganizationMember)
+        .where(Organization.slug == slug)
+        .where(OrganizationMember.user_id == current_user.id)
+    )
+    row = result.one_or_none()
+    
+    if not row:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Organization not found"
+        )
+    
+    ready = row.status == OrganizationStatus.ACTIVE.value
+    if not ready:
+        response.headers["Retry-After"] = str(settings.TENANT_PROVISIONING_RETRY_AFTER_SECONDS)
+    return OrganizationStatusResponse(slug=row.slug, status=row.status, ready=ready)
+
 @router.post("/{org_id}/invite", status_code=status.HTTP_200_OK)
 async def invite_user(
     org_id: int,
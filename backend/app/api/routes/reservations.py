@@ -1,29 +1,21 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, text
-from app.core.database import get_db
+from sqlalchemy import select
+from app.core.database import DatabaseRoute, get_db, get_read_db
 from app.models.user import User
 from app.models.reservation import Reservation, ReservationStatus
 from app.models.space import Space
 from app.schemas.reservation import ReservationCreate, ReservationUpdate, ReservationResponse
 from app.api.dependencies.auth import get_current_active_user
+from app.api.dependencies.tenant import set_tenant_schema
+from app.api.dependencies.fields import sparse_fields, sparse_response
+from app.api.responses import wire_format, wire_response
 from typing import List
 from datetime import datetime
 
-router = APIRouter()
+router = APIRouter(route_class=DatabaseRoute)
 
-
-async def set_tenant_schema(db: AsyncSession, user: User):
-    """Helper to set the search path to tenant schema."""
-    # user.tenant_id es inyectado por la dependencia de autenticación
-    result = await db.execute(
-        text("SELECT schema_name FROM public.organizations WHERE id = :org_id"),
-        {"org_id": user.tenant_id}
-    )
-    row = result.fetchone()
-    if row:
-        schema_name = row[0]
-        await db.execute(text(f"SET search_path TO {schema_name}, public"))
+reservation_fields = sparse_fields(Reservation, ReservationResponse)
 
 
 async def calculate_price(
@@ -115,26 +107,38 @@ async def create_reservation(
 async def list_reservations(
     skip: int = 0,
     limit: int = 100,
-    db: AsyncSession = Depends(get_db),
+    fields: list | None = Depends(reservation_fields),
+    wire: str | None = Depends(wire_format),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_active_user),
 ) -> List[Reservation]:
     """List all reservations for the current user."""
     await set_tenant_schema(db, current_user)
     
     result = await db.execute(
-        select(Reservation)
+        select(*fields or [Reservation])
         .where(Reservation.user_id == current_user.id)
         .offset(skip)
         .limit(limit)
     )
+    if fields:
+        return sparse_response(result.all(), wire)
+    
     reservations = result.scalars().all()
     
+    if wire:
+        return wire_response(
+            wire,
+            [ReservationResponse.model_validate(item).model_dump() for item in reservations],
+        )
+    
     return list(reservations)
 
 
 @router.get("/{reservation_id}", response_model=ReservationResponse)
 async def get_reservation(
     reservation_id: int,
+    fields: list | None = Depends(reservation_fields),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
 ) -> Reservation:
@@ -142,11 +146,11 @@ async def get_reservation(
     await set_tenant_schema(db, current_user)
     
     result = await db.execute(
-        select(Reservation)
+        select(*fields or [Reservation])
         .where(Reservation.id == reservation_id)
         .where(Reservation.user_id == current_user.id)
     )
-    reservation = result.scalar_one_or_none()
+    reservation = result.one_or_none() if fields else result.scalar_one_or_none()
     
     if not reservation:
         raise HTTPException(
@@ -154,6 +158,9 @@ async def get_reservation(
             detail="Reservation not found"
         )
     
+    if fields:
+        return sparse_response(reservation)
+    
     return reservation
 
 
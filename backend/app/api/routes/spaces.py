@@ -1,27 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, text
-from app.core.database import get_db
+from sqlalchemy import select
+from app.core.database import DatabaseRoute, get_db, get_read_db
 from app.models.user import User
 from app.models.space import Space
 from app.schemas.space import SpaceCreate, SpaceUpdate, SpaceResponse
 from app.api.dependencies.auth import get_current_active_user
+from app.api.dependencies.tenant import set_tenant_schema
+from app.api.dependencies.fields import sparse_fields, sparse_response
+from app.api.responses import wire_format, wire_response
 from typing import List
 
-router = APIRouter()
+router = APIRouter(route_class=DatabaseRoute)
 
-
-async def set_tenant_schema(db: AsyncSession, user: User):
-    """Helper to set the search path to tenant schema."""
-    # user.tenant_id is injected by get_current_user dependency
-    result = await db.execute(
-        text("SELECT schema_name FROM public.organizations WHERE id = :org_id"),
-        {"org_id": user.tenant_id}
-    )
-    row = result.fetchone()
-    if row:
-        schema_name = row[0]
-        await db.execute(text(f"SET search_path TO {schema_name}, public"))
+space_fields = sparse_fields(Space, SpaceResponse)
 
 
 @router.post("/", response_model=SpaceResponse, status_code=status.HTTP_201_CREATED)
@@ -45,33 +37,42 @@ async def create_space(
 async def list_spaces(
     skip: int = 0,
     limit: int = 100,
-    db: AsyncSession = Depends(get_db),
+    fields: list | None = Depends(space_fields),
+    wire: str | None = Depends(wire_format),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_active_user),
 ) -> List[Space]:
     """List all spaces for the current tenant."""
     await set_tenant_schema(db, current_user)
     
     result = await db.execute(
-        select(Space).offset(skip).limit(limit)
+        select(*fields or [Space]).offset(skip).limit(limit)
     )
+    if fields:
+        return sparse_response(result.all(), wire)
+    
     spaces = result.scalars().all()
     
+    if wire:
+        return wire_response(wire, [SpaceResponse.model_validate(item).model_dump() for item in spaces])
+    
     return list(spaces)
 
 
 @router.get("/{space_id}", response_model=SpaceResponse)
 async def get_space(
     space_id: int,
-    db: AsyncSession = Depends(get_db),
+    fields: list | None = Depends(space_fields),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_active_user),
 ) -> Space:
     """Get a specific space by ID."""
     await set_tenant_schema(db, current_user)
     
     result = await db.execute(
-        select(Space).where(Space.id == space_id)
+        select(*fields or [Space]).where(Space.id == space_id)
     )
-    space = result.scalar_one_or_none()
+    space = result.one_or_none() if fields else result.scalar_one_or_none()
     
     if not space:
         raise HTTPException(
@@ -79,6 +80,9 @@ async def get_space(
             detail="Space not found"
         )
     
+    if fields:
+        return sparse_response(space)
+    
     return space
 
 
@@ -1,4 +1,4 @@
-from typing import Any
+from typing import Any, Literal
 from pydantic import field_validator, PostgresDsn
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -20,14 +20,133 @@ class Settings(BaseSettings):
     DATABASE_URL: PostgresDsn
     DATABASE_POOL_SIZE: int = 20
     DATABASE_MAX_OVERFLOW: int = 0
+    # Extra databases holding tenant schemas, as a JSON object of shard name
+    # -> URL; DATABASE_URL is the "default" shard and keeps the public tables
+    DATABASE_SHARDS: dict[str, str] = {}
+    # Read replicas as a JSON object of shard name -> URL ("default" for
+    # DATABASE_URL); read-only routes use them, except for reads by a client
+    # or for an organization within READ_YOUR_WRITES_SECONDS of its last write
+    DATABASE_REPLICAS: dict[str, str] = {}
+    READ_YOUR_WRITES_SECONDS: float = 5
+    # The database URLs point at PgBouncer in transaction pooling mode: no
+    # prepared statement is reused; workers connect to DATABASE_DIRECT_URL
+    DATABASE_PGBOUNCER: bool = False
+    DATABASE_DIRECT_URL: str | None = None
+    # Pools hand a tenant's requests the connections it used last (warm
+    # backend caches); ignored with DATABASE_PGBOUNCER
+    DATABASE_TENANT_AFFINITY: bool = True
 
-    # Redis
+    # Request deadlines: the API routes answer 504 once their deadline passes
+    # and their statements time out with it; REQUEST_DEADLINES overrides the
+    # default per route name, as a JSON object (e.g. {"list_reservations": 10})
+    REQUEST_DEADLINE_SECONDS: float = 30
+    REQUEST_DEADLINES: dict[str, float] = {}
+
+    # Load shedding: requests served at once per worker (0 = the pool's
+    # DATABASE_POOL_SIZE + DATABASE_MAX_OVERFLOW), and the longest expected
+    # queue wait before a request is answered 503 with Retry-After
+    LOAD_SHED_CONCURRENCY: int = 0
+    LOAD_SHED_LATENCY_BUDGET_SECONDS: float = 1.0
+
+    # Redis: connections per worker, and how long a command waits for one
     REDIS_URL: str
+    REDIS_MAX_CONNECTIONS: int = 100
+    REDIS_POOL_TIMEOUT_SECONDS: float = 5
 
     # Security
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    REFRESH_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 7
+    # Bearer token Prometheus must send to scrape /metrics, which names
+    # organizations; /metrics answers 404 while it is unset
+    METRICS_TOKEN: str | None = None
+
+    # "database" loads the user on every request; "stateless" trusts the
+    # claims in the access token and only checks the Redis revocation list
+    AUTH_MODE: Literal["database", "stateless"] = "database"
+
+    # Where new organizations keep their data: "schema" (a tenant_{slug}
+    # schema each) or "shared" (shared tables isolated by row-level security)
+    TENANCY_MODE: Literal["schema", "shared"] = "schema"
+
+    # Provision new tenant schemas in a Dramatiq worker; tenant routes answer
+    # 503 with Retry-After until the organization is ACTIVE
+    TENANT_PROVISIONING_ASYNC: bool = True
+    TENANT_PROVISIONING_RETRY_AFTER_SECONDS: int = 2
+    TENANT_PROVISIONING_LOCK_TIMEOUT_MS: int = 5000
+    # Organizations still PROVISIONING this long after sign-up are handed to
+    # the worker again by the periodic sweep_stale_provisioning actor
+    TENANT_PROVISIONING_STALE_SECONDS: int = 300
+    TENANT_PROVISIONING_SWEEP_INTERVAL_SECONDS: int = 300
+
+    # Pre-provisioned tenant schemas kept ready for new organizations (0 disables)
+    TENANT_SCHEMA_POOL_SIZE: int = 5
+    TENANT_SCHEMA_POOL_REFILL_INTERVAL_SECONDS: int = 300
+
+    # Per-organization quotas by plan (Organization.plan), enforced
+    # cluster-wide through Redis: requests in flight at once, and requests
+    # started per second with bursts of up to "burst"; plans missing here
+    # get the "standard" quotas
+    TENANT_QUOTAS_ENABLED: bool = True
+    TENANT_PLAN_QUOTAS: dict[str, dict[str, float]] = {
+        "free": {"concurrency": 4, "requests_per_second": 5, "burst": 20},
+        "standard": {"concurrency": 16, "requests_per_second": 50, "burst": 100},
+        "enterprise": {"concurrency": 64, "requests_per_second": 200, "burst": 400},
+    }
+
+    # Seconds an organization's schema name stays in the in-process cache
+    TENANT_CACHE_TTL_SECONDS: int = 300
+
+    # Tenant schema migrations (scripts/migrate_tenant_schemas.py): schemas
+    # migrated at once, and per-schema lock wait, statement and total limits
+    TENANT_MIGRATION_CONCURRENCY: int = 16
+    TENANT_MIGRATION_LOCK_TIMEOUT_MS: int = 3000
+    TENANT_MIGRATION_STATEMENT_TIMEOUT_MS: int = 60000
+    TENANT_MIGRATION_TIMEOUT_SECONDS: float = 300
+
+    # Online tenant index builds (scripts/rollout_tenant_indexes.py): builds
+    # run at once by one rollout (the cap is per process, so run one rollout
+    # at a time), and the pressure at which new builds wait
+    TENANT_INDEX_BUILD_CONCURRENCY: int = 2
+    TENANT_INDEX_BUILD_ATTEMPTS: int = 3
+    TENANT_INDEX_MAX_REPLICATION_LAG_SECONDS: float = 30
+    TENANT_INDEX_MAX_IO_WAITERS: int = 8
+    TENANT_INDEX_BACKOFF_MAX_SECONDS: float = 60
+
+    # Password hashing: bcrypt cost is calibrated at startup to the target
+    # latency unless BCRYPT_ROUNDS pins it; hashes run at once per worker are
+    # capped (default: one per available core) so login bursts cannot starve
+    # the event loop, and beyond PASSWORD_HASH_QUEUE_LIMIT waiting ones
+    # requests get 503 (default: what the cap hashes within
+    # LOAD_SHED_LATENCY_BUDGET_SECONDS)
+    PASSWORD_HASH_TARGET_MS: float = 250
+    PASSWORD_HASH_CONCURRENCY: int | None = None
+    PASSWORD_HASH_QUEUE_LIMIT: int | None = None
+    BCRYPT_ROUNDS: int | None = None
+    BCRYPT_MIN_ROUNDS: int = 10
+    BCRYPT_MAX_ROUNDS: int = 16
+
+    # Where refresh tokens live: "database" (public.tokens) or "redis"
+    REFRESH_TOKEN_BACKEND: Literal["database", "redis"] = "database"
+
+    # Login rate limiting (token buckets in Redis, checked before bcrypt)
+    LOGIN_RATE_LIMIT_ENABLED: bool = True
+    LOGIN_RATE_LIMIT_EMAIL_CAPACITY: int = 5
+    LOGIN_RATE_LIMIT_EMAIL_PER_MINUTE: float = 5
+    LOGIN_RATE_LIMIT_IP_CAPACITY: int = 30
+    LOGIN_RATE_LIMIT_IP_PER_MINUTE: float = 60
+
+    # Refresh token maintenance
+    TOKEN_PARTITION_MONTHS_AHEAD: int = 2
+    TOKEN_REAPER_BATCH_SIZE: int = 1000
+    TOKEN_REAPER_MAX_BATCHES: int = 100
+    TOKEN_REAPER_INTERVAL_SECONDS: int = 3600
+
+    # Responses
+    COMPRESSION_MINIMUM_SIZE: int = 1024
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_ZSTD_LEVEL: int = 3
 
     # CORS
     BACKEND_CORS_ORIGINS: list[str] = []
@@ -1,35 +1,415 @@
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
-from sqlalchemy.orm import DeclarativeBase
+import asyncio
+import functools
+import time
+from contextvars import ContextVar
+from typing import Callable
+from uuid import uuid4
+from fastapi import Depends, HTTPException, Request, Response, status
+from fastapi.routing import APIRoute
+from sqlalchemy import TextClause, event, exc, inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.pool import NullPool
+from sqlalchemy.orm import DeclarativeBase, Mapper, Session
+from redis.exceptions import RedisError
 from app.core.config import settings
+from app.core.redis import get_redis
+from app.core.pool_metrics import InstrumentedQueuePool, instrument_engine
+from app.core.tenant_pool import TenantAffinityPool
+
+
+def _connect_args() -> dict:
+    """
+    asyncpg arguments for DATABASE_PGBOUNCER (PgBouncer in transaction mode).
+
+    Each transaction may run on a different server connection, so no
+    prepared statement is cached for reuse (neither by asyncpg nor by
+    SQLAlchemy), and the ones SQLAlchemy prepares get unique names: they
+    stay behind on the server connection, where another client could
+    otherwise prepare ``__asyncpg_stmt_1__`` again and fail.
+    """
+    if not settings.DATABASE_PGBOUNCER:
+        return {}
+    return {
+        "statement_cache_size": 0,
+        "prepared_statement_cache_size": 0,
+        "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+    }
+
+
+def _create_engine(url: str, name: str) -> AsyncEngine:
+    """
+    An application engine whose pool is instrumented under ``name``.
+
+    With DATABASE_TENANT_AFFINITY the pool prefers connections last used by
+    the request's tenant. Behind PgBouncer the server connection changes
+    with every transaction, so there is nothing to keep.
+    """
+    affinity = settings.DATABASE_TENANT_AFFINITY and not settings.DATABASE_PGBOUNCER
+    return instrument_engine(
+        create_async_engine(
+            url,
+            echo=settings.DEBUG,
+            pool_size=settings.DATABASE_POOL_SIZE,
+            max_overflow=settings.DATABASE_MAX_OVERFLOW,
+            pool_pre_ping=True,
+            poolclass=TenantAffinityPool if affinity else InstrumentedQueuePool,
+            pool_logging_name=name,
+            connect_args=_connect_args(),
+        ),
+        name,
+    )
+
+
+# Name of the shard served by DATABASE_URL, which also holds the public tables
+DEFAULT_SHARD = "default"
 
 # Create async engine
-engine = create_async_engine(
-    str(settings.DATABASE_URL),
-    echo=settings.DEBUG,
-    pool_size=settings.DATABASE_POOL_SIZE,
-    max_overflow=settings.DATABASE_MAX_OVERFLOW,
-    pool_pre_ping=True,
-)
+engine = _create_engine(str(settings.DATABASE_URL), DEFAULT_SHARD)
+
+# Engines of the other shards and of the replicas, created on first use
+_shard_engines: dict[str, AsyncEngine] = {}
+_replica_engines: dict[str, AsyncEngine] = {}
+
+
+def get_shard_engine(shard: str) -> AsyncEngine:
+    """
+    Engine for the database of a tenant shard.
+
+    Shards other than DEFAULT_SHARD come from DATABASE_SHARDS; their engines
+    are created lazily, so a process only connects to the shards it serves.
+    """
+    if shard == DEFAULT_SHARD:
+        return engine
+    shard_engine = _shard_engines.get(shard)
+    if shard_engine is None:
+        if shard not in settings.DATABASE_SHARDS:
+            raise ValueError(f"Unknown shard: {shard}")
+        shard_engine = _shard_engines[shard] = _create_engine(settings.DATABASE_SHARDS[shard], shard)
+    return shard_engine
+
+
+def shard_urls() -> dict[str, str]:
+    """Database URL of every shard, DEFAULT_SHARD first."""
+    return {DEFAULT_SHARD: str(settings.DATABASE_URL), **settings.DATABASE_SHARDS}
+
+
+def get_replica_engine(shard: str) -> AsyncEngine | None:
+    """Engine for the read replica of a shard, or None if it has none."""
+    replica_engine = _replica_engines.get(shard)
+    if replica_engine is None and shard in settings.DATABASE_REPLICAS:
+        replica_engine = _replica_engines[shard] = _create_engine(
+            settings.DATABASE_REPLICAS[shard], f"{shard}-replica"
+        )
+    return replica_engine
+
+
+async def dispose_shard_engines() -> None:
+    """Close the connection pools of every shard and replica engine created so far."""
+    for lazy_engines in (_shard_engines, _replica_engines):
+        for lazy_engine in lazy_engines.values():
+            await lazy_engine.dispose()
+        lazy_engines.clear()
+
+
+def is_tenant_mapper(mapper: Mapper | type | None) -> bool:
+    """True for models stored in tenant schemas (they have no fixed schema)."""
+    return mapper is not None and inspect(mapper).local_table.schema is None
+
+
+class TenantSession(Session):
+    """
+    Session that sends tenant models to the shard of the current tenant.
+
+    ``set_tenant_schema`` puts the tenant's shard in ``session.info``; from
+    then on spaces and reservations (and statements executed with
+    ``bind_arguments={"tenant": True}``) use that shard's engine, while the
+    public tables stay on DATABASE_URL. Tenants on DEFAULT_SHARD use a
+    single connection, as before. Across two databases a commit is not
+    atomic, so requests never write public and tenant rows together.
+
+    Sessions from ``get_read_db`` also have ``info["replica"]`` set and
+    read from the replica of each shard, where one is configured.
+    """
+
+    def get_bind(self, mapper=None, *, clause=None, tenant: bool = False, **kw) -> Engine:
+        shard = self.info.get("shard", DEFAULT_SHARD) if tenant or is_tenant_mapper(mapper) else DEFAULT_SHARD
+        if self.info.get("replica"):
+            replica_engine = get_replica_engine(shard)
+            if replica_engine is not None:
+                return replica_engine.sync_engine
+        if shard != DEFAULT_SHARD:
+            return get_shard_engine(shard).sync_engine
+        return super().get_bind(mapper, clause=clause, **kw)
+
 
 # Create async session factory
 AsyncSessionLocal = async_sessionmaker(
     engine,
     class_=AsyncSession,
+    sync_session_class=TenantSession,
     expire_on_commit=False,
     autocommit=False,
     autoflush=False,
 )
 
 
+def create_worker_engine() -> AsyncEngine:
+    """
+    Create an engine for background workers.
+
+    Dramatiq actors are synchronous and run their async work in a fresh event
+    loop each time, so pooled asyncpg connections cannot be reused across
+    runs. NullPool opens one connection per checkout and closes it after.
+
+    Workers hold session-level advisory locks, so they use
+    DATABASE_DIRECT_URL when it is set (bypassing PgBouncer).
+    """
+    url = settings.DATABASE_DIRECT_URL or str(settings.DATABASE_URL)
+    connect_args = {} if settings.DATABASE_DIRECT_URL else _connect_args()
+    return create_async_engine(url, poolclass=NullPool, connect_args=connect_args)
+
+
+# Transaction-local setting the shared-tenancy RLS policies filter on
+TENANT_ID_SETTING = "app.tenant_id"
+
+
+def set_local(values: dict[str, str]) -> TextClause:
+    """
+    A statement applying ``values`` (setting name -> value) as
+    transaction-local settings, the equivalent of ``SET LOCAL`` for each.
+    """
+    calls, params = [], {}
+    for index, (name, value) in enumerate(values.items()):
+        calls.append(f"set_config(:name_{index}, :value_{index}, true)")
+        params[f"name_{index}"], params[f"value_{index}"] = name, value
+    return text(f"SELECT {', '.join(calls)}").bindparams(**params)
+
+
+def transaction_settings(session: Session) -> dict[str, str]:
+    """
+    The settings every transaction of ``session`` starts with: the tenant's
+    (see ``set_tenant_schema``) and, for a request with a deadline, a
+    ``statement_timeout`` of the time left until it.
+    """
+    values = dict(session.info.get("tenant_settings") or {})
+    deadline = session.info.get("deadline")
+    if deadline is not None:
+        values["statement_timeout"] = str(max(1, int((deadline - time.monotonic()) * 1000)))
+    return values
+
+
+@event.listens_for(Session, "after_begin")
+def apply_tenant_context(session: Session, transaction, connection) -> None:
+    """
+    Apply the transaction settings at the start of every transaction.
+
+    ``set_tenant_schema`` puts the tenant's in ``session.info["tenant_settings"]``:
+    the ``search_path`` of the tenant schema and, for shared-tenancy
+    organizations, ``app.tenant_id``. They are transaction-local, so they
+    never leak to the next user of a pooled connection (or, behind
+    PgBouncer in transaction mode, of a server connection), but must be
+    re-applied after each commit, e.g. for the refresh that follows it.
+    """
+    session.info["transactions_begun"] = session.info.get("transactions_begun", 0) + 1
+    values = transaction_settings(session)
+    if values:
+        connection.execute(set_local(values))
+
+
+# Cookie holding the time until which a client that wrote reads from the primaries
+READ_PRIMARY_COOKIE = "read_primary_until"
+# Redis key (plus organization id) present while an organization's reads use the primaries
+TENANT_WRITE_PREFIX = "read_primary:"
+
+
+class WriteTracker:
+    """Whether the sessions of the current request committed a write."""
+
+    def __init__(self) -> None:
+        self.committed = False
+
+
+# Set per request by ReadYourWritesMiddleware
+request_writes: ContextVar[WriteTracker | None] = ContextVar("request_writes", default=None)
+
+
+@event.listens_for(Session, "after_flush")
+def _flushed_write(session: Session, flush_context) -> None:
+    session.info["wrote"] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _executed_write(orm_execute_state) -> None:
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["wrote"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _committed_write(session: Session) -> None:
+    tracker = request_writes.get()
+    if session.info.pop("wrote", False) and tracker is not None:
+        tracker.committed = True
+
+
+@event.listens_for(Session, "after_rollback")
+def _rolled_back_write(session: Session) -> None:
+    session.info.pop("wrote", None)
+
+
 class Base(DeclarativeBase):
     """Base class for all database models."""
     pass
 
 
+# Sessions opened by get_db for the request being served, and its deadline
+# (time.monotonic()); both are set by DatabaseRoute
+request_sessions: ContextVar[list[AsyncSession] | None] = ContextVar("request_sessions", default=None)
+request_deadline: ContextVar[float | None] = ContextVar("request_deadline", default=None)
+
+# SQLSTATE of statements cancelled by statement_timeout (or a cancel request)
+QUERY_CANCELED = "57014"
+
+
 async def get_db() -> AsyncSession:
-    """Dependency for getting async database sessions."""
+    """
+    Dependency for getting async database sessions.
+
+    The session checks out a connection on its first statement, so requests
+    that fail authentication or never query hold none. On DatabaseRoute
+    routes it is closed as soon as the endpoint returns, and its statements
+    time out at the request's deadline.
+    """
     async with AsyncSessionLocal() as session:
+        sessions = request_sessions.get()
+        if sessions is not None:
+            sessions.append(session)
+            session.info["deadline"] = request_deadline.get()
         try:
             yield session
         finally:
             await session.close()
+
+
+def _closing_sessions(endpoint: Callable) -> Callable:
+    """
+    Wrap an endpoint to close the request's sessions once it returns or
+    raises, and to answer 504 when a statement hits the deadline.
+    """
+
+    @functools.wraps(endpoint)
+    async def wrapper(*args, **kwargs):
+        try:
+            return await endpoint(*args, **kwargs)
+        except exc.DBAPIError as error:
+            if getattr(error.orig, "sqlstate", None) == QUERY_CANCELED:
+                raise HTTPException(
+                    status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="Request deadline exceeded",
+                ) from error
+            raise
+        finally:
+            for session in request_sessions.get() or ():
+                await session.close()
+
+    return wrapper
+
+
+async def _cancel_on_disconnect(request: Request, task: asyncio.Task, disconnected: list) -> None:
+    while (await request.receive())["type"] != "http.disconnect":
+        pass
+    disconnected.append(True)
+    task.cancel()
+
+
+class DatabaseRoute(APIRoute):
+    """
+    Route that bounds how long a request holds database connections.
+
+    FastAPI only runs the teardown of ``get_db`` after serializing the
+    response (recent versions: after sending it), so a route holds its
+    connection, mid-transaction, for all of that. Here the sessions are
+    closed as soon as the endpoint is done: nothing is committed, and the
+    objects it returns are detached with their loaded attributes, so they
+    serialize as before.
+
+    Each request also gets a deadline, REQUEST_DEADLINES[route name] or
+    REQUEST_DEADLINE_SECONDS. Transactions start with a ``statement_timeout``
+    of the time left, and the endpoint is cancelled at the deadline (504)
+    or as soon as the client disconnects. Cancelling a running query makes
+    asyncpg send the server a cancel request, so neither the connection nor
+    the backend stays busy for a client that is gone.
+    """
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs) -> None:
+        super().__init__(path, _closing_sessions(endpoint), **kwargs)
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request) -> Response:
+            seconds = settings.REQUEST_DEADLINES.get(self.name, settings.REQUEST_DEADLINE_SECONDS)
+            request_sessions.set([])
+            request_deadline.set(time.monotonic() + seconds)
+            # With the body read, the only message left to receive is the disconnect
+            await request.body()
+            task, disconnected = asyncio.current_task(), []
+            watcher = asyncio.create_task(_cancel_on_disconnect(request, task, disconnected))
+            try:
+                async with asyncio.timeout(seconds):
+                    return await handler(request)
+            except TimeoutError:
+                raise HTTPException(
+                    status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="Request deadline exceeded",
+                )
+            except asyncio.CancelledError:
+                if not disconnected:
+                    raise
+                task.uncancel()
+                # Nobody is left to read it
+                return Response(status_code=499)
+            finally:
+                watcher.cancel()
+
+        return route_handler
+
+
+def wrote_recently(request: Request) -> bool:
+    """True while the client's last write may not have reached the replicas."""
+    try:
+        return float(request.cookies.get(READ_PRIMARY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+async def mark_tenant_write(tenant_id: int) -> None:
+    """Send every read of ``tenant_id`` to the primaries for READ_YOUR_WRITES_SECONDS."""
+    await get_redis().set(
+        f"{TENANT_WRITE_PREFIX}{tenant_id}", 1, px=int(settings.READ_YOUR_WRITES_SECONDS * 1000),
+    )
+
+
+async def tenant_wrote_recently(tenant_id: int) -> bool:
+    """True while a write of ``tenant_id``, from any client, may not have reached the replicas."""
+    try:
+        return bool(await get_redis().exists(f"{TENANT_WRITE_PREFIX}{tenant_id}"))
+    except RedisError:
+        # Without the marks, only the primaries are sure to be up to date
+        return True
+
+
+async def get_read_db(request: Request, db: AsyncSession = Depends(get_db)) -> AsyncSession:
+    """
+    Dependency for read-only routes: the session reads from the replicas.
+
+    Within READ_YOUR_WRITES_SECONDS of a write (see
+    ReadYourWritesMiddleware), the client that wrote and every other member
+    of its organization keep reading from the primaries, so nobody sees the
+    organization's data go back in time despite replication lag.
+    """
+    if wrote_recently(request):
+        return db
+    tenant_id = getattr(request.state, "tenant_id", None)
+    if tenant_id is not None and await tenant_wrote_recently(tenant_id):
+        return db
+    db.info["replica"] = True
+    return db
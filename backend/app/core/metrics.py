@@ -0,0 +1,181 @@
+"""
+In-process metrics in the Prometheus text format.
+
+A deliberately small registry: counters, histograms with fixed buckets,
+and gauges read from a callback at scrape time. Every worker process keeps
+its own values; ``GET /metrics`` renders the ones of the process that
+answers, so scrape each worker (or run one worker per container).
+"""
+import math
+import threading
+import time
+from typing import Callable, Iterable
+
+# Latency buckets in seconds, from sub-millisecond pool checkouts to slow requests
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_metrics: dict[str, "Metric"] = {}
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    """Base class: a named metric with a fixed set of label names."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        if name in _metrics:
+            raise ValueError(f"Metric already registered: {name}")
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        _metrics[name] = self
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        return "\n".join(lines + self.samples())
+
+
+class Counter(Metric):
+    """A monotonically increasing count."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> list[str]:
+        return [
+            f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+            for key, value in sorted(self._values.items())
+        ]
+
+
+class Histogram(Metric):
+    """Observations counted into cumulative buckets, with their sum."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Iterable[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # Per label set: count per bucket (not cumulative), sum
+        self._values: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * len(self.buckets), [0.0]))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            total[0] += value
+
+    def count(self, **labels: str) -> int:
+        entry = self._values.get(self._key(labels))
+        return sum(entry[0]) if entry else 0
+
+    def samples(self) -> list[str]:
+        lines = []
+        for key, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(total[0])}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+
+class Gauge(Metric):
+    """A current value per label set, read from ``callback`` at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        callback: Callable[[], dict[tuple[str, ...], float]],
+        labels: Iterable[str] = (),
+    ):
+        super().__init__(name, documentation, labels)
+        self.callback = callback
+
+    def samples(self) -> list[str]:
+        return [
+            f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+            for key, value in sorted(self.callback().items())
+        ]
+
+
+class DecayingAverage:
+    """
+    An exponentially weighted average of irregular samples that decays
+    toward zero while no samples arrive, so a signal that stops (e.g. pool
+    waits while every request is being turned away) does not stay high.
+    """
+
+    def __init__(self, weight: float = 0.2, half_life: float = 2.0):
+        self.weight = weight
+        self.half_life = half_life
+        self._value = 0.0
+        self._updated = time.monotonic()
+
+    def _decayed(self, now: float) -> float:
+        return self._value * 0.5 ** ((now - self._updated) / self.half_life)
+
+    def add(self, sample: float) -> None:
+        now = time.monotonic()
+        value = self._decayed(now)
+        self._value = value + self.weight * (sample - value)
+        self._updated = now
+
+    @property
+    def value(self) -> float:
+        return self._decayed(time.monotonic())
+
+
+def render_metrics() -> str:
+    """All registered metrics in the Prometheus text exposition format."""
+    return "\n".join(metric.render() for metric in _metrics.values()) + "\n"
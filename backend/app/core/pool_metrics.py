@@ -0,0 +1,140 @@
+"""
+Connection pool instrumentation.
+
+Every application engine is created with ``InstrumentedQueuePool`` and
+passed to ``instrument_engine``, which records (labelled by pool name):
+
+- how long checkouts wait for a connection, and checkouts that time out;
+- checkouts that open a connection beyond ``pool_size`` (overflow) and
+  checkouts that find every connection, overflow included, in use
+  (exhaustion: they have to wait for a checkin);
+- how long connections stay checked out, per endpoint (route name), so
+  the routes that hold connections longest stand out;
+- connections found dead by ``pool_pre_ping``;
+- the age of connections at checkout;
+- pool size, checked-out and idle connections, read at scrape time.
+
+``RECENT_CHECKOUT_WAIT`` keeps a decaying average of checkout waits across
+pools, which the load shedder adds to its latency estimates.
+
+The endpoint comes from the ASGI scope that ``PoolMetricsMiddleware`` puts
+in ``current_request``; checkouts outside a request are labelled ``-``.
+"""
+import time
+from contextvars import ContextVar
+from sqlalchemy import event, exc
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.types import Scope
+from app.core.metrics import Counter, DecayingAverage, Gauge, Histogram
+
+# ASGI scope of the request being served
+current_request: ContextVar[Scope | None] = ContextVar("current_request", default=None)
+
+CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection", ["pool"],
+)
+CHECKOUT_TIMEOUTS = Counter(
+    "db_pool_checkout_timeouts_total", "Checkouts that gave up after pool_timeout", ["pool"],
+)
+OVERFLOW_CHECKOUTS = Counter(
+    "db_pool_overflow_checkouts_total", "Checkouts beyond pool_size (max_overflow connections)", ["pool"],
+)
+EXHAUSTED_CHECKOUTS = Counter(
+    "db_pool_exhausted_total", "Checkouts that found every connection in use and had to wait", ["pool"],
+)
+CONNECTION_HOLD = Histogram(
+    "db_pool_connection_hold_seconds", "Time connections stay checked out", ["pool", "endpoint"],
+)
+PRE_PING_FAILURES = Counter(
+    "db_pool_pre_ping_failures_total", "Pooled connections found dead by pool_pre_ping", ["pool"],
+)
+CONNECTION_AGE = Histogram(
+    "db_pool_connection_age_seconds",
+    "Age of connections at checkout",
+    ["pool"],
+    buckets=(1, 10, 60, 300, 900, 1800, 3600, 4 * 3600, 24 * 3600),
+)
+
+# Recent checkout wait of every pool, in seconds
+RECENT_CHECKOUT_WAIT = DecayingAverage()
+
+_engines: dict[str, AsyncEngine] = {}
+
+
+def _pool_gauge(stat):
+    return lambda: {(name,): stat(engine.sync_engine.pool) for name, engine in _engines.items()}
+
+
+Gauge("db_pool_size", "Configured pool_size", _pool_gauge(lambda pool: pool.size()), ["pool"])
+Gauge("db_pool_checked_out", "Connections checked out now", _pool_gauge(lambda pool: pool.checkedout()), ["pool"])
+Gauge("db_pool_idle", "Idle connections in the pool now", _pool_gauge(lambda pool: pool.checkedin()), ["pool"])
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """
+    The async engine pool, timing every checkout.
+
+    The pool is labelled by its ``logging_name`` (``pool_logging_name`` of
+    the engine), which is carried over when ``dispose()`` recreates it.
+    """
+
+    def _do_get(self):
+        name = self.logging_name or "-"
+        if self.checkedin() == 0 and -1 < self._max_overflow <= self.overflow():
+            EXHAUSTED_CHECKOUTS.inc(pool=name)
+        started = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except exc.TimeoutError:
+            CHECKOUT_TIMEOUTS.inc(pool=name)
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            CHECKOUT_WAIT.observe(waited, pool=name)
+            RECENT_CHECKOUT_WAIT.add(waited)
+        if self.checkedout() > self.size():
+            OVERFLOW_CHECKOUTS.inc(pool=name)
+        return record
+
+
+def endpoint_label(scope: Scope | None) -> str:
+    """
+    The name of the route serving a request (its endpoint function), which
+    keeps the label bounded no matter which paths clients request.
+    """
+    if scope is None:
+        return "-"
+    return getattr(scope.get("route"), "name", None) or "unmatched"
+
+
+def instrument_engine(engine: AsyncEngine, name: str) -> AsyncEngine:
+    """Record the pool events of ``engine`` under ``name``."""
+    _engines[name] = engine
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "checkout")
+    def on_checkout(dbapi_connection, record, proxy) -> None:
+        now = time.time()
+        record.info["checked_out_at"] = time.perf_counter()
+        record.info["endpoint"] = endpoint_label(current_request.get())
+        CONNECTION_AGE.observe(now - record.starttime, pool=name)
+
+    @event.listens_for(sync_engine, "checkin")
+    def on_checkin(dbapi_connection, record) -> None:
+        checked_out_at = record.info.pop("checked_out_at", None)
+        if checked_out_at is not None:
+            CONNECTION_HOLD.observe(
+                time.perf_counter() - checked_out_at,
+                pool=name,
+                endpoint=record.info.pop("endpoint", "-"),
+            )
+
+    @event.listens_for(sync_engine, "invalidate")
+    def on_invalidate(dbapi_connection, record, exception) -> None:
+        # Pre-ping failures invalidate with a DisconnectionError; errors
+        # raised by statements carry the driver's exception instead
+        if isinstance(exception, exc.DisconnectionError):
+            PRE_PING_FAILURES.inc(pool=name)
+
+    return engine
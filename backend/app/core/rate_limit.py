@@ -0,0 +1,94 @@
+"""
+Redis-backed token bucket rate limiting.
+
+Each bucket is a Redis hash ``{tokens, ts}`` refilled continuously at a fixed
+rate up to its capacity. Several buckets (e.g. per email and per client IP)
+are checked and charged in one Lua script, so the decision is atomic across
+all app instances and costs a single round trip.
+"""
+import logging
+from dataclasses import dataclass
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+
+# KEYS = bucket keys
+# ARGV[1] = cost, then (capacity, refill per second) for each key
+# Returns 0 when allowed, otherwise the milliseconds until every bucket
+# holds enough tokens. Nothing is charged unless all buckets allow it.
+_TOKEN_BUCKET_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local cost = tonumber(ARGV[1])
+local levels = {}
+local wait = 0
+
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2])
+    local rate = tonumber(ARGV[i * 2 + 1]) / 1000
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+    levels[i] = tokens
+    if tokens < cost then
+        wait = math.max(wait, math.ceil((cost - tokens) / rate))
+    end
+end
+
+if wait > 0 then
+    return wait
+end
+
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2])
+    local rate = tonumber(ARGV[i * 2 + 1]) / 1000
+    local tokens = levels[i] - cost
+    redis.call('HSET', key, 'tokens', tokens, 'ts', now)
+    redis.call('PEXPIRE', key, math.ceil((capacity - tokens) / rate) + 1000)
+end
+return 0
+"""
+
+
+@dataclass
+class Bucket:
+    """A single bucket: its key, burst capacity and steady refill rate."""
+    key: str
+    capacity: float
+    refill_per_second: float
+
+
+class TokenBucketLimiter:
+    """
+    Atomic multi-bucket token bucket limiter.
+
+    Fails open: if Redis is unreachable the request is allowed and a warning
+    is logged, so a Redis outage never locks every user out.
+    """
+
+    def __init__(self, redis: Redis, prefix: str = "ratelimit:"):
+        self.redis = redis
+        self.prefix = prefix
+        self._script = redis.register_script(_TOKEN_BUCKET_SCRIPT)
+
+    async def acquire(self, buckets: list[Bucket], cost: float = 1) -> float:
+        """
+        Charge ``cost`` tokens from every bucket.
+
+        Returns 0 when allowed, otherwise the number of seconds to wait
+        before retrying (nothing is charged in that case).
+        """
+        args = [cost]
+        for bucket in buckets:
+            args.extend([bucket.capacity, bucket.refill_per_second])
+        try:
+            wait_ms = await self._script(
+                keys=[self.prefix + bucket.key for bucket in buckets], args=args
+            )
+        except RedisError as exc:
+            logger.warning(f"Rate limiter unavailable, allowing request: {exc}")
+            return 0
+        return int(wait_ms) / 1000
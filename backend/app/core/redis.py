@@ -0,0 +1,35 @@
+"""
+Shared async Redis client.
+"""
+from redis.asyncio import BlockingConnectionPool, Redis
+from app.core.config import settings
+
+_client: Redis | None = None
+
+
+def get_redis() -> Redis:
+    """
+    Return the process-wide Redis client, creating it on first use.
+
+    Commands beyond ``REDIS_MAX_CONNECTIONS`` at once wait for a free
+    connection rather than fail with "Too many connections", which would
+    make every fail-open check (e.g. the login limiter) pass during the
+    very bursts it is there for.
+    """
+    global _client
+    if _client is None:
+        _client = Redis(connection_pool=BlockingConnectionPool.from_url(
+            settings.REDIS_URL,
+            decode_responses=True,
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+            timeout=settings.REDIS_POOL_TIMEOUT_SECONDS,
+        ))
+    return _client
+
+
+async def close_redis() -> None:
+    """Close the shared client (called on application shutdown)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,51 @@
+"""
+Access token revocation list in Redis.
+
+Access tokens are checked against two kinds of entries, fetched with a
+single MGET per request:
+
+- ``revoked:jti:<jti>`` revokes one token (e.g. on logout).
+- ``revoked:sub:<user_id>`` holds a timestamp; every token for that user
+  issued at or before it is revoked (on deactivation and password change).
+
+Timestamps and ``iat`` claims have sub-second precision, so a token issued
+right after a user-wide revocation (e.g. by the password change itself) is
+not caught by it. Only stateless auth mode consults the list; in database
+mode every request reloads the user anyway.
+
+Every entry expires when the newest token it can refer to would have
+expired anyway, so the list stays as small as the set of live revocations.
+"""
+import time
+from datetime import datetime, timezone
+from app.core.config import settings
+from app.core.redis import get_redis
+
+JTI_PREFIX = "revoked:jti:"
+SUBJECT_PREFIX = "revoked:sub:"
+
+
+async def revoke_access_token(jti: str, expires_at: datetime) -> None:
+    """Revoke a single access token until it expires."""
+    ttl = int((expires_at - datetime.now(timezone.utc)).total_seconds())
+    if ttl > 0:
+        await get_redis().set(JTI_PREFIX + jti, 1, ex=ttl)
+
+
+async def revoke_user_tokens(user_id: int) -> None:
+    """Revoke every access token issued to ``user_id`` so far."""
+    await get_redis().set(
+        SUBJECT_PREFIX + str(user_id),
+        time.time(),
+        ex=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    )
+
+
+async def is_token_revoked(payload: dict) -> bool:
+    """Whether a decoded access token has been revoked."""
+    jti_key = JTI_PREFIX + str(payload.get("jti"))
+    subject_key = SUBJECT_PREFIX + str(payload.get("sub"))
+    revoked_jti, revoked_at = await get_redis().mget(jti_key, subject_key)
+    if payload.get("jti") and revoked_jti is not None:
+        return True
+    return revoked_at is not None and float(payload.get("iat", 0)) <= float(revoked_at)
@@ -1,24 +1,47 @@
+import asyncio
+import hashlib
+import os
+import time
 from datetime import datetime, timedelta, timezone
 from typing import Any
 from uuid import uuid4
+import anyio
+import bcrypt
+from anyio.to_thread import run_sync
+from fastapi import HTTPException, status
 from jose import jwt, JWTError
 from app.core.config import settings
 
 
-def create_access_token(subject: str | Any, tenant_id: int, expires_delta: timedelta = None) -> str:
-    """Create JWT access token with user and tenant information."""
+def create_access_token(
+    subject: str | Any,
+    tenant_id: int,
+    expires_delta: timedelta = None,
+    claims: dict | None = None,
+) -> str:
+    """
+    Create JWT access token with user and tenant information.
+
+    ``claims`` are embedded as-is; in stateless auth mode they carry the
+    user's status, role and tenant schema so requests need no lookups.
+    """
+    now = datetime.now(timezone.utc)
     if expires_delta:
-        expire = datetime.now(timezone.utc) + expires_delta
+        expire = now + expires_delta
     else:
-        expire = datetime.now(timezone.utc) + timedelta(
+        expire = now + timedelta(
             minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES
         )
     
     to_encode = {
+        **(claims or {}),
         "exp": expire,
+        # Sub-second, so a user-wide revocation spares tokens issued just after it
+        "iat": now.timestamp(),
         "sub": str(subject),
         "tenant_id": tenant_id,
-        "type": "access"
+        "type": "access",
+        "jti": str(uuid4()),  # Identifies the token for revocation
     }
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
@@ -30,7 +53,7 @@ def create_refresh_token(subject: str | Any, expires_delta: timedelta = None) ->
         expire = datetime.now(timezone.utc) + expires_delta
     else:
         expire = datetime.now(timezone.utc) + timedelta(
-            minutes=settings.REFRESH_TOKEN_EXPIRE_MINUTES if hasattr(settings, "REFRESH_TOKEN_EXPIRE_MINUTES") else 60 * 24 * 7
+            minutes=settings.REFRESH_TOKEN_EXPIRE_MINUTES
         )
     
     to_encode = {
@@ -43,13 +66,112 @@ def create_refresh_token(subject: str | Any, expires_delta: timedelta = None) ->
     return encoded_jwt
 
 
-import bcrypt
+def hash_token(token: str) -> bytes:
+    """Return the fixed-size SHA-256 digest used to store and look up a token."""
+    return hashlib.sha256(token.encode("utf-8")).digest()
+
+
+# Cost chosen by calibrate_bcrypt_rounds(), cached for the process lifetime
+_bcrypt_rounds: int | None = None
+
+# Threads hashing passwords at once, and the event loop they belong to
+_hash_limiter: tuple[asyncio.AbstractEventLoop, anyio.CapacityLimiter] | None = None
+
+
+def password_hash_concurrency() -> int:
+    """bcrypt calls run at once per process: PASSWORD_HASH_CONCURRENCY, or one per available core."""
+    if settings.PASSWORD_HASH_CONCURRENCY:
+        return settings.PASSWORD_HASH_CONCURRENCY
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def password_hash_queue_limit() -> int:
+    """
+    bcrypt calls that may wait per process: PASSWORD_HASH_QUEUE_LIMIT, or as
+    many as the hashing threads finish within LOAD_SHED_LATENCY_BUDGET_SECONDS
+    at PASSWORD_HASH_TARGET_MS each.
+    """
+    if settings.PASSWORD_HASH_QUEUE_LIMIT is not None:
+        return settings.PASSWORD_HASH_QUEUE_LIMIT
+    per_thread = settings.LOAD_SHED_LATENCY_BUDGET_SECONDS * 1000 / settings.PASSWORD_HASH_TARGET_MS
+    return max(1, int(per_thread * password_hash_concurrency()))
+
+
+async def run_password_hash(func, *args):
+    """
+    Run a bcrypt call (hash or verify) in a worker thread.
+
+    At most ``password_hash_concurrency()`` run at once per process; the
+    rest queue. A burst of logins then delays other logins only. On the
+    shared threadpool, dozens of bcrypt threads would take every core from
+    the event loop, and the whole API would slow down with them. Once
+    ``password_hash_queue_limit()`` calls are waiting, further ones get 503
+    at once instead of holding their request open past the latency budget.
+    """
+    global _hash_limiter
+    loop = asyncio.get_running_loop()
+    if _hash_limiter is None or _hash_limiter[0] is not loop:
+        _hash_limiter = (loop, anyio.CapacityLimiter(password_hash_concurrency()))
+    limiter = _hash_limiter[1]
+    if limiter.statistics().tasks_waiting >= password_hash_queue_limit():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many sign-ins in progress, retry later",
+            headers={"Retry-After": "1"},
+        )
+    return await run_sync(func, *args, limiter=limiter)
+
+
+def calibrate_bcrypt_rounds(
+    target_ms: float | None = None,
+    min_rounds: int | None = None,
+    max_rounds: int | None = None,
+) -> int:
+    """
+    Pick the highest bcrypt cost whose hash time fits ``target_ms`` on this CPU.
+
+    One hash is timed at ``min_rounds``; every extra round doubles the work,
+    so the cost for the budget is extrapolated from that single sample.
+    """
+    target_ms = target_ms or settings.PASSWORD_HASH_TARGET_MS
+    min_rounds = min_rounds or settings.BCRYPT_MIN_ROUNDS
+    max_rounds = max_rounds or settings.BCRYPT_MAX_ROUNDS
+
+    start = time.perf_counter()
+    bcrypt.hashpw(b"calibration", bcrypt.gensalt(rounds=min_rounds))
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    rounds = min_rounds
+    while rounds < max_rounds and elapsed_ms * 2 <= target_ms:
+        elapsed_ms *= 2
+        rounds += 1
+    return rounds
+
+
+def bcrypt_rounds() -> int:
+    """Target bcrypt cost: ``BCRYPT_ROUNDS`` if set, otherwise calibrated once."""
+    global _bcrypt_rounds
+    if settings.BCRYPT_ROUNDS:
+        return settings.BCRYPT_ROUNDS
+    if _bcrypt_rounds is None:
+        _bcrypt_rounds = calibrate_bcrypt_rounds()
+    return _bcrypt_rounds
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash."""
     return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
 
 
+def password_needs_rehash(hashed_password: str) -> bool:
+    """Whether a stored hash was made with a cost other than the current target."""
+    # bcrypt hashes look like $2b$<cost>$<salt+digest>
+    return int(hashed_password.split("$")[2]) != bcrypt_rounds()
+
+
 def get_password_hash(password: str) -> str:
     """Hash a password for storing."""
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    salt = bcrypt.gensalt(rounds=bcrypt_rounds())
+    return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
@@ -0,0 +1,140 @@
+"""
+Shared-table tenancy.
+
+Organizations with ``tenancy = SHARED`` keep their spaces and reservations
+in ``shared.spaces`` and ``shared.reservations`` instead of a schema of
+their own, so the catalog does not grow with every organization. Each row
+carries an ``organization_id`` that leads every primary key and index, and
+row-level security policies only expose the rows of the organization in
+the transaction-local ``app.tenant_id`` setting. The column defaults to
+that setting too, so the tenant models work unchanged: requests set
+``search_path`` to ``shared`` and ``app.tenant_id``, and the session
+re-applies both at the start of every transaction (see
+``app.core.database``).
+
+RLS does not apply to superusers or roles with BYPASSRLS, so the
+application must connect with an ordinary role in shared mode.
+
+The shared tables are versioned with the tenant schemas
+(``SHARED_MIGRATIONS`` in ``app.core.tenant_migrations``):
+``scripts/migrate_tenant_schemas.py`` creates and upgrades them.
+
+``convert_organization`` moves a schema-per-tenant organization into the
+shared tables.
+"""
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from app.core.database import DEFAULT_SHARD, TENANT_ID_SETTING
+from app.core.tenant_cache import forget_schema
+from app.core.tenant_migrations import execute_script, quote_ident
+from app.models.tenant import (
+    SHARED_TENANT_SCHEMA,
+    Organization,
+    OrganizationStatus,
+    OrganizationTenancy,
+)
+
+# Prefix given to a converted organization's old schema, kept as a backup
+RETIRED_SCHEMA_PREFIX = "retired_"
+
+# Columns copied by the converter, besides organization_id
+_SPACE_COLUMNS = (
+    "id, name, description, space_type, capacity, price_per_unit, "
+    "is_available, floor, area_sqm, created_at, updated_at"
+)
+_RESERVATION_COLUMNS = (
+    "id, user_id, space_id, start_time, end_time, total_price, "
+    "status, notes, created_at, updated_at"
+)
+
+
+async def bypasses_rls(db: AsyncSession) -> bool:
+    """True if the connected role ignores row-level security."""
+    return await db.scalar(text(
+        "SELECT rolsuper OR rolbypassrls FROM pg_roles WHERE rolname = current_user"
+    ))
+
+
+async def convert_organization(
+    engine: AsyncEngine,
+    organization_id: int,
+    drop_schema: bool = False,
+) -> dict | None:
+    """
+    Move one schema-per-tenant organization into the shared tables.
+
+    Runs in a single transaction: the tenant tables are locked against
+    writes, their rows are copied with their ids (primary keys lead with
+    ``organization_id``, so ids only need to be unique per organization),
+    the organization switches to SHARED, and the old schema is renamed to
+    ``retired_<schema>`` (or dropped). A request that was waiting on the
+    lock then fails instead of writing to the retired tables. Only
+    organizations on the default shard (next to the shared tables) can be
+    converted. Returns the number of rows copied, or None if there was
+    nothing to convert.
+    """
+    async with AsyncSession(engine, expire_on_commit=False) as db:
+        organization = await db.scalar(
+            select(Organization).where(Organization.id == organization_id).with_for_update()
+        )
+        if (
+            organization is None
+            or organization.tenancy == OrganizationTenancy.SHARED.value
+            or organization.status != OrganizationStatus.ACTIVE.value
+            or organization.shard != DEFAULT_SHARD
+        ):
+            return None
+        schema_name = organization.schema_name
+        schema = quote_ident(schema_name)
+
+        await db.execute(
+            text(f"SELECT set_config('{TENANT_ID_SETTING}', :tenant_id, true)"),
+            {"tenant_id": str(organization_id)},
+        )
+        await db.execute(text(
+            f"LOCK TABLE {schema}.spaces, {schema}.reservations IN EXCLUSIVE MODE"
+        ))
+        spaces = await db.execute(text(f"""
+            INSERT INTO {SHARED_TENANT_SCHEMA}.spaces (organization_id, {_SPACE_COLUMNS})
+            SELECT :organization_id, {_SPACE_COLUMNS} FROM {schema}.spaces
+        """), {"organization_id": organization_id})
+        reservations = await db.execute(text(f"""
+            INSERT INTO {SHARED_TENANT_SCHEMA}.reservations (organization_id, {_RESERVATION_COLUMNS})
+            SELECT :organization_id, {_RESERVATION_COLUMNS} FROM {schema}.reservations
+        """), {"organization_id": organization_id})
+
+        # The sequences are shared: keep them ahead of this organization's ids
+        for table in ("spaces", "reservations"):
+            await db.execute(text(f"""
+                SELECT setval(
+                    pg_get_serial_sequence('{SHARED_TENANT_SCHEMA}.{table}', 'id'),
+                    greatest(
+                        (SELECT last_value FROM {SHARED_TENANT_SCHEMA}.{table}_id_seq),
+                        (SELECT coalesce(max(id), 1) FROM {schema}.{table})
+                    )
+                )
+            """))
+
+        if drop_schema:
+            await execute_script(db, f"DROP SCHEMA {schema} CASCADE;")
+        else:
+            retired = f"{RETIRED_SCHEMA_PREFIX}{schema_name}"[:63]
+            await execute_script(db, f"ALTER SCHEMA {schema} RENAME TO {quote_ident(retired)};")
+        organization.tenancy = OrganizationTenancy.SHARED.value
+        await db.commit()
+
+    forget_schema(organization_id)
+    return {"spaces": spaces.rowcount, "reservations": reservations.rowcount}
+
+
+async def convertible_organizations(engine: AsyncEngine) -> list[tuple[int, str]]:
+    """(id, slug) of every ACTIVE default-shard organization on its own schema."""
+    async with AsyncSession(engine) as db:
+        result = await db.execute(
+            select(Organization.id, Organization.slug)
+            .where(Organization.tenancy == OrganizationTenancy.SCHEMA.value)
+            .where(Organization.status == OrganizationStatus.ACTIVE.value)
+            .where(Organization.shard == DEFAULT_SHARD)
+            .order_by(Organization.id)
+        )
+        return [tuple(row) for row in result]
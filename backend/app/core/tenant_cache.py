@@ -0,0 +1,72 @@
+"""
+In-process cache of organization id -> tenant schema name and shard.
+
+The cached schema is the one holding the organization's data (its own
+schema, or the shared one for shared tenancy), and the shard names the
+database it lives in. Both only change when an organization is converted
+to shared tenancy or moved to another shard, so entries are bounded by
+``TENANT_CACHE_TTL_SECONDS`` to let those changes and deleted
+organizations age out. Each worker process has its own cache.
+
+Organizations' plans (see ``app.core.tenant_quotas``) are cached alongside,
+for the same time.
+"""
+import time
+from app.core.config import settings
+from app.core.database import DEFAULT_SHARD
+
+_schemas: dict[int, tuple[str, str, float]] = {}
+_plans: dict[int, tuple[str, float]] = {}
+
+
+def _get_entry(organization_id: int | None) -> tuple[str, str, float] | None:
+    entry = _schemas.get(organization_id)
+    if entry is not None and entry[2] < time.monotonic():
+        _schemas.pop(organization_id, None)
+        return None
+    return entry
+
+
+def get_cached_schema(organization_id: int | None) -> str | None:
+    """Return the cached schema for an organization, if fresh."""
+    entry = _get_entry(organization_id)
+    return entry[0] if entry else None
+
+
+def get_cached_shard(organization_id: int | None) -> str | None:
+    """Return the cached shard for an organization, if fresh."""
+    entry = _get_entry(organization_id)
+    return entry[1] if entry else None
+
+
+def cache_schema(organization_id: int, schema_name: str, shard: str = DEFAULT_SHARD) -> None:
+    """Remember the schema and shard of an organization."""
+    _schemas[organization_id] = (
+        schema_name, shard, time.monotonic() + settings.TENANT_CACHE_TTL_SECONDS
+    )
+
+
+def get_cached_plan(organization_id: int | None) -> str | None:
+    """Return the cached plan for an organization, if fresh."""
+    entry = _plans.get(organization_id)
+    if entry is None or entry[1] < time.monotonic():
+        _plans.pop(organization_id, None)
+        return None
+    return entry[0]
+
+
+def cache_plan(organization_id: int, plan: str) -> None:
+    """Remember the plan of an organization."""
+    _plans[organization_id] = (plan, time.monotonic() + settings.TENANT_CACHE_TTL_SECONDS)
+
+
+def forget_schema(organization_id: int) -> None:
+    """Drop the cached schema, shard and plan of one organization."""
+    _schemas.pop(organization_id, None)
+    _plans.pop(organization_id, None)
+
+
+def clear_schema_cache() -> None:
+    """Forget every cached schema and plan."""
+    _schemas.clear()
+    _plans.clear()
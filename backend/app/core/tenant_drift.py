@@ -0,0 +1,287 @@
+"""
+Detection of drift between tenant schemas and the tenant models.
+
+Expectations are derived from the ``Space`` and ``Reservation`` models (plus
+the declared ``TENANT_ONLINE_INDEXES``), and the actual state of every
+tenant schema is read from ``pg_catalog`` in one grouped query, so checking
+thousands of schemas costs a single round trip instead of several
+``information_schema`` queries per tenant. The shared tables are checked
+too, against the same models with ``organization_id`` leading every key and
+index.
+
+Indexes and constraints are compared by definition rather than by name:
+tenant index names embed the schema name, and constraint names generated
+by PostgreSQL differ from the ones SQLAlchemy would pick.
+"""
+import json
+import re
+from dataclasses import dataclass, field
+from sqlalchemy import ForeignKeyConstraint, PrimaryKeyConstraint, Table, UniqueConstraint, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncConnection
+from app.core import tenant_migrations
+from app.models.reservation import Reservation
+from app.models.space import Space
+from app.models.tenant import SHARED_TENANT_SCHEMA
+
+TENANT_MODELS = [Space, Reservation]
+
+# One row per tenant schema; columns, indexes and constraints aggregated as JSON
+_CATALOG_QUERY = r"""
+WITH tables AS (
+    SELECT c.oid, c.relname, n.nspname
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE (n.nspname LIKE 'tenant\_%' OR n.nspname = :shared)
+    AND c.relkind IN ('r', 'p')
+    AND c.relname = ANY(:tables)
+),
+columns AS (
+    SELECT t.nspname, json_agg(json_build_array(
+        t.relname, a.attname, format_type(a.atttypid, a.atttypmod), NOT a.attnotnull
+    )) AS items
+    FROM tables t
+    JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum > 0 AND NOT a.attisdropped
+    GROUP BY t.nspname
+),
+indexes AS (
+    SELECT t.nspname, json_agg(json_build_array(
+        t.relname, ic.relname,
+        ARRAY(
+            SELECT a.attname
+            FROM unnest(i.indkey) WITH ORDINALITY AS k(attnum, ord)
+            JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+            ORDER BY k.ord
+        ),
+        i.indisunique, i.indisvalid
+    )) AS items
+    FROM tables t
+    JOIN pg_index i ON i.indrelid = t.oid
+    JOIN pg_class ic ON ic.oid = i.indexrelid
+    WHERE NOT EXISTS (
+        SELECT 1 FROM pg_constraint con
+        WHERE con.conindid = i.indexrelid AND con.contype IN ('p', 'u', 'x')
+    )
+    GROUP BY t.nspname
+),
+constraints AS (
+    SELECT t.nspname, json_agg(json_build_array(
+        t.relname, con.conname, con.contype,
+        ARRAY(
+            SELECT a.attname
+            FROM unnest(con.conkey) WITH ORDINALITY AS k(attnum, ord)
+            JOIN pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = k.attnum
+            ORDER BY k.ord
+        ),
+        CASE WHEN rn.nspname = t.nspname THEN rc.relname ELSE rn.nspname || '.' || rc.relname END,
+        ARRAY(
+            SELECT a.attname
+            FROM unnest(con.confkey) WITH ORDINALITY AS k(attnum, ord)
+            JOIN pg_attribute a ON a.attrelid = con.confrelid AND a.attnum = k.attnum
+            ORDER BY k.ord
+        )
+    )) AS items
+    FROM tables t
+    JOIN pg_constraint con ON con.conrelid = t.oid AND con.contype IN ('p', 'f', 'u', 'c', 'x')
+    LEFT JOIN pg_class rc ON rc.oid = con.confrelid
+    LEFT JOIN pg_namespace rn ON rn.oid = rc.relnamespace
+    GROUP BY t.nspname
+)
+SELECT
+    n.nspname,
+    ARRAY(SELECT t.relname FROM tables t WHERE t.nspname = n.nspname),
+    coalesce(c.items, '[]'),
+    coalesce(i.items, '[]'),
+    coalesce(k.items, '[]')
+FROM pg_namespace n
+LEFT JOIN columns c ON c.nspname = n.nspname
+LEFT JOIN indexes i ON i.nspname = n.nspname
+LEFT JOIN constraints k ON k.nspname = n.nspname
+WHERE n.nspname LIKE 'tenant\_%' OR n.nspname = :shared
+ORDER BY n.nspname
+"""
+
+
+def normalize_type(type_name: str) -> str:
+    """
+    Canonical spelling of a column type, from the model or the catalog.
+
+    ``String`` without a length compiles to ``VARCHAR``, which the tenant
+    DDL writes as ``TEXT``; both are unbounded strings and compare equal.
+    """
+    type_name = type_name.lower().replace("character varying", "varchar")
+    type_name = re.sub(r"\s*,\s*", ",", type_name)
+    return "text" if type_name == "varchar" else type_name
+
+
+def _index_key(table: str, columns, unique: bool) -> str:
+    return f"{'UNIQUE ' if unique else ''}INDEX ON {table} ({', '.join(columns)})"
+
+
+def _constraint_key(table: str, kind: str, columns, ref_table: str | None = None, ref_columns=()) -> str:
+    if kind == "f":
+        return f"FOREIGN KEY {table} ({', '.join(columns)}) -> {ref_table} ({', '.join(ref_columns)})"
+    label = {"p": "PRIMARY KEY", "u": "UNIQUE", "c": "CHECK", "x": "EXCLUDE"}[kind]
+    return f"{label} {table} ({', '.join(columns)})"
+
+
+@dataclass
+class ExpectedTable:
+    """What a tenant table should look like: columns, indexes and constraints."""
+    name: str
+    columns: dict[str, tuple[str, bool]]
+    indexes: set[str]
+    constraints: set[str]
+
+
+def expected_tables(shared: bool = False) -> dict[str, ExpectedTable]:
+    """
+    Derive the expected tenant tables from the models.
+
+    With ``shared``, the tables of the shared schema: each also has an
+    ``organization_id`` (referencing ``public.organizations``) that leads
+    every key and index, so an index on ``id`` alone is covered by the
+    primary key. Online indexes are not rolled out to the shared schema.
+    """
+    dialect = postgresql.dialect()
+    lead = ["organization_id"] if shared else []
+    tables = {}
+    for model in TENANT_MODELS:
+        table: Table = model.__table__
+        constraints = set()
+        for constraint in table.constraints:
+            columns = lead + [column.name for column in constraint.columns]
+            if isinstance(constraint, PrimaryKeyConstraint):
+                constraints.add(_constraint_key(table.name, "p", columns))
+            elif isinstance(constraint, UniqueConstraint):
+                constraints.add(_constraint_key(table.name, "u", columns))
+            elif isinstance(constraint, ForeignKeyConstraint):
+                constraints.add(_constraint_key(
+                    table.name, "f", columns, constraint.referred_table.name,
+                    lead + [element.column.name for element in constraint.elements],
+                ))
+        columns = {
+            column.name: (normalize_type(column.type.compile(dialect=dialect)), column.nullable)
+            for column in table.columns
+        }
+        indexes = {
+            _index_key(table.name, lead + [column.name for column in index.columns], index.unique)
+            for index in table.indexes
+            if not (shared and [column.name for column in index.columns] == ["id"])
+        }
+        if shared:
+            columns["organization_id"] = ("integer", False)
+            constraints.add(_constraint_key(table.name, "f", lead, "public.organizations", ["id"]))
+        tables[table.name] = ExpectedTable(
+            name=table.name, columns=columns, indexes=indexes, constraints=constraints,
+        )
+    if not shared:
+        for index in tenant_migrations.TENANT_ONLINE_INDEXES:
+            if index.table in tables:
+                tables[index.table].indexes.add(_index_key(index.table, index.columns, index.unique))
+    return tables
+
+
+@dataclass
+class SchemaDrift:
+    """Every difference found in one tenant schema."""
+    schema_name: str
+    missing_tables: list[str] = field(default_factory=list)
+    missing_columns: list[str] = field(default_factory=list)
+    extra_columns: list[str] = field(default_factory=list)
+    mismatched_columns: list[str] = field(default_factory=list)
+    missing_indexes: list[str] = field(default_factory=list)
+    extra_indexes: list[str] = field(default_factory=list)
+    invalid_indexes: list[str] = field(default_factory=list)
+    missing_constraints: list[str] = field(default_factory=list)
+    extra_constraints: list[str] = field(default_factory=list)
+
+    @property
+    def issues(self) -> list[str]:
+        """Flat, schema-independent description of the drift."""
+        issues = []
+        for label, items in [
+            ("missing table", self.missing_tables),
+            ("missing column", self.missing_columns),
+            ("extra column", self.extra_columns),
+            ("column mismatch", self.mismatched_columns),
+            ("missing index", self.missing_indexes),
+            ("extra index", self.extra_indexes),
+            ("invalid index", self.invalid_indexes),
+            ("missing constraint", self.missing_constraints),
+            ("extra constraint", self.extra_constraints),
+        ]:
+            issues.extend(f"{label}: {item}" for item in items)
+        return issues
+
+    @property
+    def ok(self) -> bool:
+        return not self.issues
+
+
+def compare_schema(
+    schema_name: str,
+    tables: list[str],
+    columns: list,
+    indexes: list,
+    constraints: list,
+    expected: dict[str, ExpectedTable],
+) -> SchemaDrift:
+    """Compare one schema's catalog rows with the expected tables."""
+    drift = SchemaDrift(schema_name)
+    drift.missing_tables = sorted(set(expected) - set(tables))
+
+    actual_columns = {(table, name): (normalize_type(type_name), nullable) for table, name, type_name, nullable in columns}
+    for table in sorted(set(expected) & set(tables)):
+        for name, (type_name, nullable) in expected[table].columns.items():
+            found = actual_columns.pop((table, name), None)
+            if found is None:
+                drift.missing_columns.append(f"{table}.{name}")
+            elif found != (type_name, nullable):
+                drift.mismatched_columns.append(
+                    f"{table}.{name}: expected {type_name} {'NULL' if nullable else 'NOT NULL'}, "
+                    f"found {found[0]} {'NULL' if found[1] else 'NOT NULL'}"
+                )
+    drift.extra_columns = sorted(f"{table}.{name}" for table, name in actual_columns)
+
+    actual_indexes = set()
+    for table, index_name, index_columns, unique, valid in indexes:
+        key = _index_key(table, index_columns, unique)
+        actual_indexes.add(key)
+        if not valid:
+            drift.invalid_indexes.append(f"{index_name} ({key})")
+    expected_indexes = set().union(*(expected[t].indexes for t in tables if t in expected))
+    drift.missing_indexes = sorted(expected_indexes - actual_indexes)
+    drift.extra_indexes = sorted(actual_indexes - expected_indexes)
+
+    actual_constraints = {
+        _constraint_key(table, kind, con_columns, ref_table, ref_columns or ())
+        for table, _, kind, con_columns, ref_table, ref_columns in constraints
+    }
+    expected_constraints = set().union(*(expected[t].constraints for t in tables if t in expected))
+    drift.missing_constraints = sorted(expected_constraints - actual_constraints)
+    drift.extra_constraints = sorted(actual_constraints - expected_constraints)
+    drift.invalid_indexes.sort()
+    return drift
+
+
+async def find_schema_drift(conn: AsyncConnection, shared: bool = True) -> list[SchemaDrift]:
+    """
+    Check every tenant schema and the shared tables in one catalog query.
+
+    The shared tables are only looked for with ``shared`` (on the default shard).
+    """
+    expected = expected_tables()
+    shared_expected = expected_tables(shared=True)
+    result = await conn.execute(
+        text(_CATALOG_QUERY),
+        {"tables": sorted(expected), "shared": SHARED_TENANT_SCHEMA if shared else None},
+    )
+    return [
+        compare_schema(
+            schema_name, tables,
+            *(json.loads(items) if isinstance(items, str) else items for items in aggregates),
+            expected=shared_expected if schema_name == SHARED_TENANT_SCHEMA else expected,
+        )
+        for schema_name, tables, *aggregates in result
+    ]
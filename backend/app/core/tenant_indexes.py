@@ -0,0 +1,267 @@
+"""
+Online rollout of tenant indexes.
+
+Indexes listed in ``TENANT_ONLINE_INDEXES`` (see ``app.core.tenant_migrations``)
+are part of every new tenant schema. Existing schemas get them from
+``rollout_tenant_indexes``, which builds them with
+``CREATE INDEX CONCURRENTLY`` so bookings keep flowing while large tenants
+are indexed.
+
+Concurrent builds cannot run inside a transaction and leave an INVALID
+index behind when they fail, so each build runs on an autocommit
+connection, is checked for validity afterwards, and is dropped and retried
+if it did not come out valid. At most ``concurrency`` builds run at once
+across all schemas, and no build starts while replicas lag or the server
+is I/O bound.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Callable
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+from app.core import tenant_migrations
+from app.core.config import settings
+from app.core.tenant_migrations import TenantIndex, quote_ident
+
+logger = logging.getLogger(__name__)
+
+# Shortest wait between database pressure checks
+MIN_BACKOFF_SECONDS = 0.5
+
+
+@dataclass
+class IndexBuild:
+    """One index to build in one schema, and how it went."""
+    schema_name: str
+    index: TenantIndex
+    # "pending", "created" or "failed"
+    status: str = "pending"
+    # An INVALID index of that name was left by an earlier failed build
+    invalid: bool = False
+    attempts: int = 0
+    error: str | None = None
+    seconds: float = 0.0
+
+    @property
+    def index_name(self) -> str:
+        return self.index.name(self.schema_name)
+
+
+@dataclass
+class IndexBuildProgress:
+    """A row of ``pg_stat_progress_create_index`` for a tenant index."""
+    schema_name: str
+    index_name: str
+    phase: str
+    blocks_done: int
+    blocks_total: int
+
+
+async def find_index_builds(
+    conn: AsyncConnection,
+    indexes: list[TenantIndex] | None = None,
+) -> list[IndexBuild]:
+    """
+    Return the builds needed to give every tenant schema ``indexes``.
+
+    A single catalog query covers all tenant schemas. Schemas missing the
+    indexed table are skipped; indexes that exist but are INVALID are
+    returned for a rebuild.
+    """
+    indexes = tenant_migrations.TENANT_ONLINE_INDEXES if indexes is None else indexes
+    if not indexes:
+        return []
+    result = await conn.execute(text(r"""
+        SELECT n.nspname, t.relname, ic.relname, i.indisvalid
+        FROM pg_class t
+        JOIN pg_namespace n ON n.oid = t.relnamespace
+        LEFT JOIN pg_index i ON i.indrelid = t.oid
+        LEFT JOIN pg_class ic ON ic.oid = i.indexrelid
+        WHERE n.nspname LIKE 'tenant\_%'
+        AND t.relkind = 'r'
+        AND t.relname = ANY(:tables)
+        ORDER BY n.nspname
+    """), {"tables": sorted({index.table for index in indexes})})
+
+    tables: dict[str, set[str]] = {}
+    existing: dict[tuple[str, str], bool] = {}
+    for schema_name, table, index_name, valid in result:
+        tables.setdefault(schema_name, set()).add(table)
+        if index_name is not None:
+            existing[(schema_name, index_name)] = valid
+
+    builds = []
+    for schema_name, schema_tables in tables.items():
+        for index in indexes:
+            if index.table not in schema_tables:
+                continue
+            valid = existing.get((schema_name, index.name(schema_name)))
+            if valid is None or not valid:
+                builds.append(IndexBuild(schema_name, index, invalid=valid is False))
+    return builds
+
+
+async def database_pressure(conn: AsyncConnection) -> tuple[float, int]:
+    """
+    Return (replication lag in seconds, backends waiting on I/O).
+
+    Lag is the worst of write/flush/replay lag over all standbys; it reads
+    as 0 without standbys or without the ``pg_monitor`` role.
+    """
+    lag = await conn.scalar(text("""
+        SELECT coalesce(extract(epoch FROM max(greatest(write_lag, flush_lag, replay_lag))), 0)
+        FROM pg_stat_replication
+    """))
+    io_waiters = await conn.scalar(text("""
+        SELECT count(*) FROM pg_stat_activity
+        WHERE state = 'active' AND wait_event_type = 'IO'
+    """))
+    return float(lag), int(io_waiters)
+
+
+async def wait_for_headroom(
+    conn: AsyncConnection,
+    max_lag_seconds: float,
+    max_io_waiters: int,
+    backoff_seconds: float = 1,
+) -> None:
+    """Sleep with exponential backoff until the database has headroom."""
+    # Never poll the database in a tight loop, whatever backoff was asked for
+    delay = max(backoff_seconds, MIN_BACKOFF_SECONDS)
+    while True:
+        lag, io_waiters = await database_pressure(conn)
+        if lag <= max_lag_seconds and io_waiters <= max_io_waiters:
+            return
+        logger.info(
+            f"Index rollout backing off {delay:.0f}s "
+            f"(replication lag {lag:.1f}s, {io_waiters} backends waiting on I/O)"
+        )
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, settings.TENANT_INDEX_BACKOFF_MAX_SECONDS)
+
+
+async def index_is_valid(conn: AsyncConnection, schema_name: str, index_name: str) -> bool | None:
+    """True/False for an existing index's validity, None if it does not exist."""
+    return await conn.scalar(text("""
+        SELECT i.indisvalid
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = :schema_name AND c.relname = :index_name
+    """), {"schema_name": schema_name, "index_name": index_name})
+
+
+async def build_index(
+    conn: AsyncConnection,
+    build: IndexBuild,
+    attempts: int,
+    max_lag_seconds: float,
+    max_io_waiters: int,
+    backoff_seconds: float = 1,
+) -> IndexBuild:
+    """
+    Build one index concurrently, retrying failed or invalid builds.
+
+    ``conn`` must be in autocommit mode. ``IF NOT EXISTS`` would silently
+    keep an INVALID index, so one left by an earlier attempt is dropped
+    (concurrently) before building again.
+    """
+    started = time.perf_counter()
+    while build.attempts < attempts:
+        build.attempts += 1
+        await wait_for_headroom(conn, max_lag_seconds, max_io_waiters, backoff_seconds)
+        try:
+            if await index_is_valid(conn, build.schema_name, build.index_name) is False:
+                await conn.execute(text(
+                    f"DROP INDEX CONCURRENTLY IF EXISTS {quote_ident(build.schema_name)}.{build.index_name}"
+                ))
+            await conn.execute(text(build.index.create_sql(build.schema_name, concurrently=True)))
+            if await index_is_valid(conn, build.schema_name, build.index_name):
+                build.status, build.error = "created", None
+                break
+            build.error = "index is invalid after build"
+        except DBAPIError as exc:
+            build.error = str(exc.orig)
+        logger.warning(
+            f"Building {build.schema_name}.{build.index_name} failed "
+            f"(attempt {build.attempts}/{attempts}): {build.error}"
+        )
+        if build.attempts < attempts:
+            await asyncio.sleep(backoff_seconds * 2 ** (build.attempts - 1))
+    else:
+        build.status = "failed"
+    build.seconds = time.perf_counter() - started
+    return build
+
+
+async def index_build_progress(conn: AsyncConnection) -> list[IndexBuildProgress]:
+    """Return the progress of every tenant index build running right now."""
+    result = await conn.execute(text(r"""
+        SELECT n.nspname, ic.relname, p.phase, p.blocks_done, p.blocks_total
+        FROM pg_stat_progress_create_index p
+        JOIN pg_class ic ON ic.oid = p.index_relid
+        JOIN pg_namespace n ON n.oid = ic.relnamespace
+        WHERE n.nspname LIKE 'tenant\_%'
+        ORDER BY n.nspname, ic.relname
+    """))
+    return [IndexBuildProgress(*row) for row in result]
+
+
+async def rollout_tenant_indexes(
+    engine: AsyncEngine,
+    builds: list[IndexBuild] | None = None,
+    concurrency: int | None = None,
+    attempts: int | None = None,
+    max_lag_seconds: float | None = None,
+    max_io_waiters: int | None = None,
+    backoff_seconds: float = 1,
+    progress_interval: float = 10,
+    on_build: Callable[[IndexBuild, int, int], None] | None = None,
+    on_progress: Callable[[list[IndexBuildProgress]], None] | None = None,
+) -> list[IndexBuild]:
+    """
+    Build every missing or invalid tenant index, ``concurrency`` at a time.
+
+    ``engine`` should hold ``concurrency`` + 1 connections: one per build
+    and one for the progress monitor, which reports running builds to
+    ``on_progress`` every ``progress_interval`` seconds. ``on_build(build,
+    done, total)`` is called as each build finishes. Re-running after an
+    interruption only builds what is still missing or invalid.
+    """
+    concurrency = concurrency or settings.TENANT_INDEX_BUILD_CONCURRENCY
+    attempts = attempts or settings.TENANT_INDEX_BUILD_ATTEMPTS
+    max_lag_seconds = settings.TENANT_INDEX_MAX_REPLICATION_LAG_SECONDS if max_lag_seconds is None else max_lag_seconds
+    max_io_waiters = settings.TENANT_INDEX_MAX_IO_WAITERS if max_io_waiters is None else max_io_waiters
+    engine = engine.execution_options(isolation_level="AUTOCOMMIT")
+    if builds is None:
+        async with engine.connect() as conn:
+            builds = await find_index_builds(conn)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    finished = []
+
+    async def run(build: IndexBuild) -> None:
+        async with semaphore:
+            async with engine.connect() as conn:
+                await build_index(conn, build, attempts, max_lag_seconds, max_io_waiters, backoff_seconds)
+            finished.append(build)
+            if on_build:
+                on_build(build, len(finished), len(builds))
+
+    async def monitor() -> None:
+        async with engine.connect() as conn:
+            while True:
+                await asyncio.sleep(progress_interval)
+                on_progress(await index_build_progress(conn))
+
+    monitor_task = asyncio.create_task(monitor()) if on_progress else None
+    try:
+        await asyncio.gather(*(run(build) for build in builds))
+    finally:
+        if monitor_task:
+            monitor_task.cancel()
+            await asyncio.gather(monitor_task, return_exceptions=True)
+    return builds
@@ -0,0 +1,397 @@
+"""
+Versioned migrations for tenant schemas.
+
+Alembic versions the public schema; tenant schemas are versioned here. Each
+tenant schema records the migrations applied to it in its own
+``tenant_schema_version`` table, and ``TENANT_MIGRATIONS`` lists every
+migration in order. New schemas are created at the latest version in a
+single batch (``tenant_schema_ddl``); existing schemas are brought up to
+date by ``migrate_tenant_schemas``. The tables of shared-table tenancy (the
+``shared`` schema) are versioned the same way, with ``SHARED_MIGRATIONS``.
+
+Migration SQL is a template: ``{schema}`` is the quoted schema name and
+``{ix}`` the prefix every tenant index name must start with (index names
+embed the schema name, and claiming a pooled schema renames indexes by that
+prefix). Scripts run as multi-statement batches, so every schema name is
+interpolated through ``quote_ident``.
+To change the tenant tables, append a migration; never edit one that has
+shipped.
+"""
+import asyncio
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Callable
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession
+from app.core.config import settings
+from app.core.database import TENANT_ID_SETTING
+from app.models.tenant import SHARED_TENANT_SCHEMA
+
+VERSION_TABLE = "tenant_schema_version"
+
+# First key of pg_try_advisory_xact_lock(int, int); the second is the hash
+# of the schema name, so each schema has its own migration lock.
+MIGRATION_LOCK_NAMESPACE = 728_303
+
+
+@dataclass(frozen=True)
+class TenantMigration:
+    """One step of the tenant schema history."""
+    version: int
+    name: str
+    sql: str
+
+    def render(self, schema_name: str) -> str:
+        """Return the migration SQL for ``schema_name``, version stamp included."""
+        schema = quote_ident(schema_name)
+        return self.sql.format(schema=schema, ix=index_prefix(schema_name)) + (
+            f"\nINSERT INTO {schema}.{VERSION_TABLE} (version, name) "
+            f"VALUES ({self.version}, '{self.name}') ON CONFLICT (version) DO NOTHING;"
+        )
+
+
+def quote_ident(name: str) -> str:
+    """Quote an identifier for interpolation into SQL, as Postgres' quote_ident does."""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def index_prefix(schema_name: str) -> str:
+    """Prefix of every index name in a tenant schema (a plain identifier)."""
+    return "ix_" + re.sub(r"[^a-z0-9_]", "_", schema_name) + "_"
+
+
+TENANT_MIGRATIONS = [
+    # Every statement is idempotent, so schemas created before versioning
+    # existed are simply stamped at version 1 by the runner.
+    TenantMigration(1, "baseline", """
+        CREATE TABLE IF NOT EXISTS {schema}.spaces (
+            id SERIAL PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            description TEXT,
+            space_type VARCHAR(20) NOT NULL,
+            capacity INTEGER,
+            price_per_unit NUMERIC(10, 2) NOT NULL,
+            is_available BOOLEAN NOT NULL DEFAULT TRUE,
+            floor VARCHAR(50),
+            area_sqm NUMERIC(10, 2),
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+
+        CREATE TABLE IF NOT EXISTS {schema}.reservations (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            space_id INTEGER NOT NULL,
+            start_time TIMESTAMP WITH TIME ZONE NOT NULL,
+            end_time TIMESTAMP WITH TIME ZONE NOT NULL,
+            total_price NUMERIC(10, 2) NOT NULL,
+            status VARCHAR(20) NOT NULL DEFAULT 'pending',
+            notes TEXT,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            CONSTRAINT reservations_space_id_fkey
+                FOREIGN KEY (space_id) REFERENCES {schema}.spaces(id)
+        );
+
+        CREATE INDEX IF NOT EXISTS {ix}spaces_id ON {schema}.spaces (id);
+        CREATE INDEX IF NOT EXISTS {ix}spaces_name ON {schema}.spaces (name);
+        CREATE INDEX IF NOT EXISTS {ix}spaces_space_type ON {schema}.spaces (space_type);
+        CREATE INDEX IF NOT EXISTS {ix}reservations_id ON {schema}.reservations (id);
+        CREATE INDEX IF NOT EXISTS {ix}reservations_user_id ON {schema}.reservations (user_id);
+        CREATE INDEX IF NOT EXISTS {ix}reservations_space_id ON {schema}.reservations (space_id);
+        CREATE INDEX IF NOT EXISTS {ix}reservations_start_time ON {schema}.reservations (start_time);
+        CREATE INDEX IF NOT EXISTS {ix}reservations_end_time ON {schema}.reservations (end_time);
+        CREATE INDEX IF NOT EXISTS {ix}reservations_status ON {schema}.reservations (status);
+    """),
+]
+
+
+_CURRENT_TENANT = f"nullif(current_setting('{TENANT_ID_SETTING}', true), '')::integer"
+
+# The shared tables (app.core.shared_tenancy): the tenant tables keyed by
+# organization_id, which leads every key and index, with row-level security
+# on the transaction-local app.tenant_id setting
+SHARED_MIGRATIONS = [
+    TenantMigration(1, "baseline", f"""
+        CREATE TABLE IF NOT EXISTS {{schema}}.spaces (
+            organization_id INTEGER NOT NULL DEFAULT {_CURRENT_TENANT}
+                REFERENCES public.organizations (id),
+            id SERIAL,
+            name VARCHAR(255) NOT NULL,
+            description TEXT,
+            space_type VARCHAR(20) NOT NULL,
+            capacity INTEGER,
+            price_per_unit NUMERIC(10, 2) NOT NULL,
+            is_available BOOLEAN NOT NULL DEFAULT TRUE,
+            floor VARCHAR(50),
+            area_sqm NUMERIC(10, 2),
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (organization_id, id)
+        );
+
+        CREATE TABLE IF NOT EXISTS {{schema}}.reservations (
+            organization_id INTEGER NOT NULL DEFAULT {_CURRENT_TENANT}
+                REFERENCES public.organizations (id),
+            id SERIAL,
+            user_id INTEGER NOT NULL,
+            space_id INTEGER NOT NULL,
+            start_time TIMESTAMP WITH TIME ZONE NOT NULL,
+            end_time TIMESTAMP WITH TIME ZONE NOT NULL,
+            total_price NUMERIC(10, 2) NOT NULL,
+            status VARCHAR(20) NOT NULL DEFAULT 'pending',
+            notes TEXT,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (organization_id, id),
+            CONSTRAINT reservations_space_id_fkey FOREIGN KEY (organization_id, space_id)
+                REFERENCES {{schema}}.spaces (organization_id, id)
+        );
+
+        CREATE INDEX IF NOT EXISTS {{ix}}spaces_name ON {{schema}}.spaces (organization_id, name);
+        CREATE INDEX IF NOT EXISTS {{ix}}spaces_space_type ON {{schema}}.spaces (organization_id, space_type);
+        CREATE INDEX IF NOT EXISTS {{ix}}reservations_user_id ON {{schema}}.reservations (organization_id, user_id);
+        CREATE INDEX IF NOT EXISTS {{ix}}reservations_space_id ON {{schema}}.reservations (organization_id, space_id);
+        CREATE INDEX IF NOT EXISTS {{ix}}reservations_start_time ON {{schema}}.reservations (organization_id, start_time);
+        CREATE INDEX IF NOT EXISTS {{ix}}reservations_end_time ON {{schema}}.reservations (organization_id, end_time);
+        CREATE INDEX IF NOT EXISTS {{ix}}reservations_status ON {{schema}}.reservations (organization_id, status);
+
+        ALTER TABLE {{schema}}.spaces ENABLE ROW LEVEL SECURITY;
+        ALTER TABLE {{schema}}.spaces FORCE ROW LEVEL SECURITY;
+        ALTER TABLE {{schema}}.reservations ENABLE ROW LEVEL SECURITY;
+        ALTER TABLE {{schema}}.reservations FORCE ROW LEVEL SECURITY;
+        DROP POLICY IF EXISTS tenant_isolation ON {{schema}}.spaces;
+        CREATE POLICY tenant_isolation ON {{schema}}.spaces
+            USING (organization_id = {_CURRENT_TENANT})
+            WITH CHECK (organization_id = {_CURRENT_TENANT});
+        DROP POLICY IF EXISTS tenant_isolation ON {{schema}}.reservations;
+        CREATE POLICY tenant_isolation ON {{schema}}.reservations
+            USING (organization_id = {_CURRENT_TENANT})
+            WITH CHECK (organization_id = {_CURRENT_TENANT});
+    """),
+]
+
+
+def migrations_for(schema_name: str) -> list[TenantMigration]:
+    """The migration history ``schema_name`` follows."""
+    return SHARED_MIGRATIONS if schema_name == SHARED_TENANT_SCHEMA else TENANT_MIGRATIONS
+
+
+@dataclass(frozen=True)
+class TenantIndex:
+    """
+    An index built online across existing tenants.
+
+    Indexes added after a schema has data should go here rather than into
+    a migration: a plain ``CREATE INDEX`` blocks writes to the table while it
+    builds. New schemas get them with the rest of the DDL; existing schemas
+    get them from ``app.core.tenant_indexes.rollout_tenant_indexes``.
+    """
+    table: str
+    columns: tuple[str, ...]
+    unique: bool = False
+
+    def name(self, schema_name: str) -> str:
+        return f"{index_prefix(schema_name)}{self.table}_{'_'.join(self.columns)}"
+
+    def create_sql(self, schema_name: str, concurrently: bool = False) -> str:
+        return (
+            f"CREATE {'UNIQUE ' if self.unique else ''}INDEX "
+            f"{'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS {self.name(schema_name)} "
+            f"ON {quote_ident(schema_name)}.{self.table} ({', '.join(self.columns)});"
+        )
+
+
+# Indexes rolled out with CREATE INDEX CONCURRENTLY; append, never edit
+TENANT_ONLINE_INDEXES: list[TenantIndex] = []
+
+
+def head_version(schema_name: str | None = None) -> int:
+    """Latest version of ``schema_name`` (of tenant schemas by default)."""
+    return (migrations_for(schema_name) if schema_name else TENANT_MIGRATIONS)[-1].version
+
+
+def version_table_ddl(schema_name: str) -> str:
+    return f"""
+        CREATE TABLE IF NOT EXISTS {quote_ident(schema_name)}.{VERSION_TABLE} (
+            version INTEGER PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            applied_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+    """
+
+
+def tenant_schema_ddl(schema_name: str) -> str:
+    """
+    Return the DDL that creates a tenant schema (or the shared tables) at
+    the latest version.
+
+    The script is idempotent, so it can also be re-run against a schema
+    that already exists.
+    """
+    # Online indexes are declared for tenant schemas, whose keys do not
+    # start with organization_id
+    online_indexes = [] if schema_name == SHARED_TENANT_SCHEMA else TENANT_ONLINE_INDEXES
+    return "\n".join([
+        f"CREATE SCHEMA IF NOT EXISTS {quote_ident(schema_name)};",
+        version_table_ddl(schema_name),
+        *(migration.render(schema_name) for migration in migrations_for(schema_name)),
+        *(index.create_sql(schema_name) for index in online_indexes),
+    ])
+
+
+async def execute_script(db: AsyncSession | AsyncConnection, script: str) -> None:
+    """
+    Run a multi-statement SQL script in one round trip.
+
+    The script is sent through asyncpg's simple query protocol on the
+    session's (or connection's) own connection, so it joins its transaction.
+    """
+    conn = await db.connection() if isinstance(db, AsyncSession) else db
+    raw = await conn.get_raw_connection()
+    await raw.driver_connection.execute(script)
+
+
+async def list_tenant_schemas(conn: AsyncConnection) -> list[str]:
+    """Return every tenant schema, pooled ones included."""
+    result = await conn.execute(text(r"""
+        SELECT nspname FROM pg_namespace
+        WHERE nspname LIKE 'tenant\_%'
+        ORDER BY nspname
+    """))
+    return [row[0] for row in result.fetchall()]
+
+
+async def list_versioned_schemas(conn: AsyncConnection, shared: bool = True) -> list[str]:
+    """
+    Return every schema the migrator manages: the shared one, then the tenants.
+
+    The shared tables live next to the public ones, so pass ``shared=False``
+    on the other shards.
+    """
+    tenants = await list_tenant_schemas(conn)
+    return [SHARED_TENANT_SCHEMA, *tenants] if shared else tenants
+
+
+@dataclass
+class TenantMigrationResult:
+    """Outcome of migrating one schema."""
+    schema_name: str
+    # "upgraded", "current", "locked" (another runner has it) or "failed"
+    status: str
+    from_version: int | None = None
+    to_version: int | None = None
+    error: str | None = None
+    seconds: float = 0.0
+
+
+@dataclass
+class TenantMigrationReport:
+    """Outcome of a whole run."""
+    results: list[TenantMigrationResult] = field(default_factory=list)
+    seconds: float = 0.0
+
+    @property
+    def counts(self) -> Counter:
+        return Counter(result.status for result in self.results)
+
+    @property
+    def failed(self) -> list[TenantMigrationResult]:
+        return [result for result in self.results if result.status == "failed"]
+
+
+async def migrate_tenant_schema(
+    engine: AsyncEngine,
+    schema_name: str,
+    target: int | None = None,
+    lock_timeout_ms: int | None = None,
+    statement_timeout_ms: int | None = None,
+) -> TenantMigrationResult:
+    """
+    Bring one schema up to ``target`` (its latest version by default).
+
+    The shared schema is created if it does not exist yet. All pending migrations run in a single transaction, so a schema is
+    either fully upgraded or left untouched. A per-schema advisory lock
+    makes concurrent runners skip each other's schemas instead of queueing,
+    and ``lock_timeout``/``statement_timeout`` stop one busy tenant from
+    holding a connection indefinitely.
+    """
+    migrations = migrations_for(schema_name)
+    target = migrations[-1].version if target is None else target
+    lock_timeout_ms = lock_timeout_ms or settings.TENANT_MIGRATION_LOCK_TIMEOUT_MS
+    statement_timeout_ms = statement_timeout_ms or settings.TENANT_MIGRATION_STATEMENT_TIMEOUT_MS
+
+    async with engine.begin() as conn:
+        locked = await conn.scalar(
+            text("SELECT pg_try_advisory_xact_lock(:namespace, hashtext(:schema_name))"),
+            {"namespace": MIGRATION_LOCK_NAMESPACE, "schema_name": schema_name},
+        )
+        if not locked:
+            return TenantMigrationResult(schema_name, "locked")
+        await conn.execute(text(f"SET LOCAL lock_timeout = {int(lock_timeout_ms)}"))
+        await conn.execute(text(f"SET LOCAL statement_timeout = {int(statement_timeout_ms)}"))
+
+        if schema_name == SHARED_TENANT_SCHEMA:
+            await execute_script(conn, f"CREATE SCHEMA IF NOT EXISTS {quote_ident(schema_name)};")
+        await execute_script(conn, version_table_ddl(schema_name))
+        current = await conn.scalar(
+            text(f"SELECT coalesce(max(version), 0) FROM {quote_ident(schema_name)}.{VERSION_TABLE}")
+        )
+        pending = [m for m in migrations if current < m.version <= target]
+        if not pending:
+            return TenantMigrationResult(schema_name, "current", current, current)
+        await execute_script(conn, "\n".join(m.render(schema_name) for m in pending))
+
+    return TenantMigrationResult(schema_name, "upgraded", current, pending[-1].version)
+
+
+async def migrate_tenant_schemas(
+    engine: AsyncEngine,
+    schemas: list[str] | None = None,
+    target: int | None = None,
+    concurrency: int | None = None,
+    timeout_seconds: float | None = None,
+    on_result: Callable[[TenantMigrationResult, int, int], None] | None = None,
+) -> TenantMigrationReport:
+    """
+    Migrate many tenant schemas concurrently.
+
+    At most ``concurrency`` schemas are migrated at once, so ``engine``
+    should be able to hold that many connections. Each schema commits on
+    its own: a failed or timed-out schema is reported and the run goes on,
+    and running again resumes where the last run stopped, since schemas
+    already at ``target`` are skipped after one cheap query.
+    ``on_result(result, done, total)`` is called as each schema finishes.
+    """
+    concurrency = concurrency or settings.TENANT_MIGRATION_CONCURRENCY
+    timeout_seconds = timeout_seconds or settings.TENANT_MIGRATION_TIMEOUT_SECONDS
+    if schemas is None:
+        async with engine.connect() as conn:
+            schemas = await list_versioned_schemas(conn)
+
+    report = TenantMigrationReport()
+    semaphore = asyncio.Semaphore(concurrency)
+    started = time.perf_counter()
+
+    async def run(schema_name: str) -> None:
+        async with semaphore:
+            schema_started = time.perf_counter()
+            try:
+                async with asyncio.timeout(timeout_seconds):
+                    result = await migrate_tenant_schema(engine, schema_name, target)
+            except TimeoutError:
+                result = TenantMigrationResult(
+                    schema_name, "failed", error=f"timed out after {timeout_seconds}s"
+                )
+            except Exception as exc:
+                result = TenantMigrationResult(schema_name, "failed", error=str(exc))
+            result.seconds = time.perf_counter() - schema_started
+            report.results.append(result)
+            if on_result:
+                on_result(result, len(report.results), len(schemas))
+
+    await asyncio.gather(*(run(schema_name) for schema_name in schemas))
+    report.seconds = time.perf_counter() - started
+    return report
@@ -0,0 +1,394 @@
+"""
+Online moves of tenant schemas between shards.
+
+``move_tenant`` copies an organization's schema to another shard while the
+organization keeps serving requests, and only blocks writes for the final
+catch-up:
+
+1. Triggers on the source tables start logging the id of every row
+   inserted, updated or deleted to ``tenant_move_changes`` in the source
+   schema.
+2. The schema is created on the target shard at the latest tenant version,
+   emptied of anything an earlier attempt left, and every row is copied in
+   id batches, all read from one snapshot so a reservation is never copied
+   before its space.
+3. Catch-up passes consume the change log: the rows it names are read by
+   primary key and upserted on the target, or deleted there if they are
+   gone. Passes repeat until few rows change.
+4. Cutover: the source tables are locked against writes (reads continue),
+   the rest of the log is applied, the target sequences are advanced, the
+   organization's shard is switched and the source schema is renamed to
+   ``moved_<schema>`` (or dropped).
+
+No step scans a whole table after the initial copy, so the write lock is
+only held for as long as the last few changes take to apply.
+
+A failed or interrupted move leaves the organization on its source shard
+and can simply be run again. Other processes may route the organization to
+the old shard until their tenant cache entry (or stateless access token)
+expires; those requests fail rather than write to the old copy.
+"""
+import logging
+import time
+from dataclasses import dataclass
+from typing import Callable
+from sqlalchemy import Table, func, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+from app.core.database import get_shard_engine
+from app.core.tenant_cache import forget_schema
+from app.core.tenant_migrations import VERSION_TABLE, execute_script, head_version, quote_ident, tenant_schema_ddl
+from app.models.reservation import Reservation
+from app.models.space import Space
+from app.models.tenant import Organization, OrganizationStatus, OrganizationTenancy
+
+logger = logging.getLogger(__name__)
+
+# Parents before children, so foreign keys hold while copying
+TENANT_TABLES: list[Table] = [Space.__table__, Reservation.__table__]
+
+# Prefix given to the source schema after a move, kept as a backup
+MOVED_SCHEMA_PREFIX = "moved_"
+
+# First key of pg_try_advisory_lock(int, int); the second is the organization id
+MOVE_LOCK_NAMESPACE = 728_304
+
+# Ids of the source rows written since the move started
+CHANGE_TABLE = "tenant_move_changes"
+
+
+@dataclass
+class TenantMove:
+    """Outcome of one ``move_tenant`` call."""
+    schema_name: str
+    source: str
+    target: str
+    rows_copied: int
+    passes: int
+    rows_at_cutover: int
+    seconds: float
+
+
+def _change_log_ddl(schema_name: str) -> str:
+    """Create the change log and the triggers that fill it (idempotent)."""
+    schema = quote_ident(schema_name)
+    script = [f"""
+        CREATE TABLE IF NOT EXISTS {schema}.{CHANGE_TABLE} (
+            seq BIGSERIAL PRIMARY KEY,
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL
+        );
+        CREATE OR REPLACE FUNCTION {schema}.log_tenant_move_change() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP <> 'INSERT' THEN
+                INSERT INTO {schema}.{CHANGE_TABLE} (table_name, row_id) VALUES (TG_TABLE_NAME, OLD.id);
+            END IF;
+            IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND NEW.id <> OLD.id) THEN
+                INSERT INTO {schema}.{CHANGE_TABLE} (table_name, row_id) VALUES (TG_TABLE_NAME, NEW.id);
+            END IF;
+            RETURN NULL;
+        END
+        $$;
+    """]
+    script += [
+        f"CREATE OR REPLACE TRIGGER log_tenant_move_change "
+        f"AFTER INSERT OR UPDATE OR DELETE ON {schema}.{table.name} "
+        f"FOR EACH ROW EXECUTE FUNCTION {schema}.log_tenant_move_change();"
+        for table in TENANT_TABLES
+    ]
+    return "\n".join(script)
+
+
+def _drop_change_log_ddl(schema_name: str) -> str:
+    schema = quote_ident(schema_name)
+    return "\n".join([
+        *(f"DROP TRIGGER IF EXISTS log_tenant_move_change ON {schema}.{table.name};" for table in TENANT_TABLES),
+        f"DROP FUNCTION IF EXISTS {schema}.log_tenant_move_change();",
+        f"DROP TABLE IF EXISTS {schema}.{CHANGE_TABLE};",
+    ])
+
+
+async def _upsert(target: AsyncConnection, table: Table, rows: list[dict]) -> None:
+    upsert = insert(table)
+    upsert = upsert.on_conflict_do_update(
+        index_elements=[table.c.id],
+        set_={column.name: upsert.excluded[column.name] for column in table.columns if column.name != "id"},
+    )
+    await target.execute(upsert, rows)
+
+
+async def _copy_table(source: AsyncConnection, target: AsyncConnection, table: Table, batch_size: int) -> int:
+    """Copy every row of ``table`` into the target, in id order."""
+    query = select(table).order_by(table.c.id).limit(batch_size)
+    copied, after = 0, 0
+    while True:
+        rows = (await source.execute(query.where(table.c.id > after))).mappings().all()
+        if not rows:
+            return copied
+        await _upsert(target, table, [dict(row) for row in rows])
+        copied += len(rows)
+        after = rows[-1]["id"]
+
+
+async def _bulk_copy(source_engine: AsyncEngine, target: AsyncConnection, schema_name: str, batch_size: int) -> int:
+    """Copy every table from one REPEATABLE READ snapshot of the source."""
+    async with source_engine.connect() as conn:
+        conn = await conn.execution_options(
+            isolation_level="REPEATABLE READ",
+            schema_translate_map={None: schema_name},
+        )
+        async with conn.begin():
+            copied = 0
+            for table in TENANT_TABLES:
+                copied += await _copy_table(conn, target, table, batch_size)
+    await target.commit()
+    return copied
+
+
+async def _apply_changes(
+    source: AsyncConnection,
+    target: AsyncConnection,
+    schema_name: str,
+    batch_size: int,
+    until: int | None = None,
+) -> int:
+    """
+    Consume up to ``batch_size`` change log entries (with ``seq`` up to
+    ``until``) and bring the rows they name up to date on the target.
+
+    Rows are looked up by primary key in the source transaction; ids no
+    longer there are deleted from the target, children first. Neither side
+    is committed: the entries are only consumed if the source commits, so
+    commit the target first. Returns the number of entries consumed.
+    """
+    result = await source.execute(text(f"""
+        DELETE FROM {quote_ident(schema_name)}.{CHANGE_TABLE}
+        WHERE seq IN (
+            SELECT seq FROM {quote_ident(schema_name)}.{CHANGE_TABLE}
+            WHERE seq <= :until
+            ORDER BY seq
+            LIMIT :batch_size
+        )
+        RETURNING table_name, row_id
+    """), {"until": until if until is not None else 2**63 - 1, "batch_size": batch_size})
+    entries = result.all()
+    changed: dict[str, set[int]] = {}
+    for table_name, row_id in entries:
+        changed.setdefault(table_name, set()).add(row_id)
+
+    found: dict[str, set[int]] = {}
+    for table in TENANT_TABLES:
+        ids = changed.get(table.name)
+        if not ids:
+            continue
+        rows = (await source.execute(select(table).where(table.c.id.in_(sorted(ids))))).mappings().all()
+        if rows:
+            await _upsert(target, table, [dict(row) for row in rows])
+        found[table.name] = {row["id"] for row in rows}
+    for table in reversed(TENANT_TABLES):
+        gone = changed.get(table.name, set()) - found.get(table.name, set())
+        if gone:
+            await target.execute(table.delete().where(table.c.id.in_(sorted(gone))))
+    return len(entries)
+
+
+async def _catch_up_pass(
+    source_engine: AsyncEngine,
+    target: AsyncConnection,
+    schema_name: str,
+    batch_size: int,
+) -> int:
+    """
+    Apply the changes logged so far, a batch per transaction.
+
+    Each batch reads from its own REPEATABLE READ snapshot, so a row is
+    never copied before the parent it refers to. Entries logged after the
+    pass started are left for the next one. Returns the entries applied.
+    """
+    async with source_engine.connect() as conn:
+        conn = await conn.execution_options(
+            isolation_level="REPEATABLE READ",
+            schema_translate_map={None: schema_name},
+        )
+        until = await conn.scalar(text(
+            f"SELECT coalesce(max(seq), 0) FROM {quote_ident(schema_name)}.{CHANGE_TABLE}"
+        ))
+        await conn.commit()
+        applied = 0
+        while True:
+            async with conn.begin():
+                batch = await _apply_changes(conn, target, schema_name, batch_size, until)
+                await target.commit()
+            applied += batch
+            if batch < batch_size:
+                return applied
+
+
+async def _copy_sequences(source: AsyncConnection, target: AsyncConnection, schema_name: str) -> None:
+    """Carry the id sequences over, so new rows never reuse a moved id."""
+    for table in TENANT_TABLES:
+        sequence = await source.scalar(
+            select(func.pg_get_serial_sequence(f"{quote_ident(schema_name)}.{table.name}", "id"))
+        )
+        last_value, is_called = (await source.execute(
+            text(f"SELECT last_value, is_called FROM {sequence}")
+        )).one()
+        await target.execute(
+            select(func.setval(sequence, last_value, is_called))
+        )
+
+
+async def _remove_change_log(source_engine: AsyncEngine, schema_name: str, lock_timeout_ms: int) -> None:
+    """Drop the change log of an abandoned move, so writes stop paying for it."""
+    try:
+        async with source_engine.begin() as conn:
+            await conn.execute(text(f"SET LOCAL lock_timeout = {int(lock_timeout_ms)}"))
+            await execute_script(conn, _drop_change_log_ddl(schema_name))
+    except Exception as exc:
+        logger.warning(f"Could not remove the change log of {schema_name}; a retried move reuses it: {exc}")
+
+
+async def move_tenant(
+    directory: AsyncEngine,
+    organization_id: int,
+    target_shard: str,
+    batch_size: int = 1000,
+    max_passes: int = 10,
+    cutover_rows: int = 1000,
+    lock_timeout_ms: int = 5000,
+    drop_source: bool = False,
+    on_pass: Callable[[int, int], None] | None = None,
+) -> TenantMove:
+    """
+    Move one organization's tenant schema to ``target_shard`` while it stays
+    online.
+
+    ``directory`` is the engine holding the public tables. The move holds a
+    session advisory lock on one of its connections across many transactions,
+    so it must reach PostgreSQL directly, not through PgBouncer's transaction
+    pooling (see ``create_worker_engine``). Catch-up passes
+    stop once a pass applies at most ``cutover_rows`` logged changes (or
+    after ``max_passes``); the cutover then holds the source tables' write
+    lock while it applies the rest. ``on_pass(pass_number, rows)`` is called after
+    each pass. Raises ValueError if the organization cannot be moved.
+    """
+    started = time.monotonic()
+    async with directory.connect() as lock_conn:
+        locked = await lock_conn.scalar(
+            text("SELECT pg_try_advisory_lock(:namespace, :organization_id)"),
+            {"namespace": MOVE_LOCK_NAMESPACE, "organization_id": organization_id},
+        )
+        await lock_conn.commit()
+        if not locked:
+            raise ValueError("Organization is already being moved")
+        try:
+            organization = (await lock_conn.execute(
+                select(Organization.schema_name, Organization.shard, Organization.status, Organization.tenancy)
+                .where(Organization.id == organization_id)
+            )).one_or_none()
+            await lock_conn.commit()
+            if organization is None:
+                raise ValueError("Organization not found")
+            if organization.tenancy != OrganizationTenancy.SCHEMA.value:
+                raise ValueError("Shared-tenancy organizations live with the public tables")
+            if organization.status != OrganizationStatus.ACTIVE.value:
+                raise ValueError("Organization is still being provisioned")
+            if organization.shard == target_shard:
+                raise ValueError(f"Organization is already on shard {target_shard}")
+
+            schema_name, source_shard = organization.schema_name, organization.shard
+            source_engine = get_shard_engine(source_shard)
+            target_engine = get_shard_engine(target_shard)
+            translate = {None: schema_name}
+
+            async with source_engine.connect() as conn:
+                version = await conn.scalar(
+                    text(f"SELECT coalesce(max(version), 0) FROM {quote_ident(schema_name)}.{VERSION_TABLE}")
+                )
+            if version != head_version():
+                raise ValueError(
+                    f"{schema_name} is at version {version}, not {head_version()}; migrate it first"
+                )
+
+            # Log every write from here on, then copy what is already there
+            async with source_engine.begin() as conn:
+                await conn.execute(text(f"SET LOCAL lock_timeout = {int(lock_timeout_ms)}"))
+                await execute_script(conn, _change_log_ddl(schema_name))
+            try:
+                async with target_engine.connect() as target:
+                    await execute_script(target, tenant_schema_ddl(schema_name))
+                    # Rows left by an earlier attempt: the log only covers this one
+                    await target.execute(text(
+                        f"TRUNCATE {', '.join(f'{quote_ident(schema_name)}.{t.name}' for t in TENANT_TABLES)}"
+                    ))
+                    await target.commit()
+                    target = await target.execution_options(schema_translate_map=translate)
+
+                    # Bulk copy, then catch-up passes while the tenant keeps writing
+                    rows_copied = await _bulk_copy(source_engine, target, schema_name, batch_size)
+                    passes, rows = 1, rows_copied
+                    if on_pass:
+                        on_pass(passes, rows)
+                    while rows > cutover_rows and passes < max_passes:
+                        rows = await _catch_up_pass(source_engine, target, schema_name, batch_size)
+                        rows_copied += rows
+                        passes += 1
+                        if on_pass:
+                            on_pass(passes, rows)
+
+                    # Cutover: block writes on the source, then apply the rest
+                    async with source_engine.connect() as source:
+                        source = await source.execution_options(schema_translate_map=translate)
+                        await source.execute(text(f"SET LOCAL lock_timeout = {int(lock_timeout_ms)}"))
+                        await source.execute(text(
+                            f"LOCK TABLE {', '.join(f'{quote_ident(schema_name)}.{t.name}' for t in TENANT_TABLES)} "
+                            "IN EXCLUSIVE MODE"
+                        ))
+                        rows_at_cutover = 0
+                        while batch := await _apply_changes(source, target, schema_name, batch_size):
+                            rows_at_cutover += batch
+                        await _copy_sequences(source, target, schema_name)
+                        await target.commit()
+
+                        result = await lock_conn.execute(
+                            update(Organization)
+                            .where(Organization.id == organization_id)
+                            .where(Organization.shard == source_shard)
+                            .values(shard=target_shard)
+                        )
+                        if result.rowcount != 1:
+                            await lock_conn.rollback()
+                            raise ValueError("Organization changed during the move")
+                        await lock_conn.commit()
+
+                        if drop_source:
+                            await execute_script(source, f"DROP SCHEMA {quote_ident(schema_name)} CASCADE;")
+                        else:
+                            moved = f"{MOVED_SCHEMA_PREFIX}{schema_name}"[:63]
+                            await execute_script(
+                                source,
+                                _drop_change_log_ddl(schema_name)
+                                + f"\nALTER SCHEMA {quote_ident(schema_name)} RENAME TO {quote_ident(moved)};",
+                            )
+                        await source.commit()
+            except BaseException:
+                await _remove_change_log(source_engine, schema_name, lock_timeout_ms)
+                raise
+        finally:
+            await lock_conn.execute(
+                text("SELECT pg_advisory_unlock(:namespace, :organization_id)"),
+                {"namespace": MOVE_LOCK_NAMESPACE, "organization_id": organization_id},
+            )
+            await lock_conn.commit()
+
+    forget_schema(organization_id)
+    return TenantMove(
+        schema_name=schema_name,
+        source=source_shard,
+        target=target_shard,
+        rows_copied=rows_copied + rows_at_cutover,
+        passes=passes + 1,
+        rows_at_cutover=rows_at_cutover,
+        seconds=time.monotonic() - started,
+    )
@@ -0,0 +1,113 @@
+"""
+Tenant-affinity connection pooling.
+
+Each pooled connection is tagged with the tenant schema it last served.
+A checkout made for a tenant (``current_tenant``, set by TenantMiddleware)
+takes an idle connection already tagged with that tenant if there is one,
+and otherwise falls back to the pool's usual choice, which it re-tags.
+While other checkouts are waiting for a connection, every checkout takes the
+pool's usual choice, so a tenant never skips ahead of them.
+
+The tenant's ``search_path`` is still applied per transaction and ends with
+it (see ``apply_tenant_context``): the pool's rollback on check-in resets
+every connection, so nothing a tenant set ever reaches another tenant's
+request. What affinity keeps is the server backend's own state for the
+tenant's tables: relation and catalog caches, and statement plans that
+would otherwise be re-planned for a different ``search_path``. With many
+tenant schemas this also bounds how many schemas each backend has cached.
+
+Affinity is counted per pool in ``db_pool_tenant_affinity_total``; tenants
+are not a label, so the series stay bounded however many organizations
+there are.
+"""
+import time
+from contextvars import ContextVar
+from app.core.metrics import Counter
+from app.core.pool_metrics import CHECKOUT_WAIT, RECENT_CHECKOUT_WAIT, InstrumentedQueuePool
+
+# Tenant schema of the request being served
+current_tenant: ContextVar[str | None] = ContextVar("current_tenant", default=None)
+
+AFFINITY = Counter(
+    "db_pool_tenant_affinity_total",
+    "Checkouts for a tenant that found (hit) or did not find (miss) a connection it used last",
+    ["pool", "result"],
+)
+
+
+class TenantAffinityPool(InstrumentedQueuePool):
+    """The instrumented pool, preferring connections last used by the same tenant."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Checkouts inside the pool's queue, including those already handed a
+        # connection that have not resumed yet
+        self._queued = 0
+        # Idle connections in the queue per tenant tag, kept as they are
+        # checked in and out so most misses never look at the queue
+        self._idle: dict[str, int] = {}
+
+    def _untrack(self, tenant: str | None) -> None:
+        if tenant not in self._idle:
+            return
+        self._idle[tenant] -= 1
+        if not self._idle[tenant]:
+            del self._idle[tenant]
+
+    def _take_idle(self, tenant: str):
+        """Remove and return an idle connection tagged with ``tenant``, if any.
+
+        Goes through the queue's own non-blocking ``get``/``put``: every idle
+        connection is taken out, the tenant's is kept and the rest go back in
+        their original order. Nothing awaits in between and no checkout is
+        waiting (see ``_do_get``), so no other checkout sees the queue short.
+        """
+        if tenant not in self._idle:
+            return None
+        idle = [self._pool.get(False) for _ in range(self._pool.qsize())]
+        record = next((r for r in idle if r.info.get("tenant") == tenant), None)
+        rest = [r for r in idle if r is not record]
+        # A LIFO queue hands out what was put back last, so refill it bottom first
+        for other in reversed(rest) if self._pool.use_lifo else rest:
+            self._pool.put(other, False)
+        if record is None:
+            # The tally drifted (a connection was retagged or discarded idle)
+            self._idle.pop(tenant)
+        else:
+            self._untrack(tenant)
+        return record
+
+    def _queue_get(self):
+        self._queued += 1
+        try:
+            record = super()._do_get()
+        finally:
+            self._queued -= 1
+        self._untrack(record.info.get("tenant"))
+        return record
+
+    def _do_return_conn(self, record):
+        tenant = record.info.get("tenant")
+        idle = self._pool.qsize()
+        super()._do_return_conn(record)
+        # Unless the queue was full and the connection was closed instead
+        if tenant is not None and self._pool.qsize() > idle:
+            self._idle[tenant] = self._idle.get(tenant, 0) + 1
+
+    def _do_get(self):
+        tenant = current_tenant.get()
+        if tenant is None:
+            return self._queue_get()
+        name = self.logging_name or "-"
+        started = time.perf_counter()
+        record = None if self._queued else self._take_idle(tenant)
+        if record is not None:
+            waited = time.perf_counter() - started
+            CHECKOUT_WAIT.observe(waited, pool=name)
+            RECENT_CHECKOUT_WAIT.add(waited)
+            AFFINITY.inc(pool=name, result="hit")
+        else:
+            record = self._queue_get()
+            AFFINITY.inc(pool=name, result="miss")
+        record.info["tenant"] = tenant
+        return record
@@ -0,0 +1,225 @@
+"""
+Per-organization request quotas.
+
+Each organization's plan (``Organization.plan``) sets how many of its
+requests may be in flight at once and how many it may start per second
+(``TENANT_PLAN_QUOTAS``), so one tenant running exports cannot take every
+pooled connection from the others.
+
+Both limits are cluster-wide. In-flight requests are leases in a Redis sorted
+set scored by expiry: a crashed worker's leases lapse once no request could
+still be running. Starts are charged from a token bucket as in
+``app.core.rate_limit``. One Lua script checks and charges both, so a
+request costs a single round trip. Each worker also counts its own
+in-flight requests per organization. A worker already at an organization's
+limit refuses without asking Redis. While Redis is unreachable, each worker
+enforces both limits on its own: the local in-flight counts, and a local
+token bucket per organization at the plan's full rate, so the cluster may
+then admit up to one plan's rate per worker.
+
+Refusals are counted per plan and limit in ``tenant_requests_throttled_total``
+and logged with the organization; metrics are never labelled by
+organization, so their series stay bounded however many there are.
+"""
+import collections
+import logging
+import time
+import uuid
+from dataclasses import dataclass
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from app.core.config import settings
+from app.core.metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+# Plan of new organizations, and the quotas of plans missing from TENANT_PLAN_QUOTAS
+DEFAULT_PLAN = "standard"
+
+THROTTLED = Counter(
+    "tenant_requests_throttled_total",
+    "Requests refused by an organization's concurrency or rate quota",
+    ["plan", "limit"],
+)
+
+# Requests of each organization in flight in this worker
+_in_flight: collections.Counter[int] = collections.Counter()
+# Plan of each organization with requests in flight in this worker
+_plans: dict[int, str] = {}
+# Each organization's token bucket in this worker, (tokens, time.monotonic()),
+# charged only while Redis is unreachable
+_local_buckets: dict[int, tuple[float, float]] = {}
+
+
+
+def _in_flight_by_plan() -> dict[tuple[str], int]:
+    counts: collections.Counter[str] = collections.Counter()
+    for tenant_id, count in _in_flight.items():
+        counts[_plans.get(tenant_id, DEFAULT_PLAN)] += count
+    return {(plan,): count for plan, count in counts.items() if count}
+
+
+Gauge(
+    "tenant_requests_in_flight",
+    "Requests in flight in this worker, per organization plan",
+    _in_flight_by_plan,
+    ["plan"],
+)
+
+
+# KEYS[1] = sorted set of in-flight leases, scored by expiry (ms)
+# KEYS[2] = token bucket hash {tokens, ts}
+# ARGV = lease id, concurrency, lease ms, burst, requests per second
+# Returns {0, 0} when admitted (lease added, token charged), otherwise
+# {1, ms} at the concurrency limit or {2, ms} out of tokens, charging nothing
+_QUOTA_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local concurrency = tonumber(ARGV[2])
+local lease_ms = tonumber(ARGV[3])
+local capacity = tonumber(ARGV[4])
+local rate = tonumber(ARGV[5]) / 1000
+
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) >= concurrency then
+    return {1, 1000}
+end
+
+local state = redis.call('HMGET', KEYS[2], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+if tokens < 1 then
+    return {2, math.ceil((1 - tokens) / rate)}
+end
+
+tokens = tokens - 1
+redis.call('HSET', KEYS[2], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[2], math.ceil((capacity - tokens) / rate) + 1000)
+redis.call('ZADD', KEYS[1], now + lease_ms, ARGV[1])
+redis.call('PEXPIRE', KEYS[1], lease_ms)
+return {0, 0}
+"""
+
+
+@dataclass
+class PlanQuota:
+    """Requests in flight at once, and requests started per second with bursts."""
+    concurrency: int
+    requests_per_second: float
+    burst: float
+
+
+@dataclass
+class Admission:
+    """The outcome of ``TenantQuotaLimiter.acquire``."""
+    allowed: bool
+    # "concurrency" or "rate" when refused
+    limit: str | None = None
+    retry_after: float = 0
+    # Redis lease to give back on release
+    lease: str | None = None
+
+
+def plan_quota(plan: str | None) -> PlanQuota | None:
+    """Quotas of ``plan`` from TENANT_PLAN_QUOTAS, or None if it is unlimited."""
+    quotas = settings.TENANT_PLAN_QUOTAS.get(plan or DEFAULT_PLAN)
+    if quotas is None:
+        quotas = settings.TENANT_PLAN_QUOTAS.get(DEFAULT_PLAN)
+    if quotas is None:
+        return None
+    rate = quotas["requests_per_second"]
+    return PlanQuota(
+        concurrency=int(quotas["concurrency"]),
+        requests_per_second=rate,
+        burst=quotas.get("burst", rate),
+    )
+
+
+def _charge_local(tenant_id: int, quota: PlanQuota) -> float:
+    """Take a token from this worker's bucket: 0 if admitted, else seconds to wait."""
+    now = time.monotonic()
+    tokens, updated = _local_buckets.get(tenant_id, (quota.burst, now))
+    tokens = min(quota.burst, tokens + (now - updated) * quota.requests_per_second)
+    if tokens < 1:
+        _local_buckets[tenant_id] = (tokens, now)
+        return (1 - tokens) / quota.requests_per_second
+    _local_buckets[tenant_id] = (tokens - 1, now)
+    return 0
+
+
+def _lease_ms() -> int:
+    """How long a lease outlives its request if it is never released."""
+    deadline = max([settings.REQUEST_DEADLINE_SECONDS, *settings.REQUEST_DEADLINES.values()])
+    return int((deadline + 10) * 1000)
+
+
+class TenantQuotaLimiter:
+    """
+    Admits an organization's requests within its plan's quotas.
+
+    Every admitted request must be given back with ``release``.
+    """
+
+    def __init__(self, redis: Redis, prefix: str = "quota:"):
+        self.redis = redis
+        self.prefix = prefix
+        self._script = redis.register_script(_QUOTA_SCRIPT)
+
+    def _keys(self, tenant_id: int) -> list[str]:
+        # One hash slot per organization, so the script also runs on Redis Cluster
+        return [f"{self.prefix}{{{tenant_id}}}:in_flight", f"{self.prefix}{{{tenant_id}}}:rate"]
+
+    async def acquire(self, tenant_id: int, plan: str | None) -> Admission:
+        plan = plan or DEFAULT_PLAN
+        quota = plan_quota(plan)
+        if quota is None:
+            _in_flight[tenant_id] += 1
+            _plans[tenant_id] = plan
+            return Admission(allowed=True)
+
+        admission = Admission(allowed=False, limit="concurrency", retry_after=1)
+        if _in_flight[tenant_id] < quota.concurrency:
+            lease = uuid.uuid4().hex
+            try:
+                refused, wait_ms = await self._script(
+                    keys=self._keys(tenant_id),
+                    args=[lease, quota.concurrency, _lease_ms(), quota.burst, quota.requests_per_second],
+                )
+            except RedisError as exc:
+                logger.warning(f"Tenant quotas unavailable, applying this worker's limits only: {exc}")
+                wait = _charge_local(tenant_id, quota)
+                if not wait:
+                    admission = Admission(allowed=True)
+                else:
+                    admission.limit, admission.retry_after = "rate", wait
+            else:
+                if not int(refused):
+                    admission = Admission(allowed=True, lease=lease)
+                else:
+                    admission.limit = "concurrency" if int(refused) == 1 else "rate"
+                    admission.retry_after = int(wait_ms) / 1000
+
+        if not admission.allowed:
+            THROTTLED.inc(plan=plan, limit=admission.limit)
+            logger.info(
+                f"Throttled organization {tenant_id} ({plan}) at its {admission.limit} limit, "
+                f"retry after {admission.retry_after:.2f}s"
+            )
+            return admission
+        _in_flight[tenant_id] += 1
+        _plans[tenant_id] = plan
+        return admission
+
+    async def release(self, tenant_id: int, admission: Admission) -> None:
+        _in_flight[tenant_id] -= 1
+        if not _in_flight[tenant_id]:
+            del _in_flight[tenant_id]
+            _plans.pop(tenant_id, None)
+        if admission.lease is None:
+            return
+        try:
+            await self.redis.zrem(self._keys(tenant_id)[0], admission.lease)
+        except RedisError as exc:
+            # The lease lapses on its own
+            logger.warning(f"Could not release tenant quota lease: {exc}")
@@ -1,125 +1,166 @@
 """
 Helper functions for managing tenant schemas.
+
+New organizations normally claim a schema from a warm pool of
+pre-provisioned ones (``public.tenant_schema_pool``); claiming is a rename,
+so sign-up does not pay for the tenant DDL. When the pool is empty the DDL
+runs inline instead. ``fill_schema_pool`` tops the pool up from a worker.
+Organizations left PROVISIONING by a lost enqueue or a dead worker are found
+by ``stale_provisioning_organizations`` and handed to the worker again.
+The tenant DDL itself is versioned in ``app.core.tenant_migrations``.
 """
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import text, inspect
-from app.core.database import engine, Base
-from app.models.space import Space
-from app.models.reservation import Reservation
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from app.core.config import settings
+from app.core.tenant_migrations import execute_script, index_prefix, quote_ident, tenant_schema_ddl
+from app.models.schema_pool import TenantSchemaPool
+from app.models.tenant import Organization, OrganizationStatus
+
+POOL_SCHEMA_PREFIX = "tenant_pool_"
+
+# Serializes concurrent pool refills (see fill_schema_pool)
+POOL_LOCK_ID = 728_302
 
 
 async def init_tenant_schema(db: AsyncSession, schema_name: str) -> None:
     """
     Initialize a tenant schema by creating the schema and all required tables.
     
-    This function:
-    1. Creates the schema if it doesn't exist
-    2. Creates the spaces and reservations tables in the schema
-    3. Creates all necessary indexes and constraints
+    The whole DDL is sent as one batch and committed together with whatever
+    the session already holds (e.g. the new organization row), so a failed
+    provisioning leaves nothing behind. Shared model metadata is never
+    touched, which keeps concurrent registrations independent.
     
     Args:
         db: Database session
         schema_name: Name of the tenant schema to initialize
     """
-    # Create schema if it doesn't exist
-    await db.execute(text(f"CREATE SCHEMA IF NOT EXISTS {schema_name}"))
-    await db.commit()
-    
-    # Create tables using SQLAlchemy metadata
-    # We need to temporarily set the schema for Space and Reservation models
-    # and then create the tables
-    
-    # Get the table definitions from the models
-    space_table = Space.__table__
-    reservation_table = Reservation.__table__
-    
-    # Set the schema for these tables
-    space_table.schema = schema_name
-    reservation_table.schema = schema_name
-    
-    # Create tables using raw SQL based on the model definitions
-    # This ensures consistency with the models
-    await _create_spaces_table(db, schema_name)
-    await _create_reservations_table(db, schema_name)
-    
+    await execute_script(db, tenant_schema_ddl(schema_name))
     await db.commit()
 
 
-async def _create_spaces_table(db: AsyncSession, schema_name: str) -> None:
-    """Create the spaces table in the tenant schema."""
-    await db.execute(text(f"""
-        CREATE TABLE IF NOT EXISTS {schema_name}.spaces (
-            id SERIAL PRIMARY KEY,
-            name VARCHAR(255) NOT NULL,
-            description TEXT,
-            space_type VARCHAR(20) NOT NULL,
-            capacity INTEGER,
-            price_per_unit NUMERIC(10, 2) NOT NULL,
-            is_available BOOLEAN NOT NULL DEFAULT TRUE,
-            floor VARCHAR(50),
-            area_sqm NUMERIC(10, 2),
-            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+async def claim_pooled_schema(db: AsyncSession, schema_name: str) -> bool:
+    """
+    Take a schema from the pool and rename it to ``schema_name``.
+
+    ``SKIP LOCKED`` lets concurrent sign-ups claim different schemas without
+    waiting on each other. Returns False if the pool is empty. Nothing is
+    committed; the claim becomes visible with the caller's transaction.
+    """
+    result = await db.execute(text("""
+        DELETE FROM public.tenant_schema_pool
+        WHERE schema_name = (
+            SELECT schema_name FROM public.tenant_schema_pool
+            ORDER BY created_at
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
         )
+        RETURNING schema_name
     """))
-    
-    # Create indexes
-    await db.execute(text(f"""
-        CREATE INDEX IF NOT EXISTS ix_{schema_name.replace('.', '_')}_spaces_id 
-        ON {schema_name}.spaces (id)
-    """))
-    await db.execute(text(f"""
-        CREATE INDEX IF NOT EXISTS ix_{schema_name.replace('.', '_')}_spaces_name 
-        ON {schema_name}.spaces (name)
-    """))
-    await db.execute(text(f"""
-        CREATE INDEX IF NOT EXISTS ix_{schema_name.replace('.', '_')}_spaces_space_type 
-        ON {schema_name}.spaces (space_type)
-    """))
+    pooled = result.scalar_one_or_none()
+    if pooled is None:
+        return False
+
+    # Index names embed the schema name, so they are renamed along with it
+    old_prefix, new_prefix = index_prefix(pooled), index_prefix(schema_name)
+    result = await db.execute(
+        text("SELECT indexname FROM pg_indexes WHERE schemaname = :schema_name"),
+        {"schema_name": pooled},
+    )
+    schema = quote_ident(schema_name)
+    renames = [f"ALTER SCHEMA {quote_ident(pooled)} RENAME TO {schema};"]
+    renames += [
+        f"ALTER INDEX {schema}.{quote_ident(name)} "
+        f"RENAME TO {quote_ident(new_prefix + name[len(old_prefix):])};"
+        for (name,) in result
+        if name.startswith(old_prefix)
+    ]
+    await execute_script(db, "\n".join(renames))
+    return True
+
+
+async def provision_tenant_schema(db: AsyncSession, schema_name: str) -> bool:
+    """
+    Give a new organization its schema, without committing.
+
+    Claims a pre-provisioned schema when the pool is enabled and not empty,
+    otherwise runs the tenant DDL. If the schema already exists (a retried
+    provisioning) the idempotent DDL just fills in anything missing.
+    Returns True if the pool was used.
+    """
+    exists = await db.scalar(
+        text("SELECT to_regnamespace(:schema_name) IS NOT NULL"), {"schema_name": schema_name}
+    )
+    if not exists and settings.TENANT_SCHEMA_POOL_SIZE > 0:
+        if await claim_pooled_schema(db, schema_name):
+            return True
+    await execute_script(db, tenant_schema_ddl(schema_name))
+    return False
+
+
+async def provision_organization(engine: AsyncEngine, organization_id: int) -> bool:
+    """
+    Provision the schema of a PROVISIONING organization and mark it ACTIVE.
+
+    Runs in a worker. The schema and the status change commit together, and
+    ``lock_timeout`` turns a long wait on a busy catalog into an error (and
+    a retry) instead of an indefinitely held connection. Returns False if
+    the organization is gone or already active.
+    """
+    async with AsyncSession(engine, expire_on_commit=False) as db:
+        organization = await db.get(Organization, organization_id)
+        if organization is None or organization.status == OrganizationStatus.ACTIVE.value:
+            return False
+        await db.execute(text(
+            f"SET LOCAL lock_timeout = {int(settings.TENANT_PROVISIONING_LOCK_TIMEOUT_MS)}"
+        ))
+        await provision_tenant_schema(db, organization.schema_name)
+        organization.status = OrganizationStatus.ACTIVE.value
+        await db.commit()
+    return True
 
 
-async def _create_reservations_table(db: AsyncSession, schema_name: str) -> None:
-    """Create the reservations table in the tenant schema."""
-    await db.execute(text(f"""
-        CREATE TABLE IF NOT EXISTS {schema_name}.reservations (
-            id SERIAL PRIMARY KEY,
-            user_id INTEGER NOT NULL,
-            space_id INTEGER NOT NULL,
-            start_time TIMESTAMP WITH TIME ZONE NOT NULL,
-            end_time TIMESTAMP WITH TIME ZONE NOT NULL,
-            total_price NUMERIC(10, 2) NOT NULL,
-            status VARCHAR(20) NOT NULL DEFAULT 'pending',
-            notes TEXT,
-            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
-            CONSTRAINT reservations_space_id_fkey 
-                FOREIGN KEY (space_id) REFERENCES {schema_name}.spaces(id)
+async def stale_provisioning_organizations(engine: AsyncEngine, older_than_seconds: float) -> list[int]:
+    """Ids of organizations still PROVISIONING ``older_than_seconds`` after sign-up."""
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=older_than_seconds)
+    async with AsyncSession(engine) as db:
+        result = await db.scalars(
+            select(Organization.id)
+            .where(Organization.status == OrganizationStatus.PROVISIONING.value)
+            .where(Organization.created_at < cutoff)
+            .order_by(Organization.id)
         )
-    """))
-    
-    # Create indexes
-    await db.execute(text(f"""
-        CREATE INDEX IF NOT EXISTS ix_{schema_name.replace('.', '_')}_reservations_id 
-        ON {schema_name}.reservations (id)
-    """))
-    await db.execute(text(f"""
-        CREATE INDEX IF NOT EXISTS ix_{schema_name.replace('.', '_')}_reservations_user_id 
-        ON {schema_name}.reservations (user_id)
-    """))
-    await db.execute(text(f"""
-        CREATE INDEX IF NOT EXISTS ix_{schema_name.replace('.', '_')}_reservations_space_id 
-        ON {schema_name}.reservations (space_id)
-    """))
-    await db.execute(text(f"""
-        CREATE INDEX IF NOT EXISTS ix_{schema_name.replace('.', '_')}_reservations_start_time 
-        ON {schema_name}.reservations (start_time)
-    """))
-    await db.execute(text(f"""
-        CREATE INDEX IF NOT EXISTS ix_{schema_name.replace('.', '_')}_reservations_end_time 
-        ON {schema_name}.reservations (end_time)
-    """))
-    await db.execute(text(f"""
-        CREATE INDEX IF NOT EXISTS ix_{schema_name.replace('.', '_')}_reservations_status 
-        ON {schema_name}.reservations (status)
-    """))
+        return list(result)
 
+
+async def fill_schema_pool(engine: AsyncEngine, size: int | None = None) -> list[str]:
+    """
+    Create pooled schemas until the pool holds ``size`` of them.
+
+    Each schema is created and registered in its own transaction. A session
+    advisory lock keeps overlapping refills from overshooting the target.
+    """
+    size = settings.TENANT_SCHEMA_POOL_SIZE if size is None else size
+    created = []
+    async with engine.connect() as lock_conn:
+        locked = await lock_conn.scalar(
+            text("SELECT pg_try_advisory_lock(:lock_id)"), {"lock_id": POOL_LOCK_ID}
+        )
+        if not locked:
+            return created
+        try:
+            async with AsyncSession(engine, expire_on_commit=False) as db:
+                pooled = await db.scalar(select(func.count()).select_from(TenantSchemaPool))
+                for _ in range(size - pooled):
+                    schema_name = f"{POOL_SCHEMA_PREFIX}{uuid4().hex[:12]}"
+                    db.add(TenantSchemaPool(schema_name=schema_name))
+                    await db.flush()
+                    await init_tenant_schema(db, schema_name)
+                    created.append(schema_name)
+        finally:
+            await lock_conn.execute(
+                text("SELECT pg_advisory_unlock(:lock_id)"), {"lock_id": POOL_LOCK_ID}
+            )
+    return created
@@ -0,0 +1,384 @@
+"""
+Refresh token storage.
+
+Refresh tokens live either in ``public.tokens`` (the default) or in Redis,
+selected by ``settings.REFRESH_TOKEN_BACKEND``. Both stores key tokens by
+their SHA-256 digest and rotate them with a single atomic compare-and-swap,
+so a refresh token can only ever be redeemed once.
+
+``public.tokens`` is range-partitioned by ``expires_at`` month. Partitions
+are named ``tokens_pYYYY_MM``; once a month has fully passed, every token in
+that partition is expired and the whole partition is dropped, which is far
+cheaper than deleting rows and leaves no bloat behind. Revoked tokens that
+have not expired yet are deleted in bounded batches.
+"""
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from jose import JWTError, jwt
+from redis.asyncio import Redis
+from sqlalchemy import select, text, update
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession
+from app.core.config import settings
+from app.core.redis import get_redis
+from app.core.security import hash_token
+from app.models.token import Token
+
+PARTITION_PREFIX = "tokens_p"
+
+# Arbitrary constant used with pg_try_advisory_lock so that overlapping
+# reaper runs (e.g. two self-rescheduling chains) never work concurrently.
+REAPER_LOCK_ID = 728_301
+
+# Rows store the expiry a token was issued with, within moments of its exp
+# claim, so lookups are confined to the partition(s) around that claim
+EXPIRY_SLACK = timedelta(minutes=1)
+
+
+def _month_start(moment: datetime) -> datetime:
+    return moment.astimezone(timezone.utc).replace(
+        day=1, hour=0, minute=0, second=0, microsecond=0
+    )
+
+
+def _add_months(month: datetime, count: int) -> datetime:
+    index = month.year * 12 + (month.month - 1) + count
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(month: datetime) -> str:
+    """Name of the partition holding tokens that expire in ``month``."""
+    return f"{PARTITION_PREFIX}{month.year:04d}_{month.month:02d}"
+
+
+async def create_token_partition(conn: AsyncConnection, month: datetime) -> str:
+    """
+    Create and attach the monthly partition for ``month``.
+
+    The table is built standalone, any rows for that month are moved out of
+    the default partition, and only then is it attached: attaching a range
+    that still has rows in the default partition would fail.
+    """
+    start = _month_start(month)
+    end = _add_months(start, 1)
+    name = partition_name(start)
+    bounds = {"start": start, "end": end}
+
+    await conn.execute(text(
+        f"CREATE TABLE public.{name} "
+        f"(LIKE public.tokens INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+    ))
+    await conn.execute(text(f"""
+        WITH moved AS (
+            DELETE FROM public.tokens_default
+            WHERE expires_at >= :start AND expires_at < :end
+            RETURNING *
+        )
+        INSERT INTO public.{name} SELECT * FROM moved
+    """), bounds)
+    await conn.execute(text(
+        f"ALTER TABLE public.tokens ATTACH PARTITION public.{name} "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    ))
+    return name
+
+
+async def list_token_partitions(conn: AsyncConnection) -> list[str]:
+    """Return the names of the monthly partitions currently attached."""
+    result = await conn.execute(text("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'public.tokens'::regclass
+        AND c.relname LIKE :prefix
+        ORDER BY c.relname
+    """), {"prefix": f"{PARTITION_PREFIX}%"})
+    return [row[0] for row in result.fetchall()]
+
+
+async def ensure_token_partitions(
+    conn: AsyncConnection,
+    months_ahead: int | None = None,
+    now: datetime | None = None,
+) -> list[str]:
+    """
+    Create the partitions for the current month and ``months_ahead`` months.
+
+    Creating partitions ahead of time keeps new tokens out of the default
+    partition, so there is rarely anything to move when a month is attached.
+    """
+    if months_ahead is None:
+        months_ahead = settings.TOKEN_PARTITION_MONTHS_AHEAD
+    current = _month_start(now or datetime.now(timezone.utc))
+
+    existing = set(await list_token_partitions(conn))
+    created = []
+    for offset in range(months_ahead + 1):
+        month = _add_months(current, offset)
+        if partition_name(month) not in existing:
+            created.append(await create_token_partition(conn, month))
+    return created
+
+
+async def drop_expired_token_partitions(
+    conn: AsyncConnection,
+    now: datetime | None = None,
+) -> list[str]:
+    """Drop every monthly partition whose whole range lies in the past."""
+    current = _month_start(now or datetime.now(timezone.utc))
+    dropped = []
+    for name in await list_token_partitions(conn):
+        year, month = name[len(PARTITION_PREFIX):].split("_")
+        if (int(year), int(month)) < (current.year, current.month):
+            await conn.execute(text(f"DROP TABLE IF EXISTS public.{name}"))
+            dropped.append(name)
+    return dropped
+
+
+async def delete_revoked_tokens(
+    engine: AsyncEngine,
+    batch_size: int | None = None,
+    max_batches: int | None = None,
+) -> int:
+    """
+    Delete revoked tokens in batches, committing after each one.
+
+    Short transactions keep row locks and WAL bursts small; ``max_batches``
+    bounds a single run so a large backlog is worked off over several runs.
+    """
+    batch_size = batch_size or settings.TOKEN_REAPER_BATCH_SIZE
+    max_batches = max_batches or settings.TOKEN_REAPER_MAX_BATCHES
+
+    deleted = 0
+    for _ in range(max_batches):
+        async with engine.begin() as conn:
+            result = await conn.execute(text("""
+                DELETE FROM public.tokens t
+                USING (
+                    SELECT id, expires_at
+                    FROM public.tokens
+                    WHERE is_revoked
+                    LIMIT :batch_size
+                ) r
+                WHERE t.id = r.id AND t.expires_at = r.expires_at
+            """), {"batch_size": batch_size})
+        deleted += result.rowcount
+        if result.rowcount < batch_size:
+            break
+    return deleted
+
+
+async def reap_tokens(engine: AsyncEngine, now: datetime | None = None) -> dict:
+    """
+    Run one maintenance pass over ``public.tokens``.
+
+    Returns a summary with the partitions created and dropped and the number
+    of revoked rows deleted. Skips the pass if another one holds the lock.
+    """
+    async with engine.connect() as lock_conn:
+        locked = await lock_conn.scalar(
+            text("SELECT pg_try_advisory_lock(:lock_id)"), {"lock_id": REAPER_LOCK_ID}
+        )
+        if not locked:
+            return {"skipped": True}
+        try:
+            async with engine.begin() as conn:
+                created = await ensure_token_partitions(conn, now=now)
+            async with engine.begin() as conn:
+                dropped = await drop_expired_token_partitions(conn, now=now)
+            deleted = await delete_revoked_tokens(engine)
+        finally:
+            await lock_conn.execute(
+                text("SELECT pg_advisory_unlock(:lock_id)"), {"lock_id": REAPER_LOCK_ID}
+            )
+
+    return {"created": created, "dropped": dropped, "deleted": deleted}
+
+
+def _expiry_window(token: str) -> tuple[datetime, datetime] | None:
+    """Range the stored expiry of ``token`` falls in, from its (unverified) exp claim."""
+    try:
+        expires_at = datetime.fromtimestamp(jwt.get_unverified_claims(token)["exp"], timezone.utc)
+    except (JWTError, KeyError, TypeError, ValueError):
+        return None
+    return expires_at - EXPIRY_SLACK, expires_at + EXPIRY_SLACK
+
+
+@dataclass
+class StoredRefreshToken:
+    """A live refresh token as returned by a store lookup."""
+    user_id: int
+    expires_at: datetime
+
+
+class DatabaseTokenStore:
+    """Refresh tokens stored as rows in ``public.tokens``."""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def save(self, user_id: int, token: str, expires_at: datetime) -> None:
+        self.db.add(Token(
+            token_hash=hash_token(token),
+            token_type="refresh",
+            user_id=user_id,
+            expires_at=expires_at,
+        ))
+        await self.db.commit()
+
+    async def lookup(self, token: str) -> StoredRefreshToken | None:
+        window = _expiry_window(token)
+        if window is None:
+            return None
+        result = await self.db.execute(
+            select(Token.user_id, Token.expires_at)
+            .where(Token.token_hash == hash_token(token))
+            .where(Token.expires_at.between(*window))
+            .where(Token.is_revoked == False)
+        )
+        row = result.one_or_none()
+        return StoredRefreshToken(user_id=row.user_id, expires_at=row.expires_at) if row else None
+
+    async def rotate(
+        self,
+        old_token: str,
+        current: StoredRefreshToken,
+        new_token: str,
+        expires_at: datetime,
+    ) -> bool:
+        """Revoke ``old_token`` and store ``new_token`` in one transaction."""
+        result = await self.db.execute(
+            update(Token)
+            .where(Token.token_hash == hash_token(old_token))
+            .where(Token.expires_at == current.expires_at)
+            .where(Token.is_revoked == False)
+            .values(is_revoked=True)
+        )
+        if result.rowcount != 1:
+            # Redeemed concurrently by another request
+            await self.db.rollback()
+            return False
+        await self.save(current.user_id, new_token, expires_at)
+        return True
+
+    async def revoke_user(self, user_id: int) -> None:
+        """Revoke every refresh token of ``user_id``, committing the session."""
+        await self.db.execute(
+            update(Token)
+            .where(Token.user_id == user_id)
+            .where(Token.is_revoked == False)
+            .values(is_revoked=True)
+        )
+        await self.db.commit()
+
+
+# KEYS[1] = old token key, KEYS[2] = new token key, KEYS[3] = the user's token set
+# ARGV[1] = expected old value, ARGV[2] = new value, ARGV[3] = new TTL (seconds)
+_ROTATE_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+redis.call('DEL', KEYS[1])
+redis.call('SET', KEYS[2], ARGV[2], 'EX', ARGV[3])
+redis.call('SREM', KEYS[3], KEYS[1])
+redis.call('SADD', KEYS[3], KEYS[2])
+redis.call('EXPIRE', KEYS[3], ARGV[3])
+return 1
+"""
+
+# KEYS[1] = the user's token set; deletes every token in it, and the set
+_REVOKE_USER_SCRIPT = """
+local keys = redis.call('SMEMBERS', KEYS[1])
+for _, key in ipairs(keys) do
+    redis.call('DEL', key)
+end
+redis.call('DEL', KEYS[1])
+return #keys
+"""
+
+
+class RedisTokenStore:
+    """
+    Refresh tokens stored as Redis keys with native TTLs.
+
+    Each token is a ``refresh_token:<sha256>`` key holding
+    ``<user_id>:<expires_at epoch>``; revocation deletes the key and expiry
+    is left to Redis, so nothing ever needs reaping. A
+    ``refresh_tokens:user:<user_id>`` set lists each user's token keys, so
+    all of them can be revoked at once; it expires with the newest token.
+    """
+    KEY_PREFIX = "refresh_token:"
+    USER_PREFIX = "refresh_tokens:user:"
+
+    def __init__(self, redis: Redis):
+        self.redis = redis
+        self._rotate = redis.register_script(_ROTATE_SCRIPT)
+        self._revoke_user = redis.register_script(_REVOKE_USER_SCRIPT)
+
+    def _key(self, token: str) -> str:
+        return self.KEY_PREFIX + hash_token(token).hex()
+
+    def _user_key(self, user_id: int) -> str:
+        return f"{self.USER_PREFIX}{user_id}"
+
+    @staticmethod
+    def _value(user_id: int, expires_at: datetime) -> str:
+        return f"{user_id}:{int(expires_at.timestamp())}"
+
+    @staticmethod
+    def _ttl(expires_at: datetime) -> int:
+        return max(1, int((expires_at - datetime.now(timezone.utc)).total_seconds()))
+
+    async def save(self, user_id: int, token: str, expires_at: datetime) -> None:
+        ttl = self._ttl(expires_at)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.set(self._key(token), self._value(user_id, expires_at), ex=ttl)
+            pipe.sadd(self._user_key(user_id), self._key(token))
+            pipe.expire(self._user_key(user_id), ttl)
+            await pipe.execute()
+
+    async def lookup(self, token: str) -> StoredRefreshToken | None:
+        value = await self.redis.get(self._key(token))
+        if value is None:
+            return None
+        user_id, expires = value.split(":")
+        return StoredRefreshToken(
+            user_id=int(user_id),
+            expires_at=datetime.fromtimestamp(int(expires), tz=timezone.utc),
+        )
+
+    async def rotate(
+        self,
+        old_token: str,
+        current: StoredRefreshToken,
+        new_token: str,
+        expires_at: datetime,
+    ) -> bool:
+        """
+        Atomically delete ``old_token`` and store ``new_token``.
+
+        The Lua script only swaps if the old key still holds the value seen
+        by ``lookup``, so two concurrent refreshes cannot both succeed.
+        """
+        rotated = await self._rotate(
+            keys=[self._key(old_token), self._key(new_token), self._user_key(current.user_id)],
+            args=[
+                self._value(current.user_id, current.expires_at),
+                self._value(current.user_id, expires_at),
+                self._ttl(expires_at),
+            ],
+        )
+        return bool(rotated)
+
+    async def revoke_user(self, user_id: int) -> None:
+        """Delete every refresh token of ``user_id``."""
+        await self._revoke_user(keys=[self._user_key(user_id)])
+
+
+RefreshTokenStore = DatabaseTokenStore | RedisTokenStore
+
+
+def get_refresh_token_store(db: AsyncSession) -> RefreshTokenStore:
+    """Return the store selected by ``settings.REFRESH_TOKEN_BACKEND``."""
+    if settings.REFRESH_TOKEN_BACKEND == "redis":
+        return RedisTokenStore(get_redis())
+    return DatabaseTokenStore(db)
@@ -1,9 +1,21 @@
-from fastapi import FastAPI
+import secrets
+from fastapi import FastAPI, Header, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import ORJSONResponse
+from fastapi.responses import ORJSONResponse, PlainTextResponse
+from fastapi.concurrency import run_in_threadpool
 from contextlib import asynccontextmanager
 from app.core.config import settings
+from app.core.database import AsyncSessionLocal, dispose_shard_engines
+from app.core.metrics import render_metrics
+from app.core.redis import close_redis
+from app.core.security import bcrypt_rounds
+from app.core.shared_tenancy import bypasses_rls
 from app.middleware.tenant import TenantMiddleware
+from app.middleware.tenant_quotas import TenantQuotaMiddleware
+from app.middleware.read_your_writes import ReadYourWritesMiddleware
+from app.middleware.metrics import PoolMetricsMiddleware
+from app.middleware.compression import CompressionMiddleware
+from app.middleware.load_shedding import LoadSheddingMiddleware
 from app.api.routes import auth, spaces, reservations, orgs
 
 
@@ -14,9 +26,19 @@ async def lifespan(app: FastAPI):
     print(f"Starting {settings.APP_NAME}...")
     print(f"Environment: {settings.ENVIRONMENT}")
     print(f"Debug mode: {settings.DEBUG}")
+    # Calibrate now so the first login does not pay for it
+    print(f"bcrypt cost: {await run_in_threadpool(bcrypt_rounds)}")
+    print(f"Tenancy mode: {settings.TENANCY_MODE}")
+    if settings.TENANCY_MODE == "shared":
+        async with AsyncSessionLocal() as db:
+            if await bypasses_rls(db):
+                print("WARNING: the database role bypasses row-level security; "
+                      "shared-tenancy organizations are NOT isolated from each other")
     yield
     # Shutdown
     print(f"Shutting down {settings.APP_NAME}...")
+    await close_redis()
+    await dispose_shard_engines()
 
 
 # Create FastAPI app
@@ -27,17 +49,43 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
-# Set up CORS
+# Hold each organization to its plan's quotas (inside the tenant middleware)
+app.add_middleware(TenantQuotaMiddleware)
+
+# Add tenant middleware
+app.add_middleware(TenantMiddleware)
+
+# Turn excess requests away before they queue for the database
+app.add_middleware(
+    LoadSheddingMiddleware,
+    concurrency=settings.LOAD_SHED_CONCURRENCY or settings.DATABASE_POOL_SIZE + settings.DATABASE_MAX_OVERFLOW,
+    latency_budget=settings.LOAD_SHED_LATENCY_BUDGET_SECONDS,
+)
+
+# Keep clients that just wrote off the read replicas
+app.add_middleware(ReadYourWritesMiddleware)
+
+# Attribute connection pool usage to endpoints
+app.add_middleware(PoolMetricsMiddleware)
+
+# Set up CORS around every layer that answers on its own (503 from the load
+# shedder, 429 from the quotas), so browsers can read those responses too
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.BACKEND_CORS_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After"],
 )
 
-# Add tenant middleware
-app.add_middleware(TenantMiddleware)
+# Compress large responses (outermost, so it sees the final body)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.COMPRESSION_MINIMUM_SIZE,
+    gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+    zstd_level=settings.COMPRESSION_ZSTD_LEVEL,
+)
 
 # Include routers
 app.include_router(auth.router, prefix=f"{settings.API_V1_STR}/auth", tags=["auth"])
@@ -64,3 +112,22 @@ async def root():
 async def health_check():
     """Health check endpoint."""
     return {"status": "healthy"}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics(authorization: str = Header(default="")) -> PlainTextResponse:
+    """
+    Metrics of this worker process in the Prometheus text format.
+
+    They name organizations and their schemas, so only a scraper holding
+    METRICS_TOKEN may read them.
+    """
+    if not settings.METRICS_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not secrets.compare_digest(authorization.encode(), f"Bearer {settings.METRICS_TOKEN}".encode()):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid metrics token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
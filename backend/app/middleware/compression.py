@@ -0,0 +1,169 @@
+import gzip
+import zlib
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+
+class CompressionMiddleware:
+    """
+    Response compression with zstd (preferred) or gzip.
+
+    Bodies smaller than ``minimum_size`` are sent as-is: compressing them
+    costs more CPU than it saves on the wire. Responses that already carry a
+    ``Content-Encoding`` are passed through untouched. Every other response
+    gets ``Vary: Accept-Encoding``, compressed or not, so caches never hand
+    one client's encoding to another.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        zstd_level: int = 3,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.zstd_level = zstd_level
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = self._select_encoding(Headers(scope=scope).get("Accept-Encoding", ""))
+        if encoding is None:
+            async def send_with_vary(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    _add_vary(message)
+                await send(message)
+
+            await self.app(scope, receive, send_with_vary)
+            return
+
+        responder = _CompressionResponder(self, encoding, send)
+        await self.app(scope, receive, responder)
+
+    def _select_encoding(self, accept_encoding: str) -> str | None:
+        accepted, refused = set(), set()
+        for item in accept_encoding.split(","):
+            coding, *params = [part.strip() for part in item.split(";")]
+            if any(p.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000") for p in params):
+                refused.add(coding.lower())
+            else:
+                accepted.add(coding.lower())
+
+        def acceptable(coding: str) -> bool:
+            # "*" stands for every coding not listed on its own
+            return coding in accepted or ("*" in accepted and coding not in refused)
+
+        if zstandard is not None and acceptable("zstd"):
+            return "zstd"
+        if acceptable("gzip"):
+            return "gzip"
+        return None
+
+    def compressor(self, encoding: str):
+        """Return a streaming compressor object with compress()/flush()."""
+        if encoding == "zstd":
+            return zstandard.ZstdCompressor(level=self.zstd_level).compressobj()
+        # wbits=31 produces a gzip container
+        return zlib.compressobj(self.gzip_level, zlib.DEFLATED, 31)
+
+    def compress(self, encoding: str, body: bytes) -> bytes:
+        if encoding == "zstd":
+            return zstandard.ZstdCompressor(level=self.zstd_level).compress(body)
+        return gzip.compress(body, compresslevel=self.gzip_level)
+
+
+def _add_vary(message: Message) -> None:
+    """Add ``Vary: Accept-Encoding`` to a response start message."""
+    headers = MutableHeaders(raw=list(message["headers"]))
+    headers.add_vary_header("Accept-Encoding")
+    message["headers"] = headers.raw
+
+
+class _CompressionResponder:
+    """Wraps ``send`` to compress the body of a single response."""
+
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send: Send) -> None:
+        self.middleware = middleware
+        self.encoding = encoding
+        self.send = send
+        self.start_message: Message | None = None
+        self.passthrough = False
+        self.buffer = b""
+        self.stream = None
+
+    async def __call__(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            # Delay the start message until we know whether to compress
+            self.start_message = message
+            headers = Headers(raw=message["headers"])
+            self.passthrough = "content-encoding" in headers
+            if not self.passthrough:
+                _add_vary(message)
+            return
+
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        if self.passthrough:
+            await self._flush_start()
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.stream is None:
+            # Buffer until we know whether the body reaches the threshold;
+            # BaseHTTPMiddleware streams even small bodies in several chunks.
+            self.buffer += body
+            if more_body and len(self.buffer) < self.middleware.minimum_size:
+                return
+
+            body, self.buffer = self.buffer, b""
+            if not more_body and len(body) < self.middleware.minimum_size:
+                await self._flush_start()
+                await self.send({"type": "http.response.body", "body": body})
+                return
+
+            if not more_body:
+                # Whole body available: compress in one shot with a known length
+                compressed = self.middleware.compress(self.encoding, body)
+                headers = self._headers()
+                headers["Content-Encoding"] = self.encoding
+                headers["Content-Length"] = str(len(compressed))
+                await self._flush_start()
+                await self.send({"type": "http.response.body", "body": compressed})
+                return
+
+            # Large streaming body: switch to chunked transfer and compress incrementally
+            self.stream = self.middleware.compressor(self.encoding)
+            headers = self._headers()
+            headers["Content-Encoding"] = self.encoding
+            del headers["Content-Length"]
+            await self._flush_start()
+
+        chunk = self.stream.compress(body)
+        if not more_body:
+            chunk += self.stream.flush()
+        await self.send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+    def _headers(self) -> MutableHeaders:
+        headers = MutableHeaders(raw=list(self.start_message["headers"]))
+        self.start_message["headers"] = headers.raw
+        return headers
+
+    async def _flush_start(self) -> None:
+        if self.start_message is not None:
+            await self.send(self.start_message)
+            self.start_message = None
@@ -0,0 +1,134 @@
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+from app.core.metrics import Counter, DecayingAverage, Gauge, Histogram
+from app.core.pool_metrics import RECENT_CHECKOUT_WAIT
+
+# Admission priorities, lowest first
+WRITE, READ = 0, 1
+PRIORITY_LABELS = {WRITE: "write", READ: "read"}
+# Never limited: monitoring must keep working when the service is overloaded
+EXEMPT_PATHS = frozenset({"/health", "/metrics"})
+READ_METHODS = frozenset({"GET", "HEAD"})
+
+SHED = Counter(
+    "http_requests_shed_total", "Requests answered 503 by the load shedder", ["priority"],
+)
+QUEUE_WAIT = Histogram(
+    "http_request_queue_wait_seconds", "Time admitted requests waited for a slot", ["priority"],
+)
+
+_shedders: list["LoadSheddingMiddleware"] = []
+Gauge(
+    "http_requests_in_flight", "Requests holding a slot now",
+    lambda: {(): sum(shedder.in_flight for shedder in _shedders)},
+)
+Gauge(
+    "http_requests_queued", "Requests waiting for a slot now",
+    lambda: {(): sum(len(shedder.waiters) for shedder in _shedders)},
+)
+
+
+class LoadSheddingMiddleware:
+    """
+    Admits at most ``concurrency`` requests at once and turns the rest away
+    early once they would wait longer than ``latency_budget``.
+
+    Without it, requests beyond the connection pool pile up inside
+    SQLAlchemy until they hit ``pool_timeout``, and everyone's latency
+    collapses. Here the excess waits in a queue where writes go ahead of
+    reads. A newcomer's wait is estimated from the requests ahead of it and
+    the recent time a slot is held, plus, for reads, the recent pool checkout
+    wait (which also covers connections taken outside this queue). Past the
+    budget it gets ``503`` with ``Retry-After`` at once. Queued requests that
+    are still waiting when the budget runs out are turned away too. Health
+    checks and metrics are never limited.
+    """
+
+    def __init__(self, app: ASGIApp, concurrency: int = 20, latency_budget: float = 1.0) -> None:
+        self.app = app
+        self.concurrency = concurrency
+        self.latency_budget = latency_budget
+        self.in_flight = 0
+        # (priority, arrival, future): the future is resolved when a slot is handed over
+        self.waiters: list[tuple[int, int, asyncio.Future]] = []
+        self.service_time = DecayingAverage(half_life=30.0)
+        self._arrivals = itertools.count()
+        _shedders.append(self)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        priority = READ if scope["method"] in READ_METHODS else WRITE
+        label = PRIORITY_LABELS[priority]
+        started = time.monotonic()
+        expected = self.expected_wait(priority)
+        if expected > self.latency_budget or not await self._acquire(priority):
+            SHED.inc(priority=label)
+            await self._reject(expected, scope, receive, send)
+            return
+        QUEUE_WAIT.observe(time.monotonic() - started, priority=label)
+
+        admitted = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.service_time.add(time.monotonic() - admitted)
+            self._release()
+
+    def expected_wait(self, priority: int) -> float:
+        """Estimated seconds before a new request of ``priority`` gets going."""
+        wait = 0.0
+        if self.in_flight >= self.concurrency:
+            ahead = sum(1 for waiter in self.waiters if waiter[0] <= priority and not waiter[2].done())
+            wait = (ahead + 1) * self.service_time.value / self.concurrency
+        if priority == READ:
+            wait += RECENT_CHECKOUT_WAIT.value
+        return wait
+
+    async def _acquire(self, priority: int) -> bool:
+        """Take a slot, queueing for at most the latency budget. False if none came."""
+        if self.in_flight < self.concurrency and not self.waiters:
+            self.in_flight += 1
+            return True
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiters, (priority, next(self._arrivals), future))
+        try:
+            async with asyncio.timeout(self.latency_budget):
+                await asyncio.shield(future)
+            return True
+        except TimeoutError:
+            if future.done():
+                # The slot was handed over just as the budget ran out
+                return True
+            future.cancel()
+            return False
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release()
+            future.cancel()
+            raise
+
+    def _release(self) -> None:
+        """Hand the slot to the first waiter still waiting, or free it."""
+        while self.waiters:
+            _, _, future = heapq.heappop(self.waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.in_flight -= 1
+
+    async def _reject(self, expected: float, scope: Scope, receive: Receive, send: Send) -> None:
+        retry_after = max(1, math.ceil(expected))
+        response = JSONResponse(
+            {"detail": "Service overloaded, retry later"},
+            status_code=503,
+            headers={"Retry-After": str(retry_after)},
+        )
+        await response(scope, receive, send)
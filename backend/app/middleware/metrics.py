@@ -0,0 +1,25 @@
+from starlette.types import ASGIApp, Receive, Scope, Send
+from app.core.pool_metrics import current_request
+
+
+class PoolMetricsMiddleware:
+    """
+    Makes the current request visible to the pool instrumentation, so
+    connection hold times are recorded per endpoint.
+
+    The route is resolved further down the stack; the scope is shared, so
+    it is known by the time a connection is checked out.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = current_request.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_request.reset(token)
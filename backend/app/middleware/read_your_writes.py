@@ -0,0 +1,56 @@
+import logging
+import time
+from redis.exceptions import RedisError
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.core.config import settings
+from app.core.database import READ_PRIMARY_COOKIE, WriteTracker, mark_tenant_write, request_writes
+
+logger = logging.getLogger(__name__)
+
+
+class ReadYourWritesMiddleware:
+    """
+    Pins reads to the primaries for a while after a write.
+
+    When a request commits a write, the response sets a cookie holding the
+    time until which ``get_read_db`` must not use the replicas, and the
+    organization it wrote for is marked in Redis for as long, so its other
+    members and clients do not read from the replicas either. The window
+    (``READ_YOUR_WRITES_SECONDS``) should exceed the usual replication lag.
+    Nothing is set while no replica is configured.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not settings.DATABASE_REPLICAS:
+            await self.app(scope, receive, send)
+            return
+
+        tracker = WriteTracker()
+        token = request_writes.set(tracker)
+
+        async def send_with_cookie(message: Message) -> None:
+            if message["type"] == "http.response.start" and tracker.committed:
+                # Set by TenantMiddleware, which runs inside this one
+                tenant_id = scope.get("state", {}).get("tenant_id")
+                if tenant_id is not None:
+                    try:
+                        await mark_tenant_write(tenant_id)
+                    except RedisError as exc:
+                        logger.warning(f"Could not pin organization {tenant_id} reads to the primaries: {exc}")
+                window = settings.READ_YOUR_WRITES_SECONDS
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "set-cookie",
+                    f"{READ_PRIMARY_COOKIE}={time.time() + window:.3f}; "
+                    f"Max-Age={int(window) + 1}; Path=/; HttpOnly; SameSite=lax",
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_cookie)
+        finally:
+            request_writes.reset(token)
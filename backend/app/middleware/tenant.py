@@ -2,8 +2,12 @@ from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.requests import Request
 from jose import jwt, JWTError
 from app.core.config import settings
-from sqlalchemy import text
+from sqlalchemy import select
 from app.core.database import AsyncSessionLocal
+from app.core.tenant_cache import cache_plan, cache_schema, get_cached_plan, get_cached_schema
+from app.core.tenant_pool import current_tenant
+from app.core.tenant_quotas import DEFAULT_PLAN
+from app.models.tenant import Organization, OrganizationStatus
 
 
 class TenantMiddleware(BaseHTTPMiddleware):
@@ -20,6 +24,7 @@ class TenantMiddleware(BaseHTTPMiddleware):
         # Extract tenant_id from JWT token
         tenant_id = None
         schema_name = None
+        plan = None
         
         authorization: str = request.headers.get("Authorization")
         if authorization and authorization.startswith("Bearer "):
@@ -29,9 +34,16 @@ class TenantMiddleware(BaseHTTPMiddleware):
                     token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
                 )
                 tenant_id = payload.get("tenant_id")
+                # Stateless tokens carry the schema and plan; otherwise try the cache
+                if "schema" in payload:
+                    schema_name = payload["schema"]
+                    plan = payload.get("plan", DEFAULT_PLAN)
+                else:
+                    schema_name = get_cached_schema(tenant_id)
+                    plan = get_cached_plan(tenant_id)
                 
-                # Get schema name from organization
-                if tenant_id:
+                # Get schema name and plan from organization
+                if tenant_id and not (schema_name and plan):
                     # Try to use app state session first (for testing), fall back to AsyncSessionLocal
                     session = None
                     try:
@@ -41,22 +53,32 @@ class TenantMiddleware(BaseHTTPMiddleware):
                         else:
                             async with AsyncSessionLocal() as temp_session:
                                 result = await temp_session.execute(
-                                    text("SELECT schema_name FROM public.organizations WHERE id = :tenant_id"),
-                                    {"tenant_id": tenant_id}
+                                    select(Organization.data_schema, Organization.status, Organization.shard, Organization.plan)
+                                    .where(Organization.id == tenant_id)
                                 )
                                 row = result.fetchone()
                                 if row:
-                                    schema_name = row[0]
+                                    schema_name = schema_name or row[0]
+                                    plan = row[3]
+                                    cache_plan(tenant_id, plan)
+                                    # Only ready schemas are cached; see set_tenant_schema
+                                    if row[1] == OrganizationStatus.ACTIVE.value:
+                                        cache_schema(tenant_id, row[0], row[2])
                         
                         # If we used test_session, execute query with it
                         if session is not None:
                             result = await session.execute(
-                                text("SELECT schema_name FROM public.organizations WHERE id = :tenant_id"),
-                                {"tenant_id": tenant_id}
+                                select(Organization.data_schema, Organization.status, Organization.shard, Organization.plan)
+                                .where(Organization.id == tenant_id)
                             )
                             row = result.fetchone()
                             if row:
-                                schema_name = row[0]
+                                schema_name = schema_name or row[0]
+                                plan = row[3]
+                                cache_plan(tenant_id, plan)
+                                # Only ready schemas are cached; see set_tenant_schema
+                                if row[1] == OrganizationStatus.ACTIVE.value:
+                                    cache_schema(tenant_id, row[0], row[2])
                     except Exception:
                         # Fallback: if there's any error, just continue without schema_name
                         pass
@@ -66,6 +88,9 @@ class TenantMiddleware(BaseHTTPMiddleware):
         # Store tenant context in request state
         request.state.tenant_id = tenant_id
         request.state.schema_name = schema_name
+        # Read by TenantQuotaMiddleware
+        request.state.plan = plan
+        # Connections checked out for this request prefer ones the tenant used last
+        current_tenant.set(schema_name)
 
-        response = await call_next(request)
-        return response
+        return await call_next(request)
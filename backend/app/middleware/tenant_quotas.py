@@ -0,0 +1,44 @@
+import math
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+from app.core.config import settings
+from app.core.redis import get_redis
+from app.core.tenant_quotas import TenantQuotaLimiter
+
+
+class TenantQuotaMiddleware:
+    """
+    Admits each organization's requests within its plan's quotas (see
+    ``app.core.tenant_quotas``), answering ``429`` with ``Retry-After`` past
+    them.
+
+    It runs inside TenantMiddleware, which puts the organization and its plan
+    in the request state. As a plain ASGI middleware it gives the request back
+    only once the whole response, streamed bodies included, has been sent.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        state = scope.get("state", {})
+        tenant_id = state.get("tenant_id")
+        if scope["type"] != "http" or tenant_id is None or not settings.TENANT_QUOTAS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        # The organization's plan quotas, across every worker
+        limiter = TenantQuotaLimiter(get_redis())
+        admission = await limiter.acquire(tenant_id, state.get("plan"))
+        if not admission.allowed:
+            response = JSONResponse(
+                {"detail": f"Too many requests for this organization ({admission.limit} limit)"},
+                status_code=429,
+                headers={"Retry-After": str(max(1, math.ceil(admission.retry_after)))},
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            await limiter.release(tenant_id, admission)
@@ -1,20 +1,24 @@
 """Models package initialization."""
 from app.models.base import BaseModel
-from app.models.tenant import Organization
+from app.models.tenant import Organization, OrganizationStatus, OrganizationTenancy
 from app.models.member import OrganizationMember
 from app.models.user import User
 from app.models.token import Token
+from app.models.schema_pool import TenantSchemaPool
 from app.models.space import Space, SpaceType
 from app.models.reservation import Reservation, ReservationStatus
 
 __all__ = [
     "BaseModel",
     "Organization",
+    "OrganizationStatus",
+    "OrganizationTenancy",
     "User",
     "Space",
     "SpaceType",
     "OrganizationMember",
     "Token",
+    "TenantSchemaPool",
     "Reservation",
     "ReservationStatus",
 ]
@@ -0,0 +1,25 @@
+from datetime import datetime
+from sqlalchemy import String, DateTime
+from sqlalchemy.orm import Mapped, mapped_column
+from app.core.database import Base
+from app.models.base import get_utc_now
+
+
+class TenantSchemaPool(Base):
+    """
+    Pre-provisioned tenant schemas that no organization owns yet.
+
+    New organizations claim one of these (a rename) instead of running the
+    tenant DDL inline; see ``app.core.tenant_schema``.
+    Stored in the public schema.
+    """
+    __tablename__ = "tenant_schema_pool"
+    __table_args__ = {"schema": "public"}
+
+    schema_name: Mapped[str] = mapped_column(String(63), primary_key=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=get_utc_now, nullable=False, index=True
+    )
+
+    def __repr__(self) -> str:
+        return f"<TenantSchemaPool(schema_name={self.schema_name})>"
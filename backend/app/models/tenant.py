@@ -1,6 +1,28 @@
-from sqlalchemy import String, Boolean
+from sqlalchemy import String, Boolean, case, literal
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import Mapped, mapped_column, relationship
+from app.core.database import DEFAULT_SHARD
+from app.core.tenant_quotas import DEFAULT_PLAN
 from app.models.base import BaseModel
+import enum
+
+
+class OrganizationStatus(str, enum.Enum):
+    """Lifecycle of an organization's tenant schema."""
+    PROVISIONING = "PROVISIONING"
+    ACTIVE = "ACTIVE"
+
+
+class OrganizationTenancy(str, enum.Enum):
+    """Where an organization's spaces and reservations live."""
+    # Its own tenant_{slug} schema
+    SCHEMA = "SCHEMA"
+    # The shared tables in SHARED_TENANT_SCHEMA, isolated by row-level security
+    SHARED = "SHARED"
+
+
+# Schema of the shared tenant tables (see app.core.shared_tenancy)
+SHARED_TENANT_SCHEMA = "shared"
 
 
 class Organization(BaseModel):
@@ -16,6 +38,33 @@ class Organization(BaseModel):
     slug: Mapped[str] = mapped_column(String(100), unique=True, nullable=False, index=True)
     schema_name: Mapped[str] = mapped_column(String(63), unique=True, nullable=False)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
+    # PROVISIONING until the tenant schema exists; tenant routes answer 503 meanwhile
+    status: Mapped[str] = mapped_column(
+        String(20),
+        default=OrganizationStatus.ACTIVE.value,
+        server_default=OrganizationStatus.ACTIVE.value,
+        nullable=False,
+    )
+    tenancy: Mapped[str] = mapped_column(
+        String(10),
+        default=OrganizationTenancy.SCHEMA.value,
+        server_default=OrganizationTenancy.SCHEMA.value,
+        nullable=False,
+    )
+    # Database holding the tenant schema (see app.core.database.get_shard_engine)
+    shard: Mapped[str] = mapped_column(
+        String(50),
+        default=DEFAULT_SHARD,
+        server_default=DEFAULT_SHARD,
+        nullable=False,
+    )
+    # Sets the organization's request quotas (see app.core.tenant_quotas)
+    plan: Mapped[str] = mapped_column(
+        String(50),
+        default=DEFAULT_PLAN,
+        server_default=DEFAULT_PLAN,
+        nullable=False,
+    )
     
     # Contact information
     email: Mapped[str] = mapped_column(String(255), nullable=True)
@@ -25,5 +74,20 @@ class Organization(BaseModel):
     # Relationships
     members: Mapped[list["OrganizationMember"]] = relationship("OrganizationMember", back_populates="organization")
 
+    @hybrid_property
+    def data_schema(self) -> str:
+        """Schema holding the organization's spaces and reservations."""
+        if self.tenancy == OrganizationTenancy.SHARED.value:
+            return SHARED_TENANT_SCHEMA
+        return self.schema_name
+
+    @data_schema.inplace.expression
+    @classmethod
+    def _data_schema_expression(cls):
+        return case(
+            (cls.tenancy == OrganizationTenancy.SHARED.value, literal(SHARED_TENANT_SCHEMA)),
+            else_=cls.schema_name,
+        )
+
     def __repr__(self) -> str:
         return f"<Organization(id={self.id}, name={self.name}, slug={self.slug})>"
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import ForeignKey, Integer, String, DateTime, Boolean
+from sqlalchemy import ForeignKey, Integer, String, DateTime, Boolean, LargeBinary, Index, DDL, event
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.models.base import BaseModel
 
@@ -7,20 +7,40 @@ class Token(BaseModel):
     """
     Token model for storing refresh tokens.
     Allows for token revocation.
+    Only the SHA-256 digest of the token is persisted, never the raw JWT.
+
+    The table is range-partitioned by ``expires_at`` month so expired tokens
+    are removed by dropping whole partitions (see ``app.core.token_store``).
+    Unique indexes on a partitioned table must include the partition key,
+    hence the composite primary key and token_hash index.
     """
     __tablename__ = "tokens"
-    __table_args__ = {"schema": "public"}
+    __table_args__ = (
+        Index("ix_public_tokens_token_hash", "token_hash", "expires_at", unique=True),
+        {"schema": "public", "postgresql_partition_by": "RANGE (expires_at)"},
+    )
 
-    token: Mapped[str] = mapped_column(String(512), unique=True, nullable=False, index=True)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True, index=True)
+    token_hash: Mapped[bytes] = mapped_column(LargeBinary(32), nullable=False)
     token_type: Mapped[str] = mapped_column(String(50), nullable=False, default="refresh")
     user_id: Mapped[int] = mapped_column(
         Integer, ForeignKey("public.users.id"), nullable=False, index=True
     )
-    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True, nullable=False)
     is_revoked: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
-    
+
     # Relationships
     user: Mapped["User"] = relationship("User", back_populates="tokens")
 
     def __repr__(self) -> str:
         return f"<Token(id={self.id}, user_id={self.user_id}, type={self.token_type})>"
+
+
+# A partitioned table accepts no rows until it has a partition. The default
+# partition catches anything outside the monthly partitions maintained by the
+# reaper, so metadata.create_all() yields a usable table on its own.
+event.listen(
+    Token.__table__,
+    "after_create",
+    DDL("CREATE TABLE IF NOT EXISTS public.tokens_default PARTITION OF public.tokens DEFAULT"),
+)
@@ -1,4 +1,5 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
+from app.schemas.org import SLUG_PATTERN
 
 
 class Token(BaseModel):
@@ -8,6 +9,12 @@ class Token(BaseModel):
     token_type: str = "bearer"
 
 
+class AccessToken(BaseModel):
+    """Access token response without a refresh token."""
+    access_token: str
+    token_type: str = "bearer"
+
+
 class TokenPayload(BaseModel):
     """JWT token payload."""
     sub: int
@@ -20,10 +27,16 @@ class UserLogin(BaseModel):
     password: str
 
 
+class PasswordChange(BaseModel):
+    """Password change request."""
+    current_password: str
+    new_password: str
+
+
 class UserRegister(BaseModel):
     """User registration request."""
     email: EmailStr
     password: str
     full_name: str | None = None
     organization_name: str
-    organization_slug: str
+    organization_slug: str = Field(pattern=SLUG_PATTERN)
@@ -1,20 +1,32 @@
 from datetime import datetime
-from pydantic import BaseModel, EmailStr, ConfigDict
+from pydantic import BaseModel, EmailStr, ConfigDict, Field
+
+# Slugs name the tenant schema (tenant_<slug>), so they stay plain identifiers
+SLUG_PATTERN = r"^[a-z0-9][a-z0-9-]{1,50}$"
 
 class OrganizationBase(BaseModel):
     name: str
     slug: str
 
 class OrganizationCreate(OrganizationBase):
-    pass
+    slug: str = Field(pattern=SLUG_PATTERN)
 
 class OrganizationResponse(OrganizationBase):
     id: int
     is_active: bool
+    status: str
+    tenancy: str
+    shard: str
+    plan: str
     created_at: datetime
     
     model_config = ConfigDict(from_attributes=True)
 
+class OrganizationStatusResponse(BaseModel):
+    slug: str
+    status: str
+    ready: bool
+
 class OrganizationMemberResponse(BaseModel):
     organization: OrganizationResponse
     role: str
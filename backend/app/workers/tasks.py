@@ -1,5 +1,12 @@
+import asyncio
+from uuid import uuid4
 import dramatiq
 from app.workers.broker import redis_broker
+from app.core.config import settings
+from app.core.database import create_worker_engine
+from app.core.token_store import reap_tokens
+from app.core.tenant_schema import fill_schema_pool, provision_organization, stale_provisioning_organizations
+from redis.exceptions import RedisError
 import logging
 
 logger = logging.getLogger(__name__)
@@ -49,3 +56,176 @@ def cleanup_expired_reservations():
     # - Find reservations with end_time < now and status = pending
     # - Update status to cancelled or completed
     return True
+
+
+# KEYS[1] = pending run of a periodic actor
+# ARGV = run id of the finishing run ("" when enqueued by hand), id of the
+# next run, lifetime (ms) of the claim
+# Claims the next run when none is pending or the finishing run was the
+# pending one; returns 1 if claimed. Any other run belongs to a duplicate
+# cycle, which thereby ends.
+_CLAIM_NEXT_RUN_SCRIPT = """
+local pending = redis.call('GET', KEYS[1])
+if pending and pending ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'PX', ARGV[3])
+return 1
+"""
+
+
+def schedule_next_run(actor, run_id: str | None, delay_seconds: float) -> bool:
+    """
+    Enqueue the next run of a self-rescheduling actor after ``delay_seconds``.
+
+    Only one cycle per actor keeps going: enqueuing the actor again by hand
+    (or on every deploy) while a run is pending does not start a second one.
+    The claim outlives the delay generously, so a cycle whose message was
+    lost can be restarted by hand later.
+    """
+    next_run = uuid4().hex
+    delay_ms = int(delay_seconds * 1000)
+    claimed = redis_broker.client.eval(
+        _CLAIM_NEXT_RUN_SCRIPT, 1, f"periodic:{actor.actor_name}",
+        run_id or "", next_run, 2 * delay_ms + 60_000,
+    )
+    if not int(claimed):
+        logger.info(f"{actor.actor_name}: another cycle already has a run pending")
+        return False
+    actor.send_with_options(kwargs={"reschedule": True, "run_id": next_run}, delay=delay_ms)
+    return True
+
+
+async def _reap_refresh_tokens() -> dict:
+    engine = create_worker_engine()
+    try:
+        return await reap_tokens(engine)
+    finally:
+        await engine.dispose()
+
+
+@dramatiq.actor(max_retries=0)
+def reap_refresh_tokens(reschedule: bool = True, run_id: str | None = None):
+    """
+    Periodic maintenance of public.tokens.
+
+    Creates upcoming monthly partitions, drops partitions whose tokens have
+    all expired and deletes revoked tokens in bounded batches. The actor
+    re-enqueues itself every TOKEN_REAPER_INTERVAL_SECONDS; enqueue it once
+    to start the cycle (see schedule_next_run; runs that do overlap are
+    serialized by an advisory lock).
+    """
+    try:
+        summary = asyncio.run(_reap_refresh_tokens())
+        logger.info(f"Refresh token reaper finished: {summary}")
+    finally:
+        if reschedule:
+            schedule_next_run(reap_refresh_tokens, run_id, settings.TOKEN_REAPER_INTERVAL_SECONDS)
+    return True
+
+
+async def _refill_schema_pool() -> list[str]:
+    engine = create_worker_engine()
+    try:
+        return await fill_schema_pool(engine)
+    finally:
+        await engine.dispose()
+
+
+@dramatiq.actor(max_retries=0)
+def refill_schema_pool(reschedule: bool = False, run_id: str | None = None):
+    """
+    Top up the warm pool of pre-provisioned tenant schemas.
+
+    Enqueued after every sign-up; with ``reschedule`` it also re-enqueues
+    itself every TENANT_SCHEMA_POOL_REFILL_INTERVAL_SECONDS as a safety net.
+    """
+    try:
+        created = asyncio.run(_refill_schema_pool())
+        logger.info(f"Tenant schema pool refilled with {len(created)} schema(s)")
+    finally:
+        if reschedule:
+            schedule_next_run(refill_schema_pool, run_id, settings.TENANT_SCHEMA_POOL_REFILL_INTERVAL_SECONDS)
+    return True
+
+
+def enqueue_schema_pool_refill() -> None:
+    """
+    Ask a worker to refill the schema pool, if the pool is enabled.
+
+    Failing to enqueue only delays the refill (the periodic run catches up),
+    so it is logged rather than raised.
+    """
+    if settings.TENANT_SCHEMA_POOL_SIZE <= 0:
+        return
+    try:
+        refill_schema_pool.send()
+    except RedisError as exc:
+        logger.warning(f"Could not enqueue tenant schema pool refill: {exc}")
+
+
+async def _provision_tenant(organization_id: int) -> bool:
+    engine = create_worker_engine()
+    try:
+        return await provision_organization(engine, organization_id)
+    finally:
+        await engine.dispose()
+
+
+@dramatiq.actor(max_retries=5)
+def provision_tenant(organization_id: int):
+    """
+    Create (or claim from the pool) the schema of a new organization.
+
+    Provisioning is idempotent, so failed attempts (e.g. a lock timeout on a
+    busy catalog) are simply retried with backoff.
+    """
+    provisioned = asyncio.run(_provision_tenant(organization_id))
+    if provisioned:
+        logger.info(f"Provisioned tenant schema for organization {organization_id}")
+        enqueue_schema_pool_refill()
+    return True
+
+
+def enqueue_tenant_provisioning(organization_id: int) -> None:
+    """Hand a new organization to the provisioning worker."""
+    try:
+        provision_tenant.send(organization_id)
+    except RedisError as exc:
+        logger.error(
+            f"Could not enqueue provisioning of organization {organization_id}; "
+            f"it stays PROVISIONING until sweep_stale_provisioning re-enqueues it: {exc}"
+        )
+
+
+async def _stale_provisioning_organizations() -> list[int]:
+    engine = create_worker_engine()
+    try:
+        return await stale_provisioning_organizations(engine, settings.TENANT_PROVISIONING_STALE_SECONDS)
+    finally:
+        await engine.dispose()
+
+
+@dramatiq.actor(max_retries=0)
+def sweep_stale_provisioning(reschedule: bool = True, run_id: str | None = None):
+    """
+    Re-enqueue organizations stuck in PROVISIONING.
+
+    An organization stays PROVISIONING if its enqueue failed or its worker
+    died mid-task. Provisioning is idempotent, so handing one over again is
+    safe even if its original message is merely slow. The actor re-enqueues
+    itself every TENANT_PROVISIONING_SWEEP_INTERVAL_SECONDS; enqueue it once
+    to start the cycle (see schedule_next_run).
+    """
+    try:
+        stale = asyncio.run(_stale_provisioning_organizations())
+        if stale:
+            logger.warning(f"Re-enqueuing provisioning of stale organizations: {stale}")
+        for organization_id in stale:
+            enqueue_tenant_provisioning(organization_id)
+    finally:
+        if reschedule:
+            schedule_next_run(
+                sweep_stale_provisioning, run_id, settings.TENANT_PROVISIONING_SWEEP_INTERVAL_SECONDS
+            )
+    return True
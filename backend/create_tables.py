@@ -1,6 +1,8 @@
 import asyncio
 from app.core.database import AsyncSessionLocal
 from sqlalchemy import text
+from app.core.shared_tenancy import SHARED_TABLES_DDL
+from app.core.tenant_migrations import execute_script
 
 async def create_tables():
     async with AsyncSessionLocal() as session:
@@ -26,6 +28,9 @@ async def create_tables():
                 slug VARCHAR(100) NOT NULL UNIQUE,
                 schema_name VARCHAR(63) NOT NULL UNIQUE,
                 is_active BOOLEAN NOT NULL DEFAULT TRUE,
+                status VARCHAR(20) NOT NULL DEFAULT 'ACTIVE',
+                tenancy VARCHAR(10) NOT NULL DEFAULT 'SCHEMA',
+                shard VARCHAR(50) NOT NULL DEFAULT 'default',
                 email VARCHAR(255),
                 phone VARCHAR(50),
                 created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
@@ -51,15 +56,27 @@ async def create_tables():
         # Create tokens table if not exists
         await session.execute(text("""
             CREATE TABLE IF NOT EXISTS public.tokens (
-                id SERIAL PRIMARY KEY,
-                token VARCHAR(512) NOT NULL UNIQUE,
+                id SERIAL,
+                token_hash BYTEA NOT NULL,
                 token_type VARCHAR(50) NOT NULL,
                 user_id INTEGER NOT NULL,
                 expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
                 is_revoked BOOLEAN NOT NULL DEFAULT FALSE,
                 created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
                 updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (id, expires_at),
                 FOREIGN KEY (user_id) REFERENCES public.users (id)
+            ) PARTITION BY RANGE (expires_at)
+        """))
+        await session.execute(text(
+            "CREATE TABLE IF NOT EXISTS public.tokens_default PARTITION OF public.tokens DEFAULT"
+        ))
+
+        # Create tenant schema pool table if not exists
+        await session.execute(text("""
+            CREATE TABLE IF NOT EXISTS public.tenant_schema_pool (
+                schema_name VARCHAR(63) PRIMARY KEY,
+                created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
             )
         """))
 
@@ -73,8 +90,12 @@ async def create_tables():
         await session.execute(text("CREATE INDEX IF NOT EXISTS ix_public_organization_members_organization_id ON public.organization_members (organization_id)"))
         await session.execute(text("CREATE INDEX IF NOT EXISTS ix_public_organization_members_user_id ON public.organization_members (user_id)"))
         await session.execute(text("CREATE INDEX IF NOT EXISTS ix_public_tokens_id ON public.tokens (id)"))
-        await session.execute(text("CREATE INDEX IF NOT EXISTS ix_public_tokens_token ON public.tokens (token)"))
+        await session.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ix_public_tokens_token_hash ON public.tokens (token_hash, expires_at)"))
         await session.execute(text("CREATE INDEX IF NOT EXISTS ix_public_tokens_user_id ON public.tokens (user_id)"))
+        await session.execute(text("CREATE INDEX IF NOT EXISTS ix_public_tenant_schema_pool_created_at ON public.tenant_schema_pool (created_at)"))
+
+        # Create shared tenant tables (shared tenancy mode)
+        await execute_script(session, SHARED_TABLES_DDL)
 
         await session.commit()
         print("Tables created successfully")
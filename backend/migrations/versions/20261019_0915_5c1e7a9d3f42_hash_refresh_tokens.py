@@ -0,0 +1,39 @@
+"""hash refresh tokens
+
+Revision ID: 5c1e7a9d3f42
+Revises: 9d52e7d39b12
+Create Date: 2026-10-19 09:15:12.402118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c1e7a9d3f42'
+down_revision: Union[str, None] = '9d52e7d39b12'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Store a fixed-size SHA-256 digest instead of the raw 512-char JWT
+    op.add_column('tokens', sa.Column('token_hash', sa.LargeBinary(length=32), nullable=True), schema='public')
+    op.execute("UPDATE public.tokens SET token_hash = sha256(convert_to(token, 'UTF8'))")
+    op.alter_column('tokens', 'token_hash', nullable=False, schema='public')
+    op.create_index(op.f('ix_public_tokens_token_hash'), 'tokens', ['token_hash'], unique=True, schema='public')
+    op.drop_index(op.f('ix_public_tokens_token'), table_name='tokens', schema='public')
+    op.drop_column('tokens', 'token', schema='public')
+
+
+def downgrade() -> None:
+    # Raw tokens cannot be recovered from their digests; existing refresh
+    # tokens are revoked and users will have to log in again.
+    op.add_column('tokens', sa.Column('token', sa.String(length=512), nullable=True), schema='public')
+    op.execute("UPDATE public.tokens SET token = encode(token_hash, 'hex'), is_revoked = true")
+    op.alter_column('tokens', 'token', nullable=False, schema='public')
+    op.create_index(op.f('ix_public_tokens_token'), 'tokens', ['token'], unique=True, schema='public')
+    op.drop_index(op.f('ix_public_tokens_token_hash'), table_name='tokens', schema='public')
+    op.drop_column('tokens', 'token_hash', schema='public')
@@ -0,0 +1,110 @@
+"""partition tokens by expiry month
+
+Revision ID: b7d4e2a61c05
+Revises: 5c1e7a9d3f42
+Create Date: 2026-10-19 10:30:44.918263
+
+"""
+from datetime import datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d4e2a61c05'
+down_revision: Union[str, None] = '5c1e7a9d3f42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _month_bounds(offset: int) -> tuple[str, datetime, datetime]:
+    now = datetime.now(timezone.utc)
+    index = now.year * 12 + (now.month - 1) + offset
+    start = datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+    index += 1
+    end = datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+    return f"tokens_p{start.year:04d}_{start.month:02d}", start, end
+
+
+def upgrade() -> None:
+    # Move the old table aside; its sequence is re-owned by the new table
+    op.execute("ALTER TABLE public.tokens RENAME TO tokens_unpartitioned")
+    op.drop_index(op.f('ix_public_tokens_token_hash'), table_name='tokens_unpartitioned', schema='public')
+    op.drop_index(op.f('ix_public_tokens_user_id'), table_name='tokens_unpartitioned', schema='public')
+    op.drop_index(op.f('ix_public_tokens_id'), table_name='tokens_unpartitioned', schema='public')
+    op.execute("ALTER TABLE public.tokens_unpartitioned DROP CONSTRAINT tokens_pkey")
+    op.execute("ALTER TABLE public.tokens_unpartitioned DROP CONSTRAINT tokens_user_id_fkey")
+
+    op.execute("""
+        CREATE TABLE public.tokens (
+            id INTEGER NOT NULL DEFAULT nextval('public.tokens_id_seq'::regclass),
+            token_hash BYTEA NOT NULL,
+            token_type VARCHAR(50) NOT NULL,
+            user_id INTEGER NOT NULL,
+            expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            is_revoked BOOLEAN NOT NULL,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            updated_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            CONSTRAINT tokens_pkey PRIMARY KEY (id, expires_at),
+            CONSTRAINT tokens_user_id_fkey FOREIGN KEY (user_id) REFERENCES public.users (id)
+        ) PARTITION BY RANGE (expires_at)
+    """)
+    op.execute("ALTER SEQUENCE public.tokens_id_seq OWNED BY public.tokens.id")
+    op.execute("CREATE TABLE public.tokens_default PARTITION OF public.tokens DEFAULT")
+    for offset in range(3):
+        name, start, end = _month_bounds(offset)
+        op.execute(
+            f"CREATE TABLE public.{name} PARTITION OF public.tokens "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        )
+
+    op.create_index(op.f('ix_public_tokens_id'), 'tokens', ['id'], unique=False, schema='public')
+    op.create_index(op.f('ix_public_tokens_token_hash'), 'tokens', ['token_hash', 'expires_at'], unique=True, schema='public')
+    op.create_index(op.f('ix_public_tokens_user_id'), 'tokens', ['user_id'], unique=False, schema='public')
+
+    # Only live tokens are worth carrying over
+    op.execute("""
+        INSERT INTO public.tokens
+            (id, token_hash, token_type, user_id, expires_at, is_revoked, created_at, updated_at)
+        SELECT id, token_hash, token_type, user_id, expires_at, is_revoked, created_at, updated_at
+        FROM public.tokens_unpartitioned
+        WHERE NOT is_revoked AND expires_at > now()
+    """)
+    op.execute("DROP TABLE public.tokens_unpartitioned")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE public.tokens RENAME TO tokens_partitioned")
+    op.drop_index(op.f('ix_public_tokens_token_hash'), table_name='tokens_partitioned', schema='public')
+    op.drop_index(op.f('ix_public_tokens_user_id'), table_name='tokens_partitioned', schema='public')
+    op.drop_index(op.f('ix_public_tokens_id'), table_name='tokens_partitioned', schema='public')
+    op.execute("ALTER TABLE public.tokens_partitioned DROP CONSTRAINT tokens_pkey")
+    op.execute("ALTER TABLE public.tokens_partitioned DROP CONSTRAINT tokens_user_id_fkey")
+
+    op.execute("""
+        CREATE TABLE public.tokens (
+            id INTEGER NOT NULL DEFAULT nextval('public.tokens_id_seq'::regclass),
+            token_hash BYTEA NOT NULL,
+            token_type VARCHAR(50) NOT NULL,
+            user_id INTEGER NOT NULL,
+            expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            is_revoked BOOLEAN NOT NULL,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            updated_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            CONSTRAINT tokens_pkey PRIMARY KEY (id),
+            CONSTRAINT tokens_user_id_fkey FOREIGN KEY (user_id) REFERENCES public.users (id)
+        )
+    """)
+    op.execute("ALTER SEQUENCE public.tokens_id_seq OWNED BY public.tokens.id")
+    op.execute("""
+        INSERT INTO public.tokens
+        SELECT id, token_hash, token_type, user_id, expires_at, is_revoked, created_at, updated_at
+        FROM public.tokens_partitioned
+    """)
+    op.execute("DROP TABLE public.tokens_partitioned")
+
+    op.create_index(op.f('ix_public_tokens_id'), 'tokens', ['id'], unique=False, schema='public')
+    op.create_index(op.f('ix_public_tokens_token_hash'), 'tokens', ['token_hash'], unique=True, schema='public')
+    op.create_index(op.f('ix_public_tokens_user_id'), 'tokens', ['user_id'], unique=False, schema='public')
@@ -0,0 +1,44 @@
+"""add tenant schema pool
+
+Revision ID: 3f8a2c91d4b6
+Revises: b7d4e2a61c05
+Create Date: 2026-10-19 12:00:41.118305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f8a2c91d4b6'
+down_revision: Union[str, None] = 'b7d4e2a61c05'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'tenant_schema_pool',
+        sa.Column('schema_name', sa.String(length=63), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('schema_name'),
+        schema='public'
+    )
+    op.create_index(op.f('ix_public_tenant_schema_pool_created_at'), 'tenant_schema_pool', ['created_at'], unique=False, schema='public')
+
+
+def downgrade() -> None:
+    # Drop the unclaimed schemas along with their bookkeeping
+    op.execute("""
+        DO $$
+        DECLARE pooled text;
+        BEGIN
+            FOR pooled IN SELECT schema_name FROM public.tenant_schema_pool LOOP
+                EXECUTE format('DROP SCHEMA IF EXISTS %I CASCADE', pooled);
+            END LOOP;
+        END $$
+    """)
+    op.drop_index(op.f('ix_public_tenant_schema_pool_created_at'), table_name='tenant_schema_pool', schema='public')
+    op.drop_table('tenant_schema_pool', schema='public')
@@ -0,0 +1,27 @@
+"""add organization status
+
+Revision ID: 8e4b1f6c2a90
+Revises: 3f8a2c91d4b6
+Create Date: 2026-10-19 13:30:07.554120
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e4b1f6c2a90'
+down_revision: Union[str, None] = '3f8a2c91d4b6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Existing organizations already have their schema
+    op.add_column('organizations', sa.Column('status', sa.String(length=20), server_default='ACTIVE', nullable=False), schema='public')
+
+
+def downgrade() -> None:
+    op.drop_column('organizations', 'status', schema='public')
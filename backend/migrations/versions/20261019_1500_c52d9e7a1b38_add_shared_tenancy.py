@@ -0,0 +1,31 @@
+"""add shared tenancy
+
+Revision ID: c52d9e7a1b38
+Revises: 8e4b1f6c2a90
+Create Date: 2026-10-19 15:00:12.301774
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c52d9e7a1b38'
+down_revision: Union[str, None] = '8e4b1f6c2a90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Existing organizations keep their own schema
+    op.add_column('organizations', sa.Column('tenancy', sa.String(length=10), server_default='SCHEMA', nullable=False), schema='public')
+    # The shared tables themselves are versioned with the tenant schemas
+    # (SHARED_MIGRATIONS in app/core/tenant_migrations.py) and created by
+    # scripts/migrate_tenant_schemas.py
+
+
+def downgrade() -> None:
+    op.execute("DROP SCHEMA IF EXISTS shared CASCADE")
+    op.drop_column('organizations', 'tenancy', schema='public')
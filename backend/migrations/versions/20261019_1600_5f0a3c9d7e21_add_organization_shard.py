@@ -0,0 +1,27 @@
+"""add organization shard
+
+Revision ID: 5f0a3c9d7e21
+Revises: c52d9e7a1b38
+Create Date: 2026-10-19 16:00:41.118392
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5f0a3c9d7e21'
+down_revision: Union[str, None] = 'c52d9e7a1b38'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Every existing tenant schema lives in DATABASE_URL
+    op.add_column('organizations', sa.Column('shard', sa.String(length=50), server_default='default', nullable=False), schema='public')
+
+
+def downgrade() -> None:
+    op.drop_column('organizations', 'shard', schema='public')
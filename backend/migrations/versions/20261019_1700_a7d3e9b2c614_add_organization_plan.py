@@ -0,0 +1,27 @@
+"""add organization plan
+
+Revision ID: a7d3e9b2c614
+Revises: 5f0a3c9d7e21
+Create Date: 2026-10-19 17:00:12.508731
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7d3e9b2c614'
+down_revision: Union[str, None] = '5f0a3c9d7e21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Existing organizations get the standard quotas
+    op.add_column('organizations', sa.Column('plan', sa.String(length=50), server_default='standard', nullable=False), schema='public')
+
+
+def downgrade() -> None:
+    op.drop_column('organizations', 'plan', schema='public')
@@ -0,0 +1,166 @@
+"""
+Benchmark: API latency under a credential-stuffing login flood.
+
+This script:
+1. Measures baseline latency of a probe endpoint (GET /auth/me with a valid
+   token, or GET /health when no credentials are given)
+2. Floods POST /auth/login with bad credentials at a fixed open-loop rate
+   (1k req/s by default) while probing the API at the same pace as before
+3. Prints p50/p95/p99 for both phases and how the flood was answered
+
+With the Redis token-bucket limiter in place the flood is answered with 429
+before bcrypt runs, so the probe p99 should stay close to the baseline.
+
+Usage:
+    python scripts/bench_login_flood.py --base-url http://localhost:8000 \\
+        --email admin@example.com --password securepassword
+
+With ``--in-process`` the app in the current directory is called directly
+over ASGI, with an in-memory Redis (fakeredis), instead of over HTTP. Client
+and server then share one event loop and its CPU. The numbers are only
+comparable to other in-process runs.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import statistics
+import time
+from collections import Counter
+import httpx
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    """Nearest-rank percentile in milliseconds."""
+    if not samples:
+        return float("nan")
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index] * 1000
+
+
+async def probe(client: httpx.AsyncClient, path: str, headers: dict, duration: float, rate: float) -> list[float]:
+    """Call the probe endpoint at ``rate`` req/s and collect latencies."""
+    latencies = []
+
+    async def one():
+        start = time.perf_counter()
+        response = await client.get(path, headers=headers)
+        if response.status_code == 200:
+            latencies.append(time.perf_counter() - start)
+
+    tasks = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        tasks.append(asyncio.create_task(one()))
+        await asyncio.sleep(1 / rate)
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return latencies
+
+
+async def flood(client: httpx.AsyncClient, duration: float, rate: float, targets: list[str]) -> Counter:
+    """Send bad logins open-loop at ``rate`` req/s; count response statuses."""
+    statuses: Counter = Counter()
+
+    async def one():
+        try:
+            response = await client.post(
+                "/api/v1/auth/login",
+                json={"email": random.choice(targets), "password": f"guess-{random.random()}"},
+            )
+            statuses[response.status_code] += 1
+        except httpx.HTTPError:
+            statuses["error"] += 1
+
+    tasks = []
+    start = time.perf_counter()
+    sent = 0
+    while (elapsed := time.perf_counter() - start) < duration:
+        # Catch up in bursts so the offered load stays at `rate` even if
+        # the event loop falls behind on individual sleeps.
+        due = int(elapsed * rate) - sent
+        for _ in range(due):
+            tasks.append(asyncio.create_task(one()))
+        sent += max(due, 0)
+        await asyncio.sleep(0.001)
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return statuses
+
+
+def report(label: str, latencies: list[float]) -> None:
+    print(
+        f"{label:<10} n={len(latencies):<6} "
+        f"p50={percentile(latencies, 50):7.1f}ms "
+        f"p95={percentile(latencies, 95):7.1f}ms "
+        f"p99={percentile(latencies, 99):7.1f}ms "
+        f"mean={statistics.fmean(latencies) * 1000 if latencies else float('nan'):7.1f}ms"
+    )
+
+
+def in_process_transport() -> httpx.ASGITransport:
+    """The app of the current directory over ASGI, with an in-memory Redis."""
+    import fakeredis
+    from redis.asyncio import BlockingConnectionPool
+
+    sys.path.insert(0, os.getcwd())
+    import app.core.redis as redis_module
+    from app.main import app
+
+    redis_module._client = fakeredis.FakeAsyncRedis(
+        decode_responses=True, connection_pool_class=BlockingConnectionPool, max_connections=100
+    )
+    return httpx.ASGITransport(app=app)
+
+
+async def main(args: argparse.Namespace) -> None:
+    limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+    transport = in_process_transport() if args.in_process else None
+    async with httpx.AsyncClient(
+        base_url=args.base_url, limits=limits, timeout=30, transport=transport
+    ) as client:
+        path, headers = "/health", {}
+        if args.email and args.password:
+            credentials = {"email": args.email, "password": args.password}
+            response = await client.post("/api/v1/auth/login", json=credentials)
+            if response.status_code == 429:
+                # Still limited by a previous run from this address
+                await asyncio.sleep(float(response.headers.get("Retry-After", 1)))
+                response = await client.post("/api/v1/auth/login", json=credentials)
+            response.raise_for_status()
+            path = "/api/v1/auth/me"
+            headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        print(f"=== Login flood benchmark against {args.base_url} ===")
+        print(f"Probe: GET {path} at {args.probe_rate} req/s\n")
+
+        baseline = await probe(client, path, headers, args.duration, args.probe_rate)
+        report("baseline", baseline)
+
+        targets = [f"victim{i}@example.com" for i in range(args.targets)]
+        flood_task = asyncio.create_task(flood(client, args.duration, args.rate, targets))
+        under_flood = await probe(client, path, headers, args.duration, args.probe_rate)
+        statuses = await flood_task
+        report("flood", under_flood)
+
+        total = sum(statuses.values())
+        print(f"\nFlood: {total} login attempts at {args.rate} req/s")
+        for code, count in sorted(statuses.items(), key=lambda item: str(item[0])):
+            print(f"  {code}: {count} ({count / total:.0%})")
+
+        base_p99, flood_p99 = percentile(baseline, 99), percentile(under_flood, 99)
+        print(f"\np99 ratio (flood / baseline): {flood_p99 / base_p99:.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--email", help="Valid user for the /auth/me probe")
+    parser.add_argument("--password", help="Password of the probe user")
+    parser.add_argument("--rate", type=float, default=1000, help="Flood rate (req/s)")
+    parser.add_argument("--probe-rate", type=float, default=20, help="Probe rate (req/s)")
+    parser.add_argument("--duration", type=float, default=15, help="Seconds per phase")
+    parser.add_argument("--targets", type=int, default=50, help="Distinct emails attacked")
+    parser.add_argument("--connections", type=int, default=200)
+    parser.add_argument("--in-process", action="store_true", help="Call the app over ASGI with fakeredis")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,96 @@
+"""
+Benchmark: tenant provisioning cost of POST /auth/register.
+
+This script:
+1. Registers organizations one at a time and reports p50/p95/p99 latency
+2. Registers organizations from ``--concurrency`` parallel clients and
+   reports throughput (registrations/s) and error counts
+
+Every run uses fresh random slugs, so it can be repeated against the same
+database; each registration leaves a tenant schema behind.
+
+Usage:
+    python scripts/bench_register.py --base-url http://localhost:8000 \\
+        --count 50 --concurrency 10
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from collections import Counter
+import httpx
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    """Nearest-rank percentile in milliseconds."""
+    if not samples:
+        return float("nan")
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index] * 1000
+
+
+async def register(client: httpx.AsyncClient, run_id: str, index: int) -> tuple[int, float]:
+    slug = f"bench-{run_id}-{index}"
+    start = time.perf_counter()
+    response = await client.post("/api/v1/auth/register", json={
+        "email": f"{slug}@example.com",
+        "password": "benchmark-password",
+        "organization_name": f"Bench {index}",
+        "organization_slug": slug,
+    })
+    return response.status_code, time.perf_counter() - start
+
+
+async def main(args: argparse.Namespace) -> None:
+    run_id = uuid.uuid4().hex[:8]
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=120) as client:
+        print(f"=== Registration benchmark against {args.base_url} ===\n")
+
+        latencies = []
+        for i in range(args.count):
+            status_code, elapsed = await register(client, run_id, i)
+            if status_code == 201:
+                latencies.append(elapsed)
+        print(
+            f"sequential n={len(latencies):<5} "
+            f"p50={percentile(latencies, 50):7.1f}ms "
+            f"p95={percentile(latencies, 95):7.1f}ms "
+            f"p99={percentile(latencies, 99):7.1f}ms "
+            f"mean={statistics.fmean(latencies) * 1000 if latencies else float('nan'):7.1f}ms"
+        )
+
+        queue: asyncio.Queue[int] = asyncio.Queue()
+        for i in range(args.count, args.count * 2):
+            queue.put_nowait(i)
+        statuses: Counter = Counter()
+
+        async def worker():
+            while not queue.empty():
+                index = queue.get_nowait()
+                try:
+                    status_code, _ = await register(client, run_id, index)
+                    statuses[status_code] += 1
+                except httpx.HTTPError:
+                    statuses["error"] += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+
+        print(
+            f"concurrent x{args.concurrency}: {args.count} registrations in {elapsed:.2f}s "
+            f"({statuses[201] / elapsed:.1f}/s)"
+        )
+        for code, count in sorted(statuses.items(), key=lambda item: str(item[0])):
+            print(f"  {code}: {count}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--count", type=int, default=50, help="Registrations per phase")
+    parser.add_argument("--concurrency", type=int, default=10)
+    asyncio.run(main(parser.parse_args()))
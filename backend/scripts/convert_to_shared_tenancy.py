@@ -0,0 +1,77 @@
+"""
+Script to move schema-per-tenant organizations into the shared tenant tables.
+
+This script:
+1. Finds every ACTIVE organization still on its own schema (or takes --org)
+2. Converts them one at a time: copies spaces and reservations into the
+   shared tables, switches the organization to SHARED tenancy and renames
+   its old schema to retired_<schema> (or drops it with --drop-schema)
+3. Prints the rows moved per organization and a summary
+
+Each organization converts in its own transaction, so the script can be
+stopped and re-run at any time. Other app processes may route an
+organization to its old schema until their tenant cache entry expires
+(TENANT_CACHE_TTL_SECONDS), and stateless access tokens carry the schema
+until they expire; such requests fail rather than write to the retired
+schema. See ``app.core.shared_tenancy``.
+
+Usage:
+    python scripts/convert_to_shared_tenancy.py --dry-run
+    python scripts/convert_to_shared_tenancy.py --org acme --org globex
+"""
+import argparse
+import asyncio
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import engine
+from app.core.shared_tenancy import convert_organization, convertible_organizations
+from app.models.tenant import Organization
+
+
+async def main(args: argparse.Namespace) -> int:
+    try:
+        organizations = await convertible_organizations(engine)
+        if args.org:
+            organizations = [(org_id, slug) for org_id, slug in organizations if slug in args.org]
+            async with AsyncSession(engine) as db:
+                known = set(await db.scalars(select(Organization.slug).where(Organization.slug.in_(args.org))))
+            for slug in sorted(set(args.org) - {slug for _, slug in organizations}):
+                reason = "already shared, not active or on another shard" if slug in known else "not found"
+                print(f"  - {slug}: skipped ({reason})")
+        if not organizations:
+            print("No organizations to convert.")
+            return 0
+
+        print("=== Converting to shared tenancy ===")
+        print(f"{len(organizations)} organization(s)\n")
+        if args.dry_run:
+            for _, slug in organizations:
+                print(f"  {slug}")
+            return 0
+
+        converted = failed = 0
+        for org_id, slug in organizations:
+            try:
+                moved = await convert_organization(engine, org_id, drop_schema=args.drop_schema)
+            except Exception as exc:
+                failed += 1
+                print(f"  ✗ {slug}: {exc}")
+                continue
+            if moved is None:
+                print(f"  - {slug}: skipped (converted concurrently)")
+            else:
+                converted += 1
+                print(f"  ✓ {slug}: {moved['spaces']} spaces, {moved['reservations']} reservations")
+    finally:
+        await engine.dispose()
+
+    print(f"\n=== Done: {converted} converted, {failed} failed ===")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--org", action="append", help="Only convert this organization slug (repeatable)")
+    parser.add_argument("--drop-schema", action="store_true", help="Drop old schemas instead of renaming them")
+    parser.add_argument("--dry-run", action="store_true", help="Only list the organizations to convert")
+    raise SystemExit(asyncio.run(main(parser.parse_args())))
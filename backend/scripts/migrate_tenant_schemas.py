@@ -1,78 +1,111 @@
 """
-Script to migrate existing tenant schemas to the correct structure.
+Script to upgrade every tenant schema to the latest tenant migration.
 
-This script:
-1. Finds all tenant schemas
-2. Checks if they have the correct tables (spaces and reservations)
-3. Creates missing tables with the correct structure
-4. Updates existing tables if needed
+This script, for the default shard and then each of DATABASE_SHARDS:
+1. Finds all tenant schemas (pooled ones included) and, on the default
+   shard only, the shared schema, created if it does not exist; --schema
+   limits the run to the schemas named
+2. Migrates up to --concurrency schemas at once over a bounded connection
+   pool, each in its own transaction with its own lock and timeouts
+3. Prints progress while it runs and a summary with every failure
+
+Schemas already at the target version are skipped, so an interrupted or
+partially failed run is resumed by running the script again. See
+``app.core.tenant_migrations``.
+
+Usage:
+    python scripts/migrate_tenant_schemas.py --concurrency 32
+    python scripts/migrate_tenant_schemas.py --schema tenant_acme --target 1
 """
+import argparse
 import asyncio
-from sqlalchemy import text
-from app.core.database import AsyncSessionLocal
-from app.core.tenant_schema import init_tenant_schema
+import time
+from sqlalchemy.ext.asyncio import create_async_engine
+from app.core.config import settings
+from app.core.database import DEFAULT_SHARD, shard_urls
+from app.core.tenant_migrations import (
+    TenantMigrationReport,
+    TenantMigrationResult,
+    list_versioned_schemas,
+    migrate_tenant_schemas,
+)
 
 
-async def get_all_tenant_schemas(db) -> list[str]:
-    """Get all tenant schema names from the database."""
-    result = await db.execute(text("""
-        SELECT schema_name 
-        FROM information_schema.schemata 
-        WHERE schema_name LIKE 'tenant_%'
-        ORDER BY schema_name
-    """))
-    return [row[0] for row in result.fetchall()]
+class ProgressPrinter:
+    """Prints a progress line every ``interval`` seconds and on completion."""
 
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.started = self.last = time.perf_counter()
+        self.failed = 0
 
-async def schema_has_table(db, schema_name: str, table_name: str) -> bool:
-    """Check if a schema has a specific table."""
-    result = await db.execute(text("""
-        SELECT EXISTS (
-            SELECT 1 
-            FROM information_schema.tables 
-            WHERE table_schema = :schema_name 
-            AND table_name = :table_name
+    def __call__(self, result: TenantMigrationResult, done: int, total: int) -> None:
+        if result.status == "failed":
+            self.failed += 1
+            print(f"  ✗ {result.schema_name}: {result.error}")
+        now = time.perf_counter()
+        if now - self.last < self.interval and done < total:
+            return
+        self.last = now
+        rate = done / (now - self.started)
+        eta = (total - done) / rate if rate else 0
+        print(
+            f"{done}/{total} schemas ({done / total:.0%}), {self.failed} failed, "
+            f"{rate:.1f} schemas/s, ETA {eta:.0f}s"
         )
-    """), {"schema_name": schema_name, "table_name": table_name})
-    return result.scalar()
 
 
-async def migrate_tenant_schemas():
-    """Migrate all existing tenant schemas to the correct structure."""
-    async with AsyncSessionLocal() as db:
-        print("=== Migrating Tenant Schemas ===\n")
-        
-        # Get all tenant schemas
-        schemas = await get_all_tenant_schemas(db)
-        
-        if not schemas:
-            print("No tenant schemas found.")
-            return
-        
-        print(f"Found {len(schemas)} tenant schema(s):\n")
-        
-        for schema_name in schemas:
-            print(f"Processing schema: {schema_name}")
-            
-            # Check current state
-            has_spaces = await schema_has_table(db, schema_name, "spaces")
-            has_reservations = await schema_has_table(db, schema_name, "reservations")
-            
-            print(f"  - spaces table: {'✓' if has_spaces else '✗'}")
-            print(f"  - reservations table: {'✓' if has_reservations else '✗'}")
-            
-            # Initialize schema (will create missing tables)
-            try:
-                await init_tenant_schema(db, schema_name)
-                print(f"  ✓ Schema {schema_name} initialized successfully")
-            except Exception as e:
-                print(f"  ✗ Error initializing {schema_name}: {e}")
-            
-            print()
-        
-        print("=== Migration Complete ===")
+async def main(args: argparse.Namespace) -> int:
+    concurrency = args.concurrency or settings.TENANT_MIGRATION_CONCURRENCY
+    target = f"version {args.target}" if args.target else "the latest version"
+    report = TenantMigrationReport()
+    for shard, url in shard_urls().items():
+        # One connection per in-flight schema, plus one for listing schemas
+        engine = create_async_engine(url, pool_size=concurrency + 1, max_overflow=0)
+        try:
+            async with engine.connect() as conn:
+                schemas = await list_versioned_schemas(conn, shared=shard == DEFAULT_SHARD)
+            if args.schema:
+                schemas = [schema for schema in schemas if schema in args.schema]
+            if not schemas:
+                continue
 
+            print(f"=== Migrating Tenant Schemas on shard {shard} ===")
+            print(f"{len(schemas)} schema(s) to {target}, {concurrency} at a time\n")
+            shard_report = await migrate_tenant_schemas(
+                engine,
+                schemas,
+                target=args.target,
+                concurrency=concurrency,
+                timeout_seconds=args.timeout,
+                on_result=ProgressPrinter(args.progress_interval),
+            )
+        finally:
+            await engine.dispose()
+        report.results.extend(shard_report.results)
+        report.seconds += shard_report.seconds
 
-if __name__ == "__main__":
-    asyncio.run(migrate_tenant_schemas())
+    if not report.results:
+        print("No tenant schemas found.")
+        return 0
+
+    counts = report.counts
+    print(f"\n=== Done in {report.seconds:.1f}s ===")
+    for status in ("upgraded", "current", "locked", "failed"):
+        print(f"  {status}: {counts.get(status, 0)}")
+    if counts.get("locked"):
+        print("Locked schemas are being migrated by another run; re-run to confirm them.")
+    if report.failed:
+        print("Re-run the script to retry the failed schemas.")
+        return 1
+    return 0
 
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--schema", action="append", help="Only migrate this schema (repeatable)")
+    parser.add_argument("--target", type=int, help="Target version (default: latest)")
+    parser.add_argument("--concurrency", type=int, help="Schemas migrated at once")
+    parser.add_argument("--timeout", type=float, help="Seconds allowed per schema")
+    parser.add_argument("--progress-interval", type=float, default=2, help="Seconds between progress lines")
+    raise SystemExit(asyncio.run(main(parser.parse_args())))
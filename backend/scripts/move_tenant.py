@@ -0,0 +1,90 @@
+"""
+Script to move one organization's tenant schema to another shard online.
+
+This script:
+1. Looks up the organization by slug and checks the target shard is
+   configured in DATABASE_SHARDS (or is "default")
+2. Copies the schema to the target shard while the organization keeps
+   serving requests, printing each catch-up pass
+3. Blocks writes only for the final pass, switches the organization to the
+   target shard and renames the source schema to moved_<schema> (or drops
+   it with --drop-source)
+
+An interrupted or failed move leaves the organization where it was; run the
+script again to retry. See ``app.core.tenant_moves``.
+
+The move holds a session advisory lock, so the script connects to the public
+tables through DATABASE_DIRECT_URL when it is set (bypassing PgBouncer).
+
+Usage:
+    python scripts/move_tenant.py --org acme --to east
+    python scripts/move_tenant.py --org acme --to default --drop-source
+"""
+import argparse
+import asyncio
+from sqlalchemy import select
+from app.core.config import settings
+from app.core.database import DEFAULT_SHARD, create_worker_engine, dispose_shard_engines
+from app.core.tenant_moves import move_tenant
+from app.models.tenant import Organization
+
+
+async def main(args: argparse.Namespace) -> int:
+    if args.to != DEFAULT_SHARD and args.to not in settings.DATABASE_SHARDS:
+        known = ", ".join([DEFAULT_SHARD, *settings.DATABASE_SHARDS])
+        print(f"Unknown shard {args.to!r} (configured: {known})")
+        return 1
+    engine = create_worker_engine()
+    try:
+        async with engine.connect() as conn:
+            organization_id = await conn.scalar(
+                select(Organization.id).where(Organization.slug == args.org)
+            )
+        if organization_id is None:
+            print(f"Organization {args.org!r} not found")
+            return 1
+
+        print(f"=== Moving {args.org} to shard {args.to} ===")
+        try:
+            move = await move_tenant(
+                engine,
+                organization_id,
+                args.to,
+                batch_size=args.batch_size,
+                max_passes=args.max_passes,
+                cutover_rows=args.cutover_rows,
+                lock_timeout_ms=args.lock_timeout_ms,
+                drop_source=args.drop_source,
+                on_pass=lambda number, rows: print(f"  pass {number}: {rows} rows"),
+            )
+        except Exception as exc:
+            print(f"✗ Move failed, {args.org} stays on its shard: {exc}")
+            return 1
+    finally:
+        await dispose_shard_engines()
+        await engine.dispose()
+
+    print(f"  cutover: {move.rows_at_cutover} rows")
+    print(
+        f"\n=== Done: {move.schema_name} moved from {move.source} to {move.target}, "
+        f"{move.rows_copied} rows in {move.passes} passes ({move.seconds:.1f}s) ==="
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--org", required=True, help="Slug of the organization to move")
+    parser.add_argument("--to", required=True, help="Target shard name")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Rows copied per statement")
+    parser.add_argument("--max-passes", type=int, default=10, help="Copy passes before the cutover")
+    parser.add_argument(
+        "--cutover-rows", type=int, default=1000,
+        help="Cut over once a catch-up pass copies at most this many rows",
+    )
+    parser.add_argument(
+        "--lock-timeout-ms", type=int, default=5000,
+        help="Longest wait for the write lock on the source tables",
+    )
+    parser.add_argument("--drop-source", action="store_true", help="Drop the source schema instead of renaming it")
+    raise SystemExit(asyncio.run(main(parser.parse_args())))
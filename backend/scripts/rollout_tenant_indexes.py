@@ -0,0 +1,111 @@
+"""
+Script to build new tenant indexes online across every tenant schema.
+
+This script, for the default shard and then each of DATABASE_SHARDS:
+1. Finds, in one catalog query, every tenant schema missing an index from
+   TENANT_ONLINE_INDEXES (or holding an INVALID copy of one)
+2. Builds them with CREATE INDEX CONCURRENTLY, at most --concurrency at a
+   time, pausing while replicas lag or backends pile up waiting on I/O
+3. Drops and retries builds that fail or come out INVALID
+4. Prints running build progress and a summary with every failure
+
+Re-running the script only builds what is still missing or invalid.
+See ``app.core.tenant_indexes``.
+
+Usage:
+    python scripts/rollout_tenant_indexes.py --dry-run
+    python scripts/rollout_tenant_indexes.py --concurrency 4 --max-lag 10
+"""
+import argparse
+import asyncio
+from collections import Counter
+from sqlalchemy.ext.asyncio import create_async_engine
+from app.core.config import settings
+from app.core.database import shard_urls
+from app.core.tenant_indexes import (
+    IndexBuild,
+    IndexBuildProgress,
+    find_index_builds,
+    rollout_tenant_indexes,
+)
+
+
+def print_build(build: IndexBuild, done: int, total: int) -> None:
+    mark = "✓" if build.status == "created" else "✗"
+    line = f"[{done}/{total}] {mark} {build.schema_name}.{build.index_name} in {build.seconds:.1f}s"
+    if build.status == "failed":
+        line += f" after {build.attempts} attempt(s): {build.error}"
+    print(line)
+
+
+def print_progress(running: list[IndexBuildProgress]) -> None:
+    for row in running:
+        done = f"{row.blocks_done / row.blocks_total:.0%}" if row.blocks_total else "-"
+        print(f"    building {row.schema_name}.{row.index_name}: {row.phase} ({done} of blocks)")
+
+
+async def main(args: argparse.Namespace) -> int:
+    concurrency = args.concurrency or settings.TENANT_INDEX_BUILD_CONCURRENCY
+    builds: list[IndexBuild] = []
+    for shard, url in shard_urls().items():
+        # Builds can legitimately run for a long time; no statement timeout
+        engine = create_async_engine(
+            url,
+            pool_size=concurrency + 2,
+            max_overflow=0,
+            connect_args={"server_settings": {"statement_timeout": "0"}},
+        )
+        try:
+            async with engine.connect() as conn:
+                shard_builds = await find_index_builds(conn)
+            if not shard_builds:
+                continue
+            builds.extend(shard_builds)
+
+            print(f"=== Rolling out tenant indexes on shard {shard} ===")
+            invalid = sum(build.invalid for build in shard_builds)
+            print(
+                f"{len(shard_builds)} index build(s), {invalid} replacing INVALID indexes, "
+                f"{concurrency} at a time\n"
+            )
+            if args.dry_run:
+                for build in shard_builds:
+                    print(f"  {build.schema_name}.{build.index_name}{' (invalid)' if build.invalid else ''}")
+                continue
+
+            await rollout_tenant_indexes(
+                engine,
+                shard_builds,
+                concurrency=concurrency,
+                attempts=args.attempts,
+                max_lag_seconds=args.max_lag,
+                max_io_waiters=args.max_io_waiters,
+                progress_interval=args.progress_interval,
+                on_build=print_build,
+                on_progress=print_progress,
+            )
+        finally:
+            await engine.dispose()
+
+    if not builds:
+        print("Every tenant schema has all online indexes.")
+        return 0
+    if args.dry_run:
+        return 0
+    counts = Counter(build.status for build in builds)
+    print(f"\n=== Done: {counts.get('created', 0)} created, {counts.get('failed', 0)} failed ===")
+    if counts.get("failed"):
+        print("Re-run the script to retry the failed builds.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="Only list the builds needed")
+    parser.add_argument("--concurrency", type=int, help="Index builds run at once")
+    parser.add_argument("--attempts", type=int, help="Attempts per index before giving up")
+    parser.add_argument("--max-lag", type=float, help="Replication lag (s) above which builds wait")
+    parser.add_argument("--max-io-waiters", type=int, help="Backends waiting on I/O above which builds wait")
+    parser.add_argument("--progress-interval", type=float, default=10, help="Seconds between progress reports")
+    raise SystemExit(asyncio.run(main(parser.parse_args())))
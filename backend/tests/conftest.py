@@ -1,17 +1,21 @@
 import pytest
 import uuid
+import fakeredis
 from typing import AsyncGenerator
 from httpx import AsyncClient, ASGITransport
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy import text
+from sqlalchemy.engine import make_url
 from app.main import app
 from app.core.config import settings
-from app.core.database import get_db, Base, AsyncSessionLocal
+from app.core.database import get_db, Base, AsyncSessionLocal, TenantSession, dispose_shard_engines, get_shard_engine
 from app.core.security import create_access_token
+from app.core.tenant_cache import clear_schema_cache
 from app.models.tenant import Organization
 from app.models.user import User
 from app.models.member import OrganizationMember
 from app.middleware.tenant import TenantMiddleware
+import app.core.redis as redis_module
 
 # Use the same test database URL
 TEST_DATABASE_URL = str(settings.DATABASE_URL)
@@ -47,7 +51,8 @@ async def session_factory(engine):
     _test_session_factory = async_sessionmaker(
         engine, 
         expire_on_commit=False, 
-        class_=AsyncSession
+        class_=AsyncSession,
+        sync_session_class=TenantSession,
     )
     return _test_session_factory
 
@@ -59,16 +64,23 @@ async def db_session(session_factory) -> AsyncGenerator[AsyncSession, None]:
         await session.rollback()
 
 @pytest.fixture
-async def client(db_session: AsyncSession, engine) -> AsyncGenerator[AsyncClient, None]:
+async def client(db_session: AsyncSession, engine, fake_redis, monkeypatch) -> AsyncGenerator[AsyncClient, None]:
     """Provide an HTTP client for testing."""
+    # No Dramatiq worker runs in tests: provision new tenants inline
+    monkeypatch.setattr(settings, "TENANT_PROVISIONING_ASYNC", False)
     # Override the get_db dependency
     async def override_get_db():
+        # The app opens a session per request; reset per-request state
+        for key in ("replica", "shard", "tenant_settings"):
+            db_session.info.pop(key, None)
         yield db_session
 
     app.dependency_overrides[get_db] = override_get_db
     
     # Store test session in app state for middleware to use
     app.test_session = db_session
+    # Organization ids restart with every test database
+    clear_schema_cache()
     
     transport = ASGITransport(app=app)
     async with AsyncClient(transport=transport, base_url="http://test", follow_redirects=True) as c:
@@ -150,3 +162,31 @@ async def auth_headers(test_user: User, test_org: Organization) -> dict:
     """Generate authorization headers with JWT token."""
     token = create_access_token(subject=test_user.id, tenant_id=test_org.id)
     return {"Authorization": f"Bearer {token}"}
+
+@pytest.fixture
+async def fake_redis(monkeypatch) -> AsyncGenerator[fakeredis.FakeAsyncRedis, None]:
+    """Replace the shared Redis client with an in-memory fake."""
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    monkeypatch.setattr(redis_module, "_client", client)
+    yield client
+    await client.aclose()
+
+
+SHARD = "east"
+
+
+@pytest.fixture
+async def shard(monkeypatch):
+    """A second database registered as shard "east"."""
+    url = make_url(str(settings.DATABASE_URL))
+    name = f"{url.database}_shard_test"
+    admin = create_async_engine(url, isolation_level="AUTOCOMMIT")
+    async with admin.connect() as conn:
+        await conn.execute(text(f"DROP DATABASE IF EXISTS {name} WITH (FORCE)"))
+        await conn.execute(text(f"CREATE DATABASE {name}"))
+    monkeypatch.setitem(settings.DATABASE_SHARDS, SHARD, url.set(database=name).render_as_string(hide_password=False))
+    yield get_shard_engine(SHARD)
+    await dispose_shard_engines()
+    async with admin.connect() as conn:
+        await conn.execute(text(f"DROP DATABASE IF EXISTS {name} WITH (FORCE)"))
+    await admin.dispose()
@@ -1,5 +1,8 @@
+import asyncio
 import pytest
 from httpx import AsyncClient
+from sqlalchemy import select
+from app.core.config import settings
 
 @pytest.mark.asyncio
 async def test_register(client: AsyncClient):
@@ -36,3 +39,276 @@ async def test_auth_me(client: AsyncClient, auth_headers):
     res = response.json()
     assert res["email"].endswith("@example.com")
     assert res["is_active"] is True
+
+@pytest.mark.asyncio
+async def test_refresh_rotates_token(client: AsyncClient, test_user, test_org):
+    login = await client.post(
+        "/api/v1/auth/login",
+        json={"email": test_user.email, "password": "hashed_password"}
+    )
+    refresh_token = login.json()["refresh_token"]
+
+    response = await client.post("/api/v1/auth/refresh", json={"refresh_token": refresh_token})
+    assert response.status_code == 200
+    assert response.json()["refresh_token"] != refresh_token
+
+    # The old refresh token has been revoked by the rotation
+    reused = await client.post("/api/v1/auth/refresh", json={"refresh_token": refresh_token})
+    assert reused.status_code == 401
+
+@pytest.mark.asyncio
+async def test_refresh_with_redis_backend(client: AsyncClient, test_user, test_org, fake_redis, monkeypatch):
+    monkeypatch.setattr(settings, "REFRESH_TOKEN_BACKEND", "redis")
+    login = await client.post(
+        "/api/v1/auth/login",
+        json={"email": test_user.email, "password": "hashed_password"}
+    )
+    refresh_token = login.json()["refresh_token"]
+    keys = await fake_redis.keys("refresh_token:*")
+    assert len(keys) == 1
+    assert 0 < await fake_redis.ttl(keys[0]) <= settings.REFRESH_TOKEN_EXPIRE_MINUTES * 60
+
+    response = await client.post("/api/v1/auth/refresh", json={"refresh_token": refresh_token})
+    assert response.status_code == 200
+    new_keys = await fake_redis.keys("refresh_token:*")
+    assert len(new_keys) == 1 and new_keys != keys
+
+    reused = await client.post("/api/v1/auth/refresh", json={"refresh_token": refresh_token})
+    assert reused.status_code == 401
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend", ["database", "redis"])
+async def test_password_change_and_deactivation_revoke_refresh_tokens(
+    client: AsyncClient, test_user, test_org, fake_redis, monkeypatch, backend,
+):
+    monkeypatch.setattr(settings, "REFRESH_TOKEN_BACKEND", backend)
+
+    async def login(password: str) -> dict:
+        response = await client.post("/api/v1/auth/login", json={"email": test_user.email, "password": password})
+        assert response.status_code == 200
+        return response.json()
+
+    first, second = await login("hashed_password"), await login("hashed_password")
+    # A rotated token is revoked along with the ones never used
+    rotated = (await client.post("/api/v1/auth/refresh", json={"refresh_token": second["refresh_token"]})).json()
+    response = await client.post(
+        "/api/v1/auth/password",
+        json={"current_password": "hashed_password", "new_password": "new_password"},
+        headers={"Authorization": f"Bearer {first['access_token']}"},
+    )
+    assert response.status_code == 204
+    for tokens in (first, rotated):
+        response = await client.post("/api/v1/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+        assert response.status_code == 401
+
+    tokens = await login("new_password")
+    response = await client.post(
+        "/api/v1/auth/deactivate", headers={"Authorization": f"Bearer {tokens['access_token']}"},
+    )
+    assert response.status_code == 204
+    response = await client.post("/api/v1/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 401
+
+@pytest.mark.asyncio
+async def test_refresh_rejects_inactive_users(client: AsyncClient, test_user, test_org, db_session):
+    login = await client.post(
+        "/api/v1/auth/login",
+        json={"email": test_user.email, "password": "hashed_password"}
+    )
+    test_user.is_active = False
+    await db_session.commit()
+
+    response = await client.post("/api/v1/auth/refresh", json={"refresh_token": login.json()["refresh_token"]})
+    assert response.status_code == 403
+    assert response.json()["detail"] == "Inactive user"
+
+@pytest.mark.asyncio
+async def test_login_rate_limited_before_password_check(client: AsyncClient, test_user, monkeypatch):
+    data = {"email": test_user.email, "password": "wrong-password"}
+    for _ in range(settings.LOGIN_RATE_LIMIT_EMAIL_CAPACITY):
+        response = await client.post("/api/v1/auth/login", json=data)
+        assert response.status_code == 401
+
+    def fail_verify(*args, **kwargs):
+        raise AssertionError("verify_password must not run for throttled logins")
+
+    monkeypatch.setattr("app.api.routes.auth.verify_password", fail_verify)
+    response = await client.post("/api/v1/auth/login", json=data)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+
+@pytest.mark.asyncio
+async def test_login_rehashes_password_at_target_cost(
+    client: AsyncClient, test_user, session_factory, db_session, monkeypatch
+):
+    from app.core import security
+    from app.models.user import User
+
+    # The fixture hashed at the calibrated cost; lower the target so it differs
+    monkeypatch.setattr(security, "_bcrypt_rounds", 4)
+    monkeypatch.setattr(settings, "BCRYPT_ROUNDS", None)
+    monkeypatch.setattr("app.api.routes.auth.AsyncSessionLocal", session_factory)
+    assert security.password_needs_rehash(test_user.hashed_password)
+
+    data = {"email": test_user.email, "password": "hashed_password"}
+    response = await client.post("/api/v1/auth/login", json=data)
+    assert response.status_code == 200
+
+    stored_hash = await db_session.scalar(
+        select(User.hashed_password).where(User.id == test_user.id)
+    )
+    assert stored_hash.startswith("$2b$04$")
+    assert not security.password_needs_rehash(stored_hash)
+
+    response = await client.post("/api/v1/auth/login", json=data)
+    assert response.status_code == 200
+
+def test_calibrate_bcrypt_rounds_respects_bounds():
+    from app.core.security import calibrate_bcrypt_rounds
+
+    assert calibrate_bcrypt_rounds(target_ms=0.001, min_rounds=4, max_rounds=6) == 4
+    assert calibrate_bcrypt_rounds(target_ms=60_000, min_rounds=4, max_rounds=6) == 6
+
+@pytest.mark.asyncio
+async def test_stateless_auth_skips_database_and_honours_logout(
+    client: AsyncClient, test_user, engine, monkeypatch
+):
+    from sqlalchemy import event
+
+    monkeypatch.setattr(settings, "AUTH_MODE", "stateless")
+    response = await client.post(
+        "/api/v1/auth/login", json={"email": test_user.email, "password": "hashed_password"}
+    )
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    statements = []
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    try:
+        response = await client.get("/api/v1/spaces", headers=headers)
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", record)
+    assert response.status_code == 200
+    # Only the tenant query itself: no user or organization lookups
+    assert not any("users" in s or "organizations" in s for s in statements)
+
+    response = await client.post("/api/v1/auth/logout", headers=headers)
+    assert response.status_code == 204
+    response = await client.get("/api/v1/spaces", headers=headers)
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Token has been revoked"
+
+@pytest.mark.asyncio
+async def test_password_change_revokes_existing_tokens(client: AsyncClient, test_user, monkeypatch):
+    monkeypatch.setattr(settings, "AUTH_MODE", "stateless")
+
+    async def login(password: str) -> dict:
+        response = await client.post(
+            "/api/v1/auth/login", json={"email": test_user.email, "password": password}
+        )
+        assert response.status_code == 200
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    headers = await login("hashed_password")
+    response = await client.post(
+        "/api/v1/auth/password",
+        json={"current_password": "hashed_password", "new_password": "new_password"},
+        headers=headers,
+    )
+    assert response.status_code == 204
+    response = await client.get("/api/v1/auth/me", headers=headers)
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Token has been revoked"
+
+    # A token issued right after the revocation, likely within the same second, still works
+    headers = await login("new_password")
+    assert (await client.get("/api/v1/auth/me", headers=headers)).status_code == 200
+
+    response = await client.post("/api/v1/auth/deactivate", headers=headers)
+    assert response.status_code == 204
+    assert (await client.get("/api/v1/auth/me", headers=headers)).status_code == 401
+
+@pytest.mark.asyncio
+async def test_database_mode_skips_revocation_list(client: AsyncClient, auth_headers, test_user, fake_redis):
+    from redis.exceptions import ConnectionError
+
+    async def unavailable(*args, **kwargs):
+        raise ConnectionError("Redis is down")
+
+    # Database mode reloads the user on every request and never asks Redis
+    fake_redis.mget = unavailable
+    assert (await client.get("/api/v1/auth/me", headers=auth_headers)).status_code == 200
+
+    assert (await client.post("/api/v1/auth/deactivate", headers=auth_headers)).status_code == 204
+    response = await client.get("/api/v1/auth/me", headers=auth_headers)
+    assert response.status_code == 403
+
+@pytest.mark.asyncio
+async def test_switch_org(client: AsyncClient, auth_headers, test_user, db_session):
+    from jose import jwt
+    from app.core.tenant_cache import get_cached_schema
+    from app.models.member import OrganizationMember
+    from app.models.tenant import Organization
+
+    other = Organization(name="Other", slug="other-org", schema_name="tenant_other_org", is_active=True)
+    foreign = Organization(name="Foreign", slug="foreign-org", schema_name="tenant_foreign_org", is_active=True)
+    db_session.add_all([other, foreign])
+    await db_session.flush()
+    db_session.add(OrganizationMember(
+        user_id=test_user.id, organization_id=other.id, role="MEMBER", status="ACTIVE"
+    ))
+    await db_session.commit()
+
+    response = await client.post(
+        "/api/v1/auth/switch-org", json={"organization_id": other.id}, headers=auth_headers
+    )
+    assert response.status_code == 200
+    payload = jwt.decode(
+        response.json()["access_token"], settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
+    )
+    assert payload["tenant_id"] == other.id
+    assert get_cached_schema(other.id) == "tenant_other_org"
+
+    response = await client.post(
+        "/api/v1/auth/switch-org", json={"organization_id": foreign.id}, headers=auth_headers
+    )
+    assert response.status_code == 403
+
+@pytest.mark.asyncio
+async def test_password_hashing_is_bounded(monkeypatch):
+    import threading
+    from fastapi import HTTPException
+    from app.core import security
+
+    monkeypatch.setattr(settings, "PASSWORD_HASH_CONCURRENCY", 1)
+    monkeypatch.setattr(settings, "PASSWORD_HASH_QUEUE_LIMIT", 1)
+    monkeypatch.setattr(security, "_hash_limiter", None)
+    release = threading.Event()
+    running = asyncio.create_task(security.run_password_hash(release.wait))
+    await asyncio.sleep(0.05)
+    queued = asyncio.create_task(security.run_password_hash(lambda: True))
+    await asyncio.sleep(0.05)
+
+    with pytest.raises(HTTPException) as rejected:
+        await security.run_password_hash(lambda: True)
+    assert rejected.value.status_code == 503
+
+    release.set()
+    assert await running and await queued
+
+
+def test_password_hashing_defaults_scale_with_cores(monkeypatch):
+    from app.core import security
+
+    monkeypatch.setattr(security.os, "sched_getaffinity", lambda pid: {0, 1, 2, 3}, raising=False)
+    monkeypatch.setattr(settings, "PASSWORD_HASH_TARGET_MS", 250)
+    monkeypatch.setattr(settings, "LOAD_SHED_LATENCY_BUDGET_SECONDS", 1.0)
+    assert security.password_hash_concurrency() == 4
+    # Four threads get through 16 waiting hashes within the one-second budget
+    assert security.password_hash_queue_limit() == 16
+
+    monkeypatch.setattr(settings, "PASSWORD_HASH_CONCURRENCY", 2)
+    assert security.password_hash_queue_limit() == 8
+    monkeypatch.setattr(settings, "PASSWORD_HASH_QUEUE_LIMIT", 3)
+    assert security.password_hash_queue_limit() == 3
@@ -0,0 +1,199 @@
+import asyncio
+import time
+import pytest
+from fastapi import APIRouter, Depends, FastAPI
+from fastapi.routing import APIRoute
+from httpx import ASGITransport, AsyncClient
+from pydantic import BaseModel, field_validator
+from sqlalchemy import event, text
+from app.core import database
+from app.core.config import settings
+from app.core.database import DatabaseRoute, dispose_shard_engines, get_db
+from app.core.tenant_cache import clear_schema_cache
+from app.main import app as main_app
+
+checked_out_at_serialization: list[int] = []
+
+
+class Answer(BaseModel):
+    value: int
+
+    @field_validator("value")
+    @classmethod
+    def record_pool(cls, value: int) -> int:
+        checked_out_at_serialization.append(database.engine.sync_engine.pool.checkedout())
+        return value
+
+
+async def answer(db=Depends(get_db)) -> dict:
+    return {"value": await db.scalar(text("SELECT 1"))}
+
+
+@pytest.fixture
+async def module_engine():
+    """The application's own engine, as used by the real get_db."""
+    yield database.engine
+    await database.engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_connection_released_before_serialization(module_engine):
+    app = FastAPI()
+    for prefix, route_class in (("/released", DatabaseRoute), ("/held", APIRoute)):
+        router = APIRouter(route_class=route_class)
+        router.add_api_route("/", answer, response_model=Answer)
+        app.include_router(router, prefix=prefix)
+
+    checked_out_at_serialization.clear()
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        assert (await client.get("/released/")).json() == {"value": 1}
+        assert (await client.get("/held/")).json() == {"value": 1}
+    assert checked_out_at_serialization == [0, 1]
+
+
+@pytest.mark.asyncio
+async def test_rejected_request_checks_out_nothing(module_engine):
+    checkouts = []
+
+    def on_checkout(*args):
+        checkouts.append(1)
+
+    event.listen(module_engine.sync_engine, "checkout", on_checkout)
+    try:
+        async with AsyncClient(transport=ASGITransport(app=main_app), base_url="http://test") as client:
+            response = await client.get("/api/v1/auth/me", headers={"Authorization": "Bearer not-a-token"})
+    finally:
+        event.remove(module_engine.sync_engine, "checkout", on_checkout)
+    assert response.status_code == 401
+    assert checkouts == []
+
+
+async def statement_timeout(db=Depends(get_db)) -> str:
+    return await db.scalar(text("SHOW statement_timeout"))
+
+
+async def slow(db=Depends(get_db)) -> dict:
+    await db.execute(text("SELECT pg_sleep(5)"))
+    return {}
+
+
+@pytest.fixture
+def deadline_app(monkeypatch):
+    monkeypatch.setattr(settings, "REQUEST_DEADLINE_SECONDS", 5)
+    monkeypatch.setitem(settings.REQUEST_DEADLINES, "slow", 0.3)
+    router = APIRouter(route_class=DatabaseRoute)
+    router.add_api_route("/statement-timeout", statement_timeout)
+    router.add_api_route("/slow", slow)
+    app = FastAPI()
+    app.include_router(router)
+    return app
+
+
+async def sleeping_backends(engine) -> int:
+    """Backends still running the slow query, waiting a moment for cancel requests to land."""
+    for _ in range(20):
+        async with engine.connect() as conn:
+            count = await conn.scalar(text(
+                "SELECT count(*) FROM pg_stat_activity "
+                "WHERE state = 'active' AND query = 'SELECT pg_sleep(5)' AND pid <> pg_backend_pid()"
+            ))
+        if count == 0:
+            return 0
+        await asyncio.sleep(0.05)
+    return count
+
+
+@pytest.mark.asyncio
+async def test_deadline_sets_statement_timeout_and_cancels(module_engine, deadline_app):
+    async with AsyncClient(transport=ASGITransport(app=deadline_app), base_url="http://test") as client:
+        timeout = (await client.get("/statement-timeout")).json()
+        assert timeout.endswith("ms") and 4000 < int(timeout[:-2]) <= 5000
+
+        started = time.monotonic()
+        response = await client.get("/slow")
+    assert response.status_code == 504
+    assert time.monotonic() - started < 2
+    assert await sleeping_backends(module_engine) == 0
+
+
+@pytest.mark.asyncio
+async def test_client_disconnect_cancels_the_query(module_engine, deadline_app, monkeypatch):
+    monkeypatch.setitem(settings.REQUEST_DEADLINES, "slow", 30)
+    messages = [{"type": "http.request", "body": b"", "more_body": False}]
+    sent = []
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        # The client hangs up while the query runs
+        await asyncio.sleep(0.2)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/slow", "raw_path": b"/slow", "query_string": b"",
+        "root_path": "", "headers": [], "client": ("test", 1), "server": ("test", 80),
+    }
+    started = time.monotonic()
+    await deadline_app(scope, receive, send)
+    assert time.monotonic() - started < 2
+    assert sent[0]["status"] == 499
+    assert await sleeping_backends(module_engine) == 0
+
+
+@pytest.fixture
+async def live_client(engine, module_engine, fake_redis, monkeypatch):
+    """The application with the real get_db, whose sessions close before serialization."""
+    monkeypatch.setattr(settings, "TENANT_PROVISIONING_ASYNC", False)
+    clear_schema_cache()
+    async with AsyncClient(transport=ASGITransport(app=main_app), base_url="http://test") as client:
+        yield client
+    async with engine.begin() as conn:
+        for schema in ("tenant_live", "tenant_live_two"):
+            await conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+    await dispose_shard_engines()
+
+
+@pytest.mark.asyncio
+async def test_routes_serialize_after_their_sessions_close(live_client):
+    response = await live_client.post("/api/v1/auth/register", json={
+        "email": "live@example.com",
+        "password": "testpassword",
+        "organization_name": "Live",
+        "organization_slug": "live",
+    })
+    assert response.status_code == 201
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    assert (await live_client.get("/api/v1/auth/me", headers=headers)).json()["email"] == "live@example.com"
+
+    # Memberships are returned with their organization
+    response = await live_client.post("/api/v1/orgs/", json={"name": "Live Two", "slug": "live-two"}, headers=headers)
+    assert response.status_code == 201
+    assert response.json()["organization"]["slug"] == "live-two"
+    response = await live_client.get("/api/v1/orgs/", headers=headers)
+    assert sorted(member["organization"]["slug"] for member in response.json()) == ["live", "live-two"]
+    assert (await live_client.get("/api/v1/orgs/live", headers=headers)).json()["slug"] == "live"
+
+    response = await live_client.post(
+        "/api/v1/spaces/", json={"name": "Desk", "space_type": "hourly", "price_per_unit": 5.0}, headers=headers,
+    )
+    assert response.status_code == 201
+    space_id = response.json()["id"]
+    response = await live_client.put(f"/api/v1/spaces/{space_id}", json={"name": "Corner desk"}, headers=headers)
+    assert response.json()["name"] == "Corner desk"
+    assert [space["id"] for space in (await live_client.get("/api/v1/spaces/", headers=headers)).json()] == [space_id]
+
+    response = await live_client.post("/api/v1/reservations/", json={
+        "space_id": space_id, "start_time": "2025-12-01T10:00:00Z", "end_time": "2025-12-01T12:00:00Z",
+    }, headers=headers)
+    assert response.status_code == 201
+    reservation_id = response.json()["id"]
+    response = await live_client.put(
+        f"/api/v1/reservations/{reservation_id}", json={"notes": "Moved"}, headers=headers,
+    )
+    assert response.json()["notes"] == "Moved"
+    response = await live_client.get(f"/api/v1/reservations/{reservation_id}", headers=headers)
+    assert response.json()["space_id"] == space_id
@@ -0,0 +1,76 @@
+import asyncio
+import pytest
+from httpx import ASGITransport, AsyncClient
+from app.middleware.load_shedding import SHED, LoadSheddingMiddleware
+
+ORDER: list[str] = []
+
+
+class GatedApp:
+    """Holds every request until released, recording the order requests start."""
+
+    def __init__(self):
+        self.gate = asyncio.Event()
+
+    async def __call__(self, scope, receive, send):
+        ORDER.append(f"{scope['method']} {scope['path']}")
+        if scope["path"] != "/health":
+            await self.gate.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+
+@pytest.fixture
+def shedder():
+    ORDER.clear()
+    return LoadSheddingMiddleware(GatedApp(), concurrency=1, latency_budget=0.5)
+
+
+async def started(count: int) -> None:
+    while len(ORDER) < count:
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_writes_go_ahead_of_queued_reads(shedder):
+    async with AsyncClient(transport=ASGITransport(app=shedder), base_url="http://test") as client:
+        first = asyncio.create_task(client.get("/first"))
+        await started(1)
+        read = asyncio.create_task(client.get("/read"))
+        await asyncio.sleep(0.05)
+        write = asyncio.create_task(client.post("/write"))
+        await asyncio.sleep(0.05)
+        assert len(shedder.waiters) == 2
+
+        # Health checks skip the queue
+        assert (await client.get("/health")).status_code == 200
+
+        shedder.app.gate.set()
+        responses = await asyncio.gather(first, read, write)
+    assert [response.status_code for response in responses] == [200, 200, 200]
+    assert ORDER == ["GET /first", "GET /health", "POST /write", "GET /read"]
+    assert shedder.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_requests_over_the_latency_budget_are_shed(shedder):
+    # Recent requests held their slot for 2s: nothing queued behind one can make the budget
+    shedder.service_time.add(10)
+    shed = SHED.value(priority="read")
+    async with AsyncClient(transport=ASGITransport(app=shedder), base_url="http://test") as client:
+        first = asyncio.create_task(client.get("/first"))
+        await started(1)
+        response = await client.get("/read")
+        assert response.status_code == 503
+        assert int(response.headers["retry-after"]) >= 1
+        assert SHED.value(priority="read") == shed + 1
+
+        # Queued requests still waiting when the budget runs out are shed too
+        shedder.service_time = type(shedder.service_time)()
+        response = await client.post("/write")
+        assert response.status_code == 503
+        assert not any(not waiter[2].done() for waiter in shedder.waiters)
+
+        shedder.app.gate.set()
+        assert (await first).status_code == 200
+    assert shedder.in_flight == 0
@@ -46,3 +46,150 @@ async def test_get_org_by_slug(client: AsyncClient, auth_headers):
     org = resp.json()
     assert org["slug"] == "org-extra"
     assert org["name"] == "Org Extra"
+
+@pytest.mark.asyncio
+async def test_register_provisions_tenant_schema(client: AsyncClient, db_session):
+    from sqlalchemy import text
+    from app.models.reservation import Reservation
+    from app.models.space import Space
+
+    data = {
+        "email": "provision@example.com",
+        "password": "testpassword",
+        "organization_name": "Org Provisioned",
+        "organization_slug": "org-provisioned"
+    }
+    try:
+        reg_resp = await client.post("/api/v1/auth/register", json=data)
+        assert reg_resp.status_code == 201
+
+        result = await db_session.execute(text(
+            "SELECT table_name FROM information_schema.tables "
+            "WHERE table_schema = 'tenant_org_provisioned' ORDER BY table_name"
+        ))
+        assert [row[0] for row in result] == ["reservations", "spaces", "tenant_schema_version"]
+        # New schemas start at the latest tenant migration
+        from app.core.tenant_migrations import head_version
+        version = await db_session.scalar(text(
+            "SELECT max(version) FROM tenant_org_provisioned.tenant_schema_version"
+        ))
+        assert version == head_version()
+        # Provisioning must not rebind the shared model metadata
+        assert Space.__table__.schema is None
+        assert Reservation.__table__.schema is None
+    finally:
+        await db_session.execute(text("DROP SCHEMA IF EXISTS tenant_org_provisioned CASCADE"))
+        await db_session.commit()
+
+@pytest.mark.asyncio
+async def test_register_claims_pooled_schema(client: AsyncClient, db_session, engine):
+    from sqlalchemy import text
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlalchemy.pool import NullPool
+    from app.core.tenant_schema import fill_schema_pool
+
+    # Fill from a separate NullPool engine, as the worker does
+    worker_engine = create_async_engine(engine.url, poolclass=NullPool)
+    pooled = await fill_schema_pool(worker_engine, size=2)
+    assert len(pooled) == 2
+    assert await fill_schema_pool(worker_engine, size=2) == []
+    await worker_engine.dispose()
+
+    data = {
+        "email": "pooled@example.com",
+        "password": "testpassword",
+        "organization_name": "Org Pooled",
+        "organization_slug": "org-pooled"
+    }
+    try:
+        reg_resp = await client.post("/api/v1/auth/register", json=data)
+        assert reg_resp.status_code == 201
+
+        remaining = await db_session.execute(text("SELECT schema_name FROM public.tenant_schema_pool"))
+        remaining = [row[0] for row in remaining]
+        assert len(remaining) == 1
+        # The oldest pooled schema was renamed, indexes included
+        claimed = next(name for name in pooled if name not in remaining)
+        result = await db_session.execute(text(
+            "SELECT indexname FROM pg_indexes WHERE schemaname = 'tenant_org_pooled'"
+        ))
+        indexes = {row[0] for row in result}
+        assert "ix_tenant_org_pooled_reservations_status" in indexes
+        assert not any(claimed in name for name in indexes)
+
+        headers = {"Authorization": f"Bearer {reg_resp.json()['access_token']}"}
+        response = await client.post(
+            "/api/v1/spaces",
+            json={"name": "Pooled Space", "space_type": "hourly", "price_per_unit": 5.0},
+            headers=headers,
+        )
+        assert response.status_code == 201
+    finally:
+        for schema in [*pooled, "tenant_org_pooled"]:
+            await db_session.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+        await db_session.commit()
+
+@pytest.mark.asyncio
+async def test_async_provisioning_gates_tenant_routes(client: AsyncClient, db_session, engine, monkeypatch):
+    from sqlalchemy import text
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlalchemy.pool import NullPool
+    from app.core.config import settings
+    from app.core.tenant_schema import provision_organization, stale_provisioning_organizations
+
+    enqueued = []
+    monkeypatch.setattr(settings, "TENANT_PROVISIONING_ASYNC", True)
+    monkeypatch.setattr("app.api.dependencies.tenant.enqueue_tenant_provisioning", enqueued.append)
+
+    data = {
+        "email": "async@example.com",
+        "password": "testpassword",
+        "organization_name": "Org Async",
+        "organization_slug": "org-async"
+    }
+    try:
+        reg_resp = await client.post("/api/v1/auth/register", json=data)
+        assert reg_resp.status_code == 201
+        assert len(enqueued) == 1
+        headers = {"Authorization": f"Bearer {reg_resp.json()['access_token']}"}
+
+        resp = await client.get("/api/v1/orgs/org-async/status", headers=headers)
+        assert resp.json() == {"slug": "org-async", "status": "PROVISIONING", "ready": False}
+        assert "Retry-After" in resp.headers
+
+        resp = await client.get("/api/v1/spaces", headers=headers)
+        assert resp.status_code == 503
+        assert resp.headers["Retry-After"] == str(settings.TENANT_PROVISIONING_RETRY_AFTER_SECONDS)
+
+        # What the provision_tenant actor does
+        worker_engine = create_async_engine(engine.url, poolclass=NullPool)
+        # Until then the periodic sweep would hand it over again once it is stale
+        assert await stale_provisioning_organizations(worker_engine, 3600) == []
+        assert await stale_provisioning_organizations(worker_engine, 0) == enqueued
+        assert await provision_organization(worker_engine, enqueued[0])
+        assert not await provision_organization(worker_engine, enqueued[0])
+        assert await stale_provisioning_organizations(worker_engine, 0) == []
+        await worker_engine.dispose()
+
+        resp = await client.get("/api/v1/orgs/org-async/status", headers=headers)
+        assert resp.json()["ready"] is True
+        resp = await client.get("/api/v1/spaces", headers=headers)
+        assert resp.status_code == 200
+    finally:
+        await db_session.rollback()
+        await db_session.execute(text("DROP SCHEMA IF EXISTS tenant_org_async CASCADE"))
+        await db_session.commit()
+
+@pytest.mark.asyncio
+async def test_slugs_must_be_plain_identifiers(client: AsyncClient, auth_headers):
+    slug = "x; DROP SCHEMA public CASCADE; --"
+    data = {
+        "email": "slug@example.com",
+        "password": "testpassword",
+        "organization_name": "Bad Slug",
+        "organization_slug": slug,
+    }
+    assert (await client.post("/api/v1/auth/register", json=data)).status_code == 422
+    for bad in (slug, "Upper", "-leading", "a"):
+        resp = await client.post("/api/v1/orgs/", json={"name": "Bad", "slug": bad}, headers=auth_headers)
+        assert resp.status_code == 422
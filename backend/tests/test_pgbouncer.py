@@ -0,0 +1,186 @@
+"""
+DATABASE_PGBOUNCER against a stand-in for PgBouncer in transaction mode.
+
+``TransactionPooler`` speaks just enough of the PostgreSQL protocol to
+hand a small set of server connections to its clients one transaction at
+a time, like PgBouncer with ``pool_mode = transaction``: a client gets a
+server connection for its next message and gives it back when the server
+reports it idle outside a transaction. Like PgBouncer's default, the most
+recently released server connection is handed out first. Server
+connections authenticate with trust, as in the test database.
+"""
+import asyncio
+import struct
+from types import SimpleNamespace
+import pytest
+from sqlalchemy import select, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import NullPool
+from app.api.dependencies.tenant import set_tenant_schema
+from app.core.config import settings
+from app.core.database import TenantSession, _connect_args
+from app.models.tenant import Organization
+
+SSL_REQUEST = 80877103
+GSSENC_REQUEST = 80877104
+PROTOCOL_3 = 196608
+
+
+async def read_message(reader: asyncio.StreamReader) -> tuple[bytes, bytes]:
+    header = await reader.readexactly(5)
+    (length,) = struct.unpack("!i", header[1:])
+    return header[:1], header + await reader.readexactly(length - 4)
+
+
+def message(kind: bytes, body: bytes) -> bytes:
+    return kind + struct.pack("!i", len(body) + 4) + body
+
+
+class TransactionPooler:
+    """A TCP proxy pooling server connections per transaction."""
+
+    def __init__(self, host: str, port: int, user: str, database: str, server_connections: int = 1):
+        self.target = (host, port)
+        self.startup = (user, database)
+        self.server_connections = server_connections
+        self.idle: asyncio.LifoQueue = asyncio.LifoQueue()
+        self.parameters: list[bytes] = []
+        self.servers: list[asyncio.StreamWriter] = []
+
+    async def start(self) -> int:
+        for _ in range(self.server_connections):
+            self.idle.put_nowait(await self._connect_server())
+        self.listener = await asyncio.start_server(self._serve_client, "127.0.0.1", 0)
+        return self.listener.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        self.listener.close()
+        for writer in self.servers:
+            writer.close()
+
+    async def _connect_server(self):
+        reader, writer = await asyncio.open_connection(*self.target)
+        user, database = self.startup
+        params = f"user\0{user}\0database\0{database}\0\0".encode()
+        writer.write(struct.pack("!ii", len(params) + 8, PROTOCOL_3) + params)
+        while True:
+            kind, data = await read_message(reader)
+            if kind == b"S" and len(self.servers) == 0:
+                self.parameters.append(data)
+            elif kind == b"E":
+                raise RuntimeError(data)
+            elif kind == b"Z":
+                break
+        self.servers.append(writer)
+        return reader, writer
+
+    async def _serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        while True:
+            (length,) = struct.unpack("!i", await reader.readexactly(4))
+            (code,) = struct.unpack("!i", await reader.readexactly(4))
+            await reader.readexactly(length - 8)
+            if code not in (SSL_REQUEST, GSSENC_REQUEST):
+                break
+            writer.write(b"N")
+        writer.write(message(b"R", struct.pack("!i", 0)))
+        writer.write(b"".join(self.parameters))
+        writer.write(message(b"K", struct.pack("!ii", 1, 1)))
+        writer.write(message(b"Z", b"I"))
+
+        client = SimpleNamespace(server=None)
+        try:
+            while True:
+                kind, data = await read_message(reader)
+                if kind == b"X":
+                    break
+                if client.server is None:
+                    client.server = await self.idle.get()
+                    asyncio.create_task(self._relay(client, writer))
+                client.server[1].write(data)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        writer.close()
+
+    async def _relay(self, client, writer: asyncio.StreamWriter) -> None:
+        """Forward server messages until the transaction ends, then release the server."""
+        server = client.server
+        while True:
+            kind, data = await read_message(server[0])
+            if kind == b"Z" and data[5:] == b"I":
+                # Released before the client hears of it, so its next
+                # message already waits for an idle server connection
+                client.server = None
+                self.idle.put_nowait(server)
+                writer.write(data)
+                return
+            writer.write(data)
+
+
+@pytest.fixture
+async def pgbouncer(engine):
+    url = make_url(str(settings.DATABASE_URL))
+    pooler = TransactionPooler(url.host, url.port or 5432, url.username, url.database, server_connections=2)
+    port = await pooler.start()
+    yield url.set(host="127.0.0.1", port=port).render_as_string(hide_password=False)
+    await pooler.stop()
+
+
+def client_engine(url: str):
+    """One client of the pooler: every statement uses its single connection."""
+    return create_async_engine(url, poolclass=NullPool, connect_args=_connect_args())
+
+
+async def query_twice(url: str) -> None:
+    """
+    The same statement in two transactions of one client, while another
+    client holds the server connection the first transaction ran on.
+    """
+    client, other = client_engine(url), client_engine(url)
+    query = select(Organization.id).where(Organization.slug == "nobody")
+    try:
+        async with client.connect() as conn, other.connect() as other_conn:
+            await conn.execute(query)
+            await conn.commit()
+            await other_conn.execute(text("SELECT 1"))
+            await conn.execute(query)
+            await conn.commit()
+            await other_conn.commit()
+    finally:
+        await client.dispose()
+        await other.dispose()
+
+
+@pytest.mark.asyncio
+async def test_prepared_statements_need_pgbouncer_mode(pgbouncer, monkeypatch):
+    # The second transaction runs on the other server connection, which
+    # never saw the statement prepared (and cached) by the first one
+    monkeypatch.setattr(settings, "DATABASE_PGBOUNCER", False)
+    with pytest.raises(DBAPIError, match="does not exist"):
+        await query_twice(pgbouncer)
+
+    monkeypatch.setattr(settings, "DATABASE_PGBOUNCER", True)
+    await query_twice(pgbouncer)
+
+
+@pytest.mark.asyncio
+async def test_tenant_settings_stay_in_the_transaction(pgbouncer, monkeypatch):
+    monkeypatch.setattr(settings, "DATABASE_PGBOUNCER", True)
+    tenant_engine, other_engine = client_engine(pgbouncer), client_engine(pgbouncer)
+    user = SimpleNamespace(tenant_id=1, schema_name="tenant_probe", shard="default")
+    try:
+        async with AsyncSession(tenant_engine, sync_session_class=TenantSession) as db:
+            await set_tenant_schema(db, user)
+            assert await db.scalar(text("SHOW search_path")) == "tenant_probe, public"
+            await db.commit()
+
+            # The server connection went back to the pool without the setting
+            async with other_engine.connect() as conn:
+                assert await conn.scalar(text("SHOW search_path")) == '"$user", public'
+
+            # ...and the session applies it again to its next transaction
+            assert await db.scalar(text("SHOW search_path")) == "tenant_probe, public"
+    finally:
+        await tenant_engine.dispose()
+        await other_engine.dispose()
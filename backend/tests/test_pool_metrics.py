@@ -0,0 +1,101 @@
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import exc, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from app.core import pool_metrics
+from app.core.config import settings
+from app.core.pool_metrics import (
+    CHECKOUT_TIMEOUTS,
+    CHECKOUT_WAIT,
+    CONNECTION_HOLD,
+    EXHAUSTED_CHECKOUTS,
+    OVERFLOW_CHECKOUTS,
+    PRE_PING_FAILURES,
+    InstrumentedQueuePool,
+    instrument_engine,
+)
+
+
+@pytest.fixture(autouse=True)
+def isolated_pools(monkeypatch):
+    # Keep the test engines out of the pool gauges of later tests
+    monkeypatch.setattr(pool_metrics, "_engines", dict(pool_metrics._engines))
+
+
+def small_engine(name: str, **kwargs):
+    return instrument_engine(
+        create_async_engine(
+            str(settings.DATABASE_URL),
+            poolclass=InstrumentedQueuePool,
+            pool_logging_name=name,
+            **kwargs,
+        ),
+        name,
+    )
+
+
+@pytest.mark.asyncio
+async def test_exhaustion_overflow_and_hold_time():
+    engine = small_engine("test-exhausted", pool_size=1, max_overflow=0, pool_timeout=0.1)
+    try:
+        async with engine.connect():
+            with pytest.raises(exc.TimeoutError):
+                async with engine.connect():
+                    pass
+        assert EXHAUSTED_CHECKOUTS.value(pool="test-exhausted") == 1
+        assert CHECKOUT_TIMEOUTS.value(pool="test-exhausted") == 1
+        assert CHECKOUT_WAIT.count(pool="test-exhausted") == 2
+        assert CONNECTION_HOLD.count(pool="test-exhausted", endpoint="-") == 1
+    finally:
+        await engine.dispose()
+
+    engine = small_engine("test-overflow", pool_size=1, max_overflow=1)
+    try:
+        async with engine.connect(), engine.connect():
+            pass
+        assert OVERFLOW_CHECKOUTS.value(pool="test-overflow") == 1
+        assert EXHAUSTED_CHECKOUTS.value(pool="test-overflow") == 0
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_pre_ping_failure(engine):
+    pinged = small_engine("test-ping", pool_size=1, pool_pre_ping=True)
+    try:
+        async with pinged.connect() as conn:
+            pid = await conn.scalar(text("SELECT pg_backend_pid()"))
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT pg_terminate_backend(:pid)"), {"pid": pid})
+        async with pinged.connect() as conn:
+            assert await conn.scalar(text("SELECT pg_backend_pid()")) != pid
+        assert PRE_PING_FAILURES.value(pool="test-ping") == 1
+    finally:
+        await pinged.dispose()
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_reports_hold_time_per_endpoint(client: AsyncClient, engine, monkeypatch):
+    instrument_engine(engine, "test-requests")
+    response = await client.post("/api/v1/auth/register", json={
+        "email": "metrics@example.com",
+        "password": "testpassword",
+        "organization_name": "Metrics",
+        "organization_slug": "metrics",
+    })
+    assert response.status_code == 201
+
+    # Metrics name organizations: only the configured scraper may read them
+    assert (await client.get("/metrics")).status_code == 404
+    monkeypatch.setattr(settings, "METRICS_TOKEN", "scrape-token")
+    assert (await client.get("/metrics")).status_code == 401
+    response = await client.get("/metrics", headers={"Authorization": "Bearer wrong"})
+    assert response.status_code == 401
+
+    response = await client.get("/metrics", headers={"Authorization": "Bearer scrape-token"})
+    assert response.headers["content-type"].startswith("text/plain")
+    assert (
+        'db_pool_connection_hold_seconds_count{pool="test-requests",endpoint="register"}'
+        in response.text
+    )
+    assert 'db_pool_size{pool="test-requests"} 5' in response.text
@@ -0,0 +1,70 @@
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import event, text
+from app.core.config import settings
+from app.core.database import READ_PRIMARY_COOKIE, dispose_shard_engines, get_replica_engine
+
+
+@pytest.fixture
+async def replica(monkeypatch):
+    """A "replica" that is the primary itself, counting its checkouts."""
+    monkeypatch.setitem(settings.DATABASE_REPLICAS, "default", str(settings.DATABASE_URL))
+    replica_engine = get_replica_engine("default")
+    checkouts = []
+    event.listen(replica_engine.sync_engine.pool, "checkout", lambda *args: checkouts.append(1))
+    yield checkouts
+    await dispose_shard_engines()
+
+
+@pytest.fixture
+async def reader_schema(engine, db_session):
+    yield
+    await db_session.rollback()
+    async with engine.begin() as conn:
+        await conn.execute(text("DROP SCHEMA IF EXISTS tenant_reader CASCADE"))
+
+
+@pytest.mark.asyncio
+async def test_reads_use_replica_except_after_writes(
+    client: AsyncClient, db_session, fake_redis, replica, reader_schema,
+):
+    response = await client.post("/api/v1/auth/register", json={
+        "email": "reader@example.com",
+        "password": "testpassword",
+        "organization_name": "Reader",
+        "organization_slug": "reader",
+    })
+    assert READ_PRIMARY_COOKIE in response.cookies
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    response = await client.post(
+        "/api/v1/spaces", json={"name": "Desk", "space_type": "hourly", "price_per_unit": 5.0}, headers=headers,
+    )
+    assert response.status_code == 201
+    assert READ_PRIMARY_COOKIE in response.cookies
+    assert replica == []
+
+    # Right after writing, the client reads its own writes from the primary
+    response = await client.get("/api/v1/spaces", headers=headers)
+    assert [space["name"] for space in response.json()] == ["Desk"]
+    assert replica == []
+
+    # So does any other client of the organization, which has no cookie
+    client.cookies.clear()
+    response = await client.get("/api/v1/spaces", headers=headers)
+    assert [space["name"] for space in response.json()] == ["Desk"]
+    assert replica == []
+
+    # Once the window is over, reads go to the replica
+    await fake_redis.flushall()
+    await db_session.rollback()
+    response = await client.get("/api/v1/spaces", headers=headers)
+    assert [space["name"] for space in response.json()] == ["Desk"]
+    assert READ_PRIMARY_COOKIE not in response.cookies
+    assert replica != []
+
+    replica.clear()
+    await db_session.rollback()
+    response = await client.get("/api/v1/orgs", headers=headers)
+    assert response.status_code == 200
+    assert replica != []
+    await db_session.rollback()
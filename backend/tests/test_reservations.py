@@ -125,3 +125,30 @@ async def test_delete_reservation(client: AsyncClient, auth_headers):
     assert get_resp.status_code == 200
     res = get_resp.json()
     assert res["status"] == "cancelled"
+
+@pytest.mark.asyncio
+async def test_list_reservations_sparse_fields(client: AsyncClient, auth_headers):
+    space_resp = await client.post(
+        "/api/v1/spaces",
+        json={"name": "Sala Campos", "space_type": "daily", "price_per_unit": 30.0},
+        headers=auth_headers
+    )
+    space_id = space_resp.json()["id"]
+    await client.post(
+        "/api/v1/reservations",
+        json={
+            "space_id": space_id,
+            "start_time": "2025-12-05T09:00:00Z",
+            "end_time": "2025-12-06T09:00:00Z"
+        },
+        headers=auth_headers
+    )
+
+    response = await client.get(
+        "/api/v1/reservations?fields=id,space_id,status", headers=auth_headers
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data) == 1
+    assert data[0]["space_id"] == space_id
+    assert set(data[0]) == {"id", "space_id", "status"}
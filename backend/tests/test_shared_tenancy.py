@@ -0,0 +1,194 @@
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select, text
+from app.core.config import settings
+from app.core.shared_tenancy import convert_organization
+from app.core.tenant_migrations import execute_script, tenant_schema_ddl
+from app.models.tenant import SHARED_TENANT_SCHEMA, Organization, OrganizationTenancy
+
+
+@pytest.fixture
+async def shared_tables(engine, db_session):
+    async with engine.begin() as conn:
+        await execute_script(conn, tenant_schema_ddl(SHARED_TENANT_SCHEMA))
+    yield
+    # Before the public tables go: the shared tables reference organizations
+    await db_session.rollback()
+    async with engine.begin() as conn:
+        await conn.execute(text("DROP SCHEMA IF EXISTS shared CASCADE"))
+
+
+async def register(client: AsyncClient, slug: str) -> dict:
+    response = await client.post("/api/v1/auth/register", json={
+        "email": f"{slug}@example.com",
+        "password": "testpassword",
+        "organization_name": slug.title(),
+        "organization_slug": slug,
+    })
+    assert response.status_code == 201
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.mark.asyncio
+async def test_shared_tenancy_routes(client: AsyncClient, db_session, shared_tables, monkeypatch):
+    monkeypatch.setattr(settings, "TENANCY_MODE", "shared")
+    headers = await register(client, "shared-org")
+
+    organization = await db_session.scalar(select(Organization).where(Organization.slug == "shared-org"))
+    assert organization.tenancy == OrganizationTenancy.SHARED.value
+    assert organization.data_schema == "shared"
+    # No schema is provisioned for shared organizations
+    assert not await db_session.scalar(text("SELECT to_regnamespace('tenant_shared_org') IS NOT NULL"))
+
+    response = await client.post(
+        "/api/v1/spaces",
+        json={"name": "Shared Desk", "space_type": "hourly", "price_per_unit": 5.0},
+        headers=headers,
+    )
+    assert response.status_code == 201
+    space_id = response.json()["id"]
+
+    response = await client.get("/api/v1/spaces", headers=headers)
+    assert [space["id"] for space in response.json()] == [space_id]
+
+    row = (await db_session.execute(text("SELECT organization_id, name FROM shared.spaces"))).one()
+    assert tuple(row) == (organization.id, "Shared Desk")
+
+    # app.tenant_id is transaction-local; the session sets it again at the
+    # start of each transaction (e.g. for the refresh after a commit)
+    assert db_session.info["tenant_settings"]["app.tenant_id"] == str(organization.id)
+    await db_session.commit()
+    assert await db_session.scalar(text("SELECT current_setting('app.tenant_id')")) == str(organization.id)
+    db_session.info.pop("tenant_settings")
+
+
+@pytest.mark.asyncio
+async def test_row_level_security_isolates_organizations(engine, db_session, shared_tables):
+    for slug in ("rls-a", "rls-b"):
+        db_session.add(Organization(name=slug, slug=slug, schema_name=f"tenant_{slug.replace('-', '_')}"))
+    await db_session.commit()
+    org_a, org_b = (await db_session.scalars(select(Organization.id).order_by(Organization.id))).all()
+
+    async with engine.begin() as conn:
+        await execute_script(conn, """
+            DROP ROLE IF EXISTS rls_probe;
+            CREATE ROLE rls_probe;
+            GRANT USAGE ON SCHEMA shared TO rls_probe;
+            GRANT SELECT, INSERT ON ALL TABLES IN SCHEMA shared TO rls_probe;
+            GRANT USAGE ON ALL SEQUENCES IN SCHEMA shared TO rls_probe;
+            GRANT REFERENCES ON public.organizations TO rls_probe;
+        """)
+    try:
+        async def as_tenant(conn, tenant_id: int) -> None:
+            await conn.execute(text("SET LOCAL ROLE rls_probe"))
+            await conn.execute(text("SELECT set_config('app.tenant_id', :t, true)"), {"t": str(tenant_id)})
+
+        async with engine.begin() as conn:
+            await as_tenant(conn, org_a)
+            # organization_id defaults to the current tenant
+            await conn.execute(text(
+                "INSERT INTO shared.spaces (name, space_type, price_per_unit) VALUES ('A desk', 'hourly', 5)"
+            ))
+            assert await conn.scalar(text("SELECT count(*) FROM shared.spaces")) == 1
+
+        async with engine.begin() as conn:
+            await as_tenant(conn, org_b)
+            assert await conn.scalar(text("SELECT count(*) FROM shared.spaces")) == 0
+
+        async with engine.connect() as conn:
+            await conn.begin()
+            await as_tenant(conn, org_b)
+            with pytest.raises(Exception, match="row-level security"):
+                await conn.execute(text(
+                    "INSERT INTO shared.spaces (organization_id, name, space_type, price_per_unit) "
+                    "VALUES (:org, 'Sneaky', 'hourly', 5)"
+                ), {"org": org_a})
+            await conn.rollback()
+
+        # Without a tenant nothing is visible at all
+        async with engine.begin() as conn:
+            await conn.execute(text("SET LOCAL ROLE rls_probe"))
+            assert await conn.scalar(text("SELECT count(*) FROM shared.spaces")) == 0
+    finally:
+        async with engine.begin() as conn:
+            await execute_script(conn, "DROP OWNED BY rls_probe; DROP ROLE rls_probe;")
+
+
+@pytest.mark.asyncio
+async def test_convert_organization(client: AsyncClient, db_session, engine, shared_tables):
+    headers = await register(client, "convert-me")
+    response = await client.post(
+        "/api/v1/spaces",
+        json={"name": "Old Room", "space_type": "daily", "price_per_unit": 50.0},
+        headers=headers,
+    )
+    space_id = response.json()["id"]
+    response = await client.post("/api/v1/reservations", json={
+        "space_id": space_id,
+        "start_time": "2030-01-01T10:00:00Z",
+        "end_time": "2030-01-02T10:00:00Z",
+    }, headers=headers)
+    assert response.status_code == 201
+    reservation_id = response.json()["id"]
+    organization_id = await db_session.scalar(
+        select(Organization.id).where(Organization.slug == "convert-me")
+    )
+    await db_session.commit()
+
+    try:
+        moved = await convert_organization(engine, organization_id)
+        assert moved == {"spaces": 1, "reservations": 1}
+        assert await convert_organization(engine, organization_id) is None
+
+        tenancy = await db_session.scalar(
+            select(Organization.tenancy).where(Organization.id == organization_id)
+        )
+        assert tenancy == OrganizationTenancy.SHARED.value
+        schemas = await db_session.execute(text(
+            "SELECT nspname FROM pg_namespace WHERE nspname LIKE '%convert_me'"
+        ))
+        assert [row[0] for row in schemas] == ["retired_tenant_convert_me"]
+
+        # Same ids, now served from the shared tables
+        response = await client.get(f"/api/v1/reservations/{reservation_id}", headers=headers)
+        assert response.status_code == 200
+        assert response.json()["space_id"] == space_id
+        response = await client.post(
+            "/api/v1/spaces",
+            json={"name": "New Room", "space_type": "daily", "price_per_unit": 60.0},
+            headers=headers,
+        )
+        assert response.status_code == 201
+        assert response.json()["id"] > space_id
+    finally:
+        await db_session.execute(text("DROP SCHEMA IF EXISTS retired_tenant_convert_me CASCADE"))
+        await db_session.execute(text("DROP SCHEMA IF EXISTS tenant_convert_me CASCADE"))
+        await db_session.commit()
+
+
+@pytest.mark.asyncio
+async def test_shared_tables_are_versioned_and_checked(engine, db_session):
+    from app.core.tenant_drift import find_schema_drift
+    from app.core.tenant_migrations import head_version, migrate_tenant_schemas
+
+    async def shared_drift():
+        async with engine.connect() as conn:
+            return {d.schema_name: d for d in await find_schema_drift(conn)}[SHARED_TENANT_SCHEMA]
+
+    try:
+        # The migrator creates the shared tables like any tenant schema
+        report = await migrate_tenant_schemas(engine, [SHARED_TENANT_SCHEMA])
+        assert report.counts == {"upgraded": 1}
+        assert report.results[0].to_version == head_version(SHARED_TENANT_SCHEMA)
+        report = await migrate_tenant_schemas(engine, [SHARED_TENANT_SCHEMA])
+        assert report.counts == {"current": 1}
+
+        drift = await shared_drift()
+        assert drift.ok, drift.issues
+        async with engine.begin() as conn:
+            await conn.execute(text("DROP INDEX shared.ix_shared_reservations_status"))
+        assert (await shared_drift()).missing_indexes == ["INDEX ON reservations (organization_id, status)"]
+    finally:
+        await db_session.rollback()
+        async with engine.begin() as conn:
+            await conn.execute(text("DROP SCHEMA IF EXISTS shared CASCADE"))
@@ -115,3 +115,87 @@ async def test_delete_space(client: AsyncClient, auth_headers: dict):
     # Verify deletion
     get_res = await client.get(f"/api/v1/spaces/{space_id}", headers=auth_headers)
     assert get_res.status_code == 404
+
+@pytest.mark.asyncio
+async def test_list_spaces_sparse_fields(client: AsyncClient, auth_headers: dict):
+    await client.post(
+        "/api/v1/spaces",
+        json={
+            "name": "Sparse Space",
+            "description": "Should not be returned",
+            "space_type": "hourly",
+            "price_per_unit": 12.5
+        },
+        headers=auth_headers
+    )
+
+    response = await client.get(
+        "/api/v1/spaces?fields=id,name,price_per_unit", headers=auth_headers
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data) >= 1
+    assert all(set(s) == {"id", "name", "price_per_unit"} for s in data)
+    assert any(s["name"] == "Sparse Space" and s["price_per_unit"] == 12.5 for s in data)
+
+    space_id = data[0]["id"]
+    get_res = await client.get(f"/api/v1/spaces/{space_id}?fields=name", headers=auth_headers)
+    assert get_res.status_code == 200
+    assert set(get_res.json()) == {"name"}
+
+@pytest.mark.asyncio
+async def test_list_spaces_unknown_field(client: AsyncClient, auth_headers: dict):
+    response = await client.get("/api/v1/spaces?fields=id,secret", headers=auth_headers)
+    assert response.status_code == 400
+
+@pytest.mark.asyncio
+async def test_list_spaces_msgpack(client: AsyncClient, auth_headers: dict):
+    msgpack = pytest.importorskip("msgpack")
+    await client.post(
+        "/api/v1/spaces",
+        json={"name": "Packed Space", "space_type": "daily", "price_per_unit": 75.0},
+        headers=auth_headers
+    )
+
+    response = await client.get(
+        "/api/v1/spaces", headers={**auth_headers, "Accept": "application/msgpack"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/msgpack"
+    data = msgpack.unpackb(response.content)
+    assert any(s["name"] == "Packed Space" and s["price_per_unit"] == 75.0 for s in data)
+
+@pytest.mark.asyncio
+async def test_list_spaces_compressed(client: AsyncClient, auth_headers: dict):
+    for i in range(10):
+        await client.post(
+            "/api/v1/spaces",
+            json={
+                "name": f"Bulk Space {i}",
+                "description": "A reasonably long description " * 4,
+                "space_type": "hourly",
+                "price_per_unit": 10.0
+            },
+            headers=auth_headers
+        )
+
+    response = await client.get(
+        "/api/v1/spaces", headers={**auth_headers, "Accept-Encoding": "gzip"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert len(response.json()) == 10
+
+    small = await client.get(
+        "/api/v1/spaces?fields=id&limit=1", headers={**auth_headers, "Accept-Encoding": "gzip"}
+    )
+    assert "content-encoding" not in small.headers
+    assert "Accept-Encoding" in small.headers["vary"]
+
+    identity = await client.get("/api/v1/spaces", headers={**auth_headers, "Accept-Encoding": "identity"})
+    assert "content-encoding" not in identity.headers
+    assert "Accept-Encoding" in identity.headers["vary"]
+
+    # "*" covers every coding not refused on its own
+    wildcard = await client.get("/api/v1/spaces", headers={**auth_headers, "Accept-Encoding": "*, zstd;q=0"})
+    assert wildcard.headers["content-encoding"] == "gzip"
@@ -0,0 +1,53 @@
+import pytest
+from sqlalchemy import text
+from app.core.tenant_drift import find_schema_drift, normalize_type
+from app.core.tenant_migrations import execute_script, tenant_schema_ddl
+
+ALIGNED = "tenant_drift_aligned"
+DRIFTED = "tenant_drift_drifted"
+
+
+@pytest.fixture
+async def tenant_schemas(engine):
+    async with engine.begin() as conn:
+        for schema_name in (ALIGNED, DRIFTED):
+            await execute_script(conn, tenant_schema_ddl(schema_name))
+        await execute_script(conn, f"""
+            ALTER TABLE {DRIFTED}.spaces DROP COLUMN floor;
+            ALTER TABLE {DRIFTED}.spaces ADD COLUMN color VARCHAR(20);
+            ALTER TABLE {DRIFTED}.spaces ALTER COLUMN capacity SET NOT NULL;
+            ALTER TABLE {DRIFTED}.reservations ALTER COLUMN status TYPE VARCHAR(50);
+            DROP INDEX {DRIFTED}.ix_{DRIFTED}_reservations_status;
+            CREATE INDEX ix_{DRIFTED}_reservations_user_status ON {DRIFTED}.reservations (user_id, status);
+            ALTER TABLE {DRIFTED}.reservations DROP CONSTRAINT reservations_space_id_fkey;
+            ALTER TABLE {DRIFTED}.spaces ADD CONSTRAINT spaces_name_key UNIQUE (name);
+        """)
+    yield
+    async with engine.begin() as conn:
+        for schema_name in (ALIGNED, DRIFTED):
+            await conn.execute(text(f"DROP SCHEMA IF EXISTS {schema_name} CASCADE"))
+
+
+def test_normalize_type():
+    assert normalize_type("character varying(255)") == normalize_type("VARCHAR(255)")
+    assert normalize_type("numeric(10,2)") == normalize_type("NUMERIC(10, 2)")
+    assert normalize_type("VARCHAR") == normalize_type("text")
+
+
+@pytest.mark.asyncio
+async def test_find_schema_drift(engine, tenant_schemas):
+    async with engine.connect() as conn:
+        drifts = {drift.schema_name: drift for drift in await find_schema_drift(conn)}
+
+    assert drifts[ALIGNED].ok
+    drift = drifts[DRIFTED]
+    assert drift.missing_columns == ["spaces.floor"]
+    assert drift.extra_columns == ["spaces.color"]
+    assert drift.mismatched_columns == [
+        "reservations.status: expected varchar(20) NOT NULL, found varchar(50) NOT NULL",
+        "spaces.capacity: expected integer NULL, found integer NOT NULL",
+    ]
+    assert drift.missing_indexes == ["INDEX ON reservations (status)"]
+    assert drift.extra_indexes == ["INDEX ON reservations (user_id, status)"]
+    assert drift.missing_constraints == ["FOREIGN KEY reservations (space_id) -> spaces (id)"]
+    assert drift.extra_constraints == ["UNIQUE spaces (name)"]
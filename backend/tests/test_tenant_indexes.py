@@ -0,0 +1,93 @@
+import time
+import pytest
+from sqlalchemy import text
+from app.core import tenant_indexes, tenant_migrations
+from app.core.tenant_indexes import find_index_builds, rollout_tenant_indexes, index_is_valid
+from app.core.tenant_migrations import TenantIndex, execute_script, tenant_schema_ddl
+
+SCHEMAS = ["tenant_idx_missing", "tenant_idx_invalid"]
+INDEX = TenantIndex("reservations", ("space_id", "start_time"))
+
+
+@pytest.fixture
+async def tenant_schemas(engine):
+    async with engine.begin() as conn:
+        for schema_name in SCHEMAS:
+            await execute_script(conn, tenant_schema_ddl(schema_name))
+        # Two reservations with the same space make a unique build fail
+        await execute_script(conn, """
+            INSERT INTO tenant_idx_invalid.spaces (name, space_type, price_per_unit)
+            VALUES ('Desk', 'hourly', 5);
+            INSERT INTO tenant_idx_invalid.reservations (user_id, space_id, start_time, end_time, total_price)
+            SELECT 1, 1, now(), now() + interval '1 hour', 5 FROM generate_series(1, 2);
+        """)
+    # A failed concurrent build leaves an INVALID index with the rollout's name
+    async with engine.execution_options(isolation_level="AUTOCOMMIT").connect() as conn:
+        with pytest.raises(Exception):
+            await conn.execute(text(
+                f"CREATE UNIQUE INDEX CONCURRENTLY {INDEX.name('tenant_idx_invalid')} "
+                f"ON tenant_idx_invalid.reservations (space_id)"
+            ))
+    yield SCHEMAS
+    async with engine.begin() as conn:
+        for schema_name in SCHEMAS:
+            await conn.execute(text(f"DROP SCHEMA IF EXISTS {schema_name} CASCADE"))
+
+
+@pytest.mark.asyncio
+async def test_rollout_builds_missing_and_rebuilds_invalid_indexes(engine, tenant_schemas, monkeypatch):
+    monkeypatch.setattr(tenant_migrations, "TENANT_ONLINE_INDEXES", [INDEX])
+    async with engine.connect() as conn:
+        builds = [b for b in await find_index_builds(conn) if b.schema_name in SCHEMAS]
+    assert {(b.schema_name, b.invalid) for b in builds} == {
+        ("tenant_idx_missing", False), ("tenant_idx_invalid", True),
+    }
+
+    finished = []
+    await rollout_tenant_indexes(
+        engine, builds, concurrency=2, backoff_seconds=0,
+        on_build=lambda build, done, total: finished.append(done),
+    )
+    assert sorted(finished) == [1, 2]
+    assert {b.status for b in builds} == {"created"}
+
+    async with engine.connect() as conn:
+        for schema_name in SCHEMAS:
+            assert await index_is_valid(conn, schema_name, INDEX.name(schema_name))
+        # The invalid unique index was replaced by the declared one
+        definition = await conn.scalar(text(
+            "SELECT indexdef FROM pg_indexes WHERE indexname = :name"
+        ), {"name": INDEX.name("tenant_idx_invalid")})
+        assert "UNIQUE" not in definition
+        assert "space_id, start_time" in definition
+        assert [b for b in await find_index_builds(conn) if b.schema_name in SCHEMAS] == []
+
+    # New schemas get online indexes with the rest of the DDL
+    assert INDEX.create_sql("tenant_new") in tenant_schema_ddl("tenant_new")
+
+
+@pytest.mark.asyncio
+async def test_rollout_backs_off_and_reports_failures(engine, tenant_schemas, monkeypatch):
+    pressure = iter([(120.0, 0), (0.0, 50), (0.0, 0), (0.0, 0)])
+    checks = []
+
+    async def fake_pressure(conn):
+        checks.append(1)
+        return next(pressure, (0.0, 0))
+
+    monkeypatch.setattr(tenant_indexes, "database_pressure", fake_pressure)
+    # backoff_seconds=0 below still waits between checks
+    monkeypatch.setattr(tenant_indexes, "MIN_BACKOFF_SECONDS", 0.05)
+    broken = TenantIndex("reservations", ("no_such_column",))
+    builds = [tenant_indexes.IndexBuild("tenant_idx_missing", broken)]
+
+    started = time.monotonic()
+    await rollout_tenant_indexes(
+        engine, builds, attempts=2, max_lag_seconds=30, max_io_waiters=8, backoff_seconds=0,
+    )
+    assert builds[0].status == "failed"
+    assert builds[0].attempts == 2
+    assert "no_such_column" in builds[0].error
+    # Two checks over the limits, then one per attempt
+    assert len(checks) == 4
+    assert time.monotonic() - started >= 0.05 + 0.1
@@ -0,0 +1,151 @@
+import argparse
+import pytest
+from sqlalchemy import text
+from app.core import tenant_migrations
+from app.core.tenant_migrations import (
+    MIGRATION_LOCK_NAMESPACE,
+    TenantIndex,
+    TenantMigration,
+    execute_script,
+    list_versioned_schemas,
+    migrate_tenant_schemas,
+    tenant_schema_ddl,
+)
+from app.models.tenant import SHARED_TENANT_SCHEMA
+from scripts import migrate_tenant_schemas as migrate_tenant_schemas_script
+from scripts import rollout_tenant_indexes, verify_db_alignment
+
+LEGACY = "tenant_mig_legacy"
+FRESH = "tenant_mig_fresh"
+
+
+async def versions(conn, schema_name: str) -> list[int]:
+    result = await conn.execute(text(f"SELECT version FROM {schema_name}.tenant_schema_version ORDER BY version"))
+    return [row[0] for row in result]
+
+
+@pytest.fixture
+async def tenant_schemas(engine):
+    """A schema from before versioning existed and one created at head."""
+    async with engine.begin() as conn:
+        # Legacy schemas have the tables but no version table
+        baseline = tenant_migrations.TENANT_MIGRATIONS[0]
+        await execute_script(conn, f"CREATE SCHEMA {LEGACY};" + baseline.sql.format(
+            schema=LEGACY, ix=tenant_migrations.index_prefix(LEGACY)
+        ))
+        await execute_script(conn, tenant_schema_ddl(FRESH))
+    yield [LEGACY, FRESH]
+    async with engine.begin() as conn:
+        for schema_name in (LEGACY, FRESH):
+            await conn.execute(text(f"DROP SCHEMA IF EXISTS {schema_name} CASCADE"))
+
+
+@pytest.mark.asyncio
+async def test_migrate_tenant_schemas_upgrades_and_resumes(engine, tenant_schemas, monkeypatch):
+    monkeypatch.setattr(tenant_migrations, "TENANT_MIGRATIONS", [
+        *tenant_migrations.TENANT_MIGRATIONS,
+        TenantMigration(2, "add_spaces_color", "ALTER TABLE {schema}.spaces ADD COLUMN color VARCHAR(20);"),
+    ])
+    progress = []
+
+    report = await migrate_tenant_schemas(
+        engine, tenant_schemas, concurrency=2,
+        on_result=lambda result, done, total: progress.append((done, total)),
+    )
+    assert report.counts == {"upgraded": 2}
+    assert sorted(progress) == [(1, 2), (2, 2)]
+    by_schema = {result.schema_name: result for result in report.results}
+    assert (by_schema[LEGACY].from_version, by_schema[LEGACY].to_version) == (0, 2)
+    assert (by_schema[FRESH].from_version, by_schema[FRESH].to_version) == (1, 2)
+
+    async with engine.connect() as conn:
+        for schema_name in tenant_schemas:
+            assert await versions(conn, schema_name) == [1, 2]
+            await conn.execute(text(f"SELECT color FROM {schema_name}.spaces"))
+
+    # A second run finds nothing to do
+    report = await migrate_tenant_schemas(engine, tenant_schemas)
+    assert report.counts == {"current": 2}
+
+
+@pytest.mark.asyncio
+async def test_migrate_tenant_schemas_isolates_failures_and_locks(engine, tenant_schemas, monkeypatch):
+    monkeypatch.setattr(tenant_migrations, "TENANT_MIGRATIONS", [
+        *tenant_migrations.TENANT_MIGRATIONS,
+        TenantMigration(2, "broken", "ALTER TABLE {schema}.missing ADD COLUMN color VARCHAR(20);"),
+    ])
+
+    async with engine.begin() as lock_conn:
+        # Another runner is working on the fresh schema
+        await lock_conn.execute(
+            text("SELECT pg_advisory_xact_lock(:namespace, hashtext(:schema_name))"),
+            {"namespace": MIGRATION_LOCK_NAMESPACE, "schema_name": FRESH},
+        )
+        report = await migrate_tenant_schemas(engine, tenant_schemas)
+
+    by_schema = {result.schema_name: result for result in report.results}
+    assert by_schema[FRESH].status == "locked"
+    assert by_schema[LEGACY].status == "failed"
+    assert "missing" in by_schema[LEGACY].error
+
+    # The failed schema rolled back as a whole: not even the baseline stamp
+    async with engine.connect() as conn:
+        exists = await conn.scalar(text(f"SELECT to_regclass('{LEGACY}.tenant_schema_version') IS NOT NULL"))
+        assert not exists
+        assert await versions(conn, FRESH) == [1]
+
+
+@pytest.mark.asyncio
+async def test_schema_names_are_quoted(engine):
+    hostile = 'tenant_x"; CREATE TABLE public.injected (id int); --'
+    async with engine.begin() as conn:
+        await execute_script(conn, tenant_schema_ddl(hostile))
+    try:
+        async with engine.connect() as conn:
+            assert await conn.scalar(text("SELECT to_regclass('public.injected')")) is None
+            assert await conn.scalar(
+                text("SELECT count(*) FROM pg_tables WHERE schemaname = :schema_name"),
+                {"schema_name": hostile},
+            ) == 3
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(text(f"DROP SCHEMA IF EXISTS {tenant_migrations.quote_ident(hostile)} CASCADE"))
+
+
+@pytest.mark.asyncio
+async def test_maintenance_scripts_cover_every_shard(engine, shard, monkeypatch, capsys):
+    index = TenantIndex("reservations", ("space_id", "start_time"))
+    async with shard.begin() as conn:
+        await execute_script(conn, tenant_schema_ddl("tenant_on_shard"))
+        await conn.execute(text("ALTER TABLE tenant_on_shard.spaces DROP COLUMN capacity"))
+        assert await list_versioned_schemas(conn, shared=False) == ["tenant_on_shard"]
+
+    # Drift on a shard is reported with the shard's name
+    assert await verify_db_alignment.verify_alignment(argparse.Namespace(examples=5, all_schemas=False)) == 1
+    assert "east:tenant_on_shard" in capsys.readouterr().out
+
+    monkeypatch.setattr(tenant_migrations, "TENANT_MIGRATIONS", [
+        *tenant_migrations.TENANT_MIGRATIONS,
+        TenantMigration(2, "add_spaces_capacity", "ALTER TABLE {schema}.spaces ADD COLUMN capacity INTEGER;"),
+    ])
+    try:
+        # The shared schema is only migrated where it lives
+        assert await migrate_tenant_schemas_script.main(argparse.Namespace(
+            schema=["tenant_on_shard", SHARED_TENANT_SCHEMA], target=None, concurrency=2, timeout=None, progress_interval=2,
+        )) == 0
+    finally:
+        # Created on the default shard by the run
+        async with engine.begin() as conn:
+            await conn.execute(text(f"DROP SCHEMA IF EXISTS {SHARED_TENANT_SCHEMA} CASCADE"))
+    monkeypatch.setattr(tenant_migrations, "TENANT_ONLINE_INDEXES", [index])
+    assert await rollout_tenant_indexes.main(argparse.Namespace(
+        dry_run=False, concurrency=1, attempts=None, max_lag=None, max_io_waiters=None, progress_interval=10,
+    )) == 0
+
+    async with shard.connect() as conn:
+        assert await versions(conn, "tenant_on_shard") == [1, 2]
+        assert await conn.scalar(text("SELECT to_regclass(:name) IS NOT NULL"), {
+            "name": f"tenant_on_shard.{index.name('tenant_on_shard')}",
+        })
+        # The shared tables stay on the default shard
+        assert await conn.scalar(text("SELECT to_regnamespace(:name) IS NULL"), {"name": SHARED_TENANT_SCHEMA})
@@ -0,0 +1,93 @@
+import asyncio
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from app.core import pool_metrics
+from app.core.config import settings
+from app.core.pool_metrics import instrument_engine
+from app.core.tenant_pool import AFFINITY, TenantAffinityPool, current_tenant
+
+
+@pytest.fixture(autouse=True)
+def isolated_pools(monkeypatch):
+    monkeypatch.setattr(pool_metrics, "_engines", dict(pool_metrics._engines))
+
+
+async def backend_pid(engine, tenant: str | None) -> int:
+    token = current_tenant.set(tenant)
+    try:
+        async with engine.connect() as conn:
+            return await conn.scalar(text("SELECT pg_backend_pid()"))
+    finally:
+        current_tenant.reset(token)
+
+
+@pytest.mark.asyncio
+async def test_checkouts_prefer_the_tenants_last_connection():
+    engine = instrument_engine(
+        create_async_engine(
+            str(settings.DATABASE_URL),
+            poolclass=TenantAffinityPool,
+            pool_logging_name="test-affinity",
+            pool_size=2,
+            max_overflow=0,
+        ),
+        "test-affinity",
+    )
+    try:
+        token = current_tenant.set("tenant_a")
+        async with engine.connect() as a:
+            pid_a = await a.scalar(text("SELECT pg_backend_pid()"))
+            current_tenant.set("tenant_b")
+            async with engine.connect() as b:
+                pid_b = await b.scalar(text("SELECT pg_backend_pid()"))
+        current_tenant.reset(token)
+        assert AFFINITY.value(pool="test-affinity", result="miss") == 2
+
+        # tenant_b's connection went back first, so a plain queue would hand it out next
+        assert await backend_pid(engine, "tenant_a") == pid_a
+        assert await backend_pid(engine, "tenant_b") == pid_b
+        assert AFFINITY.value(pool="test-affinity", result="hit") == 2
+
+        # A new tenant takes over the least recently used connection
+        assert await backend_pid(engine, "tenant_c") == pid_a
+        assert await backend_pid(engine, "tenant_a") == pid_b
+        assert AFFINITY.value(pool="test-affinity", result="miss") == 4
+
+        # Checkouts without a tenant use the plain queue
+        assert await backend_pid(engine, None) == pid_a
+        # Idle connections are tallied by the tag they went back with
+        assert engine.sync_engine.pool._idle == {"tenant_a": 1, "tenant_c": 1}
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_tenants_do_not_skip_waiting_checkouts():
+    engine = create_async_engine(
+        str(settings.DATABASE_URL),
+        poolclass=TenantAffinityPool,
+        pool_logging_name="test-affinity-queue",
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=5,
+    )
+    pool = engine.sync_engine.pool
+    try:
+        pid_a = await backend_pid(engine, "tenant_a")
+        held = await engine.connect()
+        await held.scalar(text("SELECT 1"))
+        waiter = asyncio.create_task(backend_pid(engine, "tenant_b"))
+        while not pool._queued:
+            await asyncio.sleep(0.01)
+
+        # tenant_a's connection comes back while tenant_b waits: tenant_a goes
+        # through the queue like any checkout instead of pulling it out
+        await held.close()
+        assert await backend_pid(engine, "tenant_a") == pid_a
+        assert await waiter == pid_a
+        assert AFFINITY.value(pool="test-affinity-queue", result="hit") == 0
+        assert pool._queued == 0
+
+    finally:
+        await engine.dispose()
@@ -0,0 +1,137 @@
+import asyncio
+import pytest
+from httpx import ASGITransport, AsyncClient
+from redis.exceptions import ConnectionError as RedisConnectionError
+from app.core import tenant_quotas
+from app.core.config import settings
+from app.core.tenant_quotas import THROTTLED, TenantQuotaLimiter
+from app.middleware.tenant_quotas import TenantQuotaMiddleware
+
+
+@pytest.fixture
+def plans(monkeypatch):
+    monkeypatch.setattr(settings, "TENANT_PLAN_QUOTAS", {
+        "standard": {"concurrency": 2, "requests_per_second": 100},
+        "free": {"concurrency": 10, "requests_per_second": 1, "burst": 2},
+    })
+    monkeypatch.setattr(tenant_quotas, "_in_flight", tenant_quotas.collections.Counter())
+    monkeypatch.setattr(tenant_quotas, "_local_buckets", {})
+    monkeypatch.setattr(tenant_quotas, "_plans", {})
+
+
+@pytest.mark.asyncio
+async def test_concurrency_limit_is_cluster_wide(fake_redis, plans, monkeypatch):
+    limiter = TenantQuotaLimiter(fake_redis)
+    first = await limiter.acquire(1, "standard")
+    second = await limiter.acquire(1, "standard")
+    assert first.allowed and second.allowed
+    # Another organization has its own quota
+    assert (await limiter.acquire(2, None)).allowed
+    # In-flight requests are reported per plan, not per organization
+    assert tenant_quotas._in_flight_by_plan() == {("standard",): 3}
+
+    throttled = THROTTLED.value(plan="standard", limit="concurrency")
+    assert (await limiter.acquire(1, "standard")).limit == "concurrency"
+    # Another worker, with no requests of its own in flight, is refused by Redis
+    monkeypatch.setattr(tenant_quotas, "_in_flight", tenant_quotas.collections.Counter())
+    monkeypatch.setattr(tenant_quotas, "_local_buckets", {})
+    assert (await limiter.acquire(1, "standard")).limit == "concurrency"
+    assert THROTTLED.value(plan="standard", limit="concurrency") == throttled + 2
+
+    await limiter.release(1, first)
+    assert (await limiter.acquire(1, "standard")).allowed
+
+
+@pytest.mark.asyncio
+async def test_request_rate_limit(fake_redis, plans):
+    limiter = TenantQuotaLimiter(fake_redis)
+    for _ in range(2):
+        await limiter.release(1, await limiter.acquire(1, "free"))
+
+    refused = await limiter.acquire(1, "free")
+    assert refused.limit == "rate"
+    assert 0 < refused.retry_after <= 1
+    assert tenant_quotas._in_flight[1] == 0
+
+
+@pytest.mark.asyncio
+async def test_request_rate_limit_without_redis(fake_redis, plans):
+    limiter = TenantQuotaLimiter(fake_redis)
+
+    async def unreachable(**kwargs):
+        raise RedisConnectionError("Redis is down")
+
+    limiter._script = unreachable
+    for _ in range(2):
+        await limiter.release(1, await limiter.acquire(1, "free"))
+
+    # This worker's own bucket still holds the organization to its plan's rate
+    refused = await limiter.acquire(1, "free")
+    assert refused.limit == "rate"
+    assert 0 < refused.retry_after <= 1
+    assert (await limiter.acquire(2, "free")).allowed
+
+
+@pytest.mark.asyncio
+async def test_streamed_responses_hold_their_place(fake_redis, plans):
+    in_flight = []
+
+    async def streaming_app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        for chunk in (b"a", b"b"):
+            await asyncio.sleep(0)
+            in_flight.append(tenant_quotas._in_flight[1])
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+
+    middleware = TenantQuotaMiddleware(streaming_app)
+
+    async def app(scope, receive, send):
+        # What TenantMiddleware leaves for the quota middleware
+        scope["state"] = {"tenant_id": 1, "plan": "standard"}
+        await middleware(scope, receive, send)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        assert (await client.get("/export")).text == "ab"
+    assert in_flight == [1, 1]
+    assert not tenant_quotas._in_flight
+
+
+@pytest.mark.asyncio
+async def test_middleware_throttles_by_organization_plan(client: AsyncClient, auth_headers, test_org, db_session, plans):
+    test_org.plan = "free"
+    await db_session.commit()
+
+    for _ in range(2):
+        assert (await client.get("/api/v1/spaces/", headers=auth_headers)).status_code == 200
+    response = await client.get("/api/v1/spaces/", headers=auth_headers)
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
+    assert not tenant_quotas._in_flight
+
+
+@pytest.fixture
+def cors_origin():
+    origin = "https://app.example.com"
+    # The middleware holds this very list
+    settings.BACKEND_CORS_ORIGINS.append(origin)
+    yield origin
+    settings.BACKEND_CORS_ORIGINS.remove(origin)
+
+
+@pytest.mark.asyncio
+async def test_throttled_responses_carry_cors_headers(
+    client: AsyncClient, auth_headers, test_org, db_session, plans, cors_origin,
+):
+    test_org.plan = "free"
+    await db_session.commit()
+
+    headers = {**auth_headers, "Origin": cors_origin}
+    for _ in range(2):
+        assert (await client.get("/api/v1/spaces/", headers=headers)).status_code == 200
+    response = await client.get("/api/v1/spaces/", headers=headers)
+    assert response.status_code == 429
+    # Browser code can read the refusal and when to retry
+    assert response.headers["Access-Control-Allow-Origin"] == cors_origin
+    assert response.headers["Access-Control-Expose-Headers"] == "Retry-After"
+
@@ -0,0 +1,91 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select
+from app.core.security import hash_token
+from app.core.token_store import (
+    delete_revoked_tokens,
+    drop_expired_token_partitions,
+    ensure_token_partitions,
+    list_token_partitions,
+    reap_tokens,
+)
+from app.models.token import Token
+
+@pytest.mark.asyncio
+async def test_token_partitions_created_and_dropped(engine):
+    now = datetime(2026, 1, 15, tzinfo=timezone.utc)
+    async with engine.begin() as conn:
+        created = await ensure_token_partitions(conn, months_ahead=2, now=now)
+        assert created == ["tokens_p2026_01", "tokens_p2026_02", "tokens_p2026_03"]
+        assert await ensure_token_partitions(conn, months_ahead=2, now=now) == []
+
+        dropped = await drop_expired_token_partitions(conn, now=now + timedelta(days=20))
+        assert dropped == ["tokens_p2026_01"]
+        assert await list_token_partitions(conn) == ["tokens_p2026_02", "tokens_p2026_03"]
+
+@pytest.mark.asyncio
+async def test_reaper_deletes_revoked_tokens(engine, db_session, test_user):
+    expires_at = datetime.now(timezone.utc) + timedelta(days=7)
+    for i in range(5):
+        db_session.add(Token(
+            token_hash=hash_token(f"token-{i}"),
+            user_id=test_user.id,
+            expires_at=expires_at,
+            is_revoked=i < 3,
+        ))
+    await db_session.commit()
+
+    assert await delete_revoked_tokens(engine, batch_size=2) == 3
+
+    summary = await reap_tokens(engine)
+    assert summary["deleted"] == 0
+    result = await db_session.execute(select(Token).where(Token.user_id == test_user.id))
+    assert len(result.scalars().all()) == 2
+
+@pytest.mark.asyncio
+async def test_refresh_lookup_skips_other_partitions(engine, db_session, test_user):
+    from sqlalchemy import event
+    from app.core.security import create_refresh_token
+    from app.core.token_store import DatabaseTokenStore
+
+    async with engine.begin() as conn:
+        await ensure_token_partitions(conn, months_ahead=2)
+    token = create_refresh_token(subject=test_user.id)
+    store = DatabaseTokenStore(db_session)
+    await store.save(test_user.id, token, datetime.now(timezone.utc) + timedelta(days=7))
+
+    statements = []
+    def record(conn, cursor, statement, parameters, *args):
+        statements.append((statement, parameters))
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    try:
+        stored = await store.lookup(token)
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", record)
+    assert stored is not None and stored.user_id == test_user.id
+    assert await store.lookup("not-a-jwt") is None
+
+    statement, parameters = next(entry for entry in statements if "token_hash" in entry[0])
+    async with engine.connect() as conn:
+        plan = (await conn.exec_driver_sql("EXPLAIN " + statement, parameters)).scalars().all()
+    scanned = {line.split(" on ")[1].split()[0] for line in plan if " on tokens_" in line}
+    assert 1 <= len(scanned) <= 2 and "tokens_default" not in scanned
+
+@pytest.mark.asyncio
+async def test_periodic_actor_keeps_a_single_cycle(monkeypatch):
+    import fakeredis
+    from app.workers import tasks
+
+    monkeypatch.setattr(tasks.redis_broker, "client", fakeredis.FakeRedis())
+    sent = []
+    monkeypatch.setattr(
+        tasks.reap_refresh_tokens, "send_with_options", lambda **options: sent.append(options["kwargs"]["run_id"])
+    )
+
+    # Started once, then enqueued again by hand while the next run is pending
+    assert tasks.schedule_next_run(tasks.reap_refresh_tokens, None, 60)
+    assert not tasks.schedule_next_run(tasks.reap_refresh_tokens, None, 60)
+    # The pending run carries the cycle on; a stale duplicate does not
+    assert not tasks.schedule_next_run(tasks.reap_refresh_tokens, "stale", 60)
+    assert tasks.schedule_next_run(tasks.reap_refresh_tokens, sent[0], 60)
+    assert len(sent) == 2
@@ -1,6 +1,8 @@
 import asyncio
 from app.core.database import AsyncSessionLocal
 from sqlalchemy import text
+from app.core.tenant_migrations import execute_script, tenant_schema_ddl
+from app.models.tenant import SHARED_TENANT_SCHEMA
 
 async def create_tables():
     async with AsyncSessionLocal() as session:
@@ -30,6 +32,9 @@ async def create_tables():
                 slug VARCHAR(100) NOT NULL UNIQUE,
                 schema_name VARCHAR(63) NOT NULL UNIQUE,
                 is_active BOOLEAN NOT NULL DEFAULT TRUE,
+                status VARCHAR(20) NOT NULL DEFAULT 'ACTIVE',
+                tenancy VARCHAR(10) NOT NULL DEFAULT 'SCHEMA',
+                shard VARCHAR(50) NOT NULL DEFAULT 'default',
                 email VARCHAR(255),
                 phone VARCHAR(50),
                 created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
@@ -63,22 +68,39 @@ async def create_tables():
         # Crear tabla tokens si no existe
         await session.execute(text("""
             CREATE TABLE IF NOT EXISTS public.tokens (
-                id SERIAL PRIMARY KEY,
-                token VARCHAR(500) NOT NULL UNIQUE,
+                id SERIAL,
+                token_hash BYTEA NOT NULL,
                 token_type VARCHAR(50) NOT NULL,
                 user_id INTEGER NOT NULL REFERENCES public.users(id),
                 expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
                 is_revoked BOOLEAN NOT NULL DEFAULT FALSE,
                 created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+                updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (id, expires_at)
+            ) PARTITION BY RANGE (expires_at)
+        """))
+        await session.execute(text(
+            "CREATE TABLE IF NOT EXISTS public.tokens_default PARTITION OF public.tokens DEFAULT"
+        ))
+
+        # Crear tabla tenant_schema_pool si no existe
+        await session.execute(text("""
+            CREATE TABLE IF NOT EXISTS public.tenant_schema_pool (
+                schema_name VARCHAR(63) PRIMARY KEY,
+                created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
             )
         """))
+        # Crear índices para tenant_schema_pool
+        await session.execute(text("CREATE INDEX IF NOT EXISTS ix_public_tenant_schema_pool_created_at ON public.tenant_schema_pool (created_at)"))
 
         # Crear índices para tokens
-        await session.execute(text("CREATE INDEX IF NOT EXISTS ix_public_tokens_token ON public.tokens (token)"))
+        await session.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ix_public_tokens_token_hash ON public.tokens (token_hash, expires_at)"))
         await session.execute(text("CREATE INDEX IF NOT EXISTS ix_public_tokens_user_id ON public.tokens (user_id)"))
         await session.execute(text("CREATE INDEX IF NOT EXISTS ix_public_tokens_expires_at ON public.tokens (expires_at)"))
 
+        # Crear tablas compartidas de tenants (modo de tenancy compartido)
+        await execute_script(session, tenant_schema_ddl(SHARED_TENANT_SCHEMA))
+
         await session.commit()
         print("Tables created successfully")
 